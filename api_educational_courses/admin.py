@@ -1,14 +1,154 @@
+from django.conf import settings
 from django.contrib import admin
-from .models import Course, User, UserProfile, Lesson, Enrollment, Review, Category
+from django.core.paginator import Paginator
+from django.db.models import Prefetch, Q, QuerySet
+from django.utils.functional import cached_property
+from django.utils.text import smart_split, unescape_string_literal
+from .models import Course, User, UserProfile, Lesson, Enrollment, EnrollmentCourse, Review, Category
+from .cache import get_estimated_rows
+from .search import FULL_TEXT_FIELDS, get_backend, search
 from django.apps import apps
 
 app = apps.get_app_config('api_educational_courses')
 app.verbose_name = 'Приложение "Онлайн школа курсов"'  # Чтобы изменить название при отображении в админ панели (другой вариант приведен в apps.py)
 
-admin.site.register(Course)
-admin.site.register(User)
-admin.site.register(UserProfile)
-admin.site.register(Lesson)
-admin.site.register(Enrollment)
-admin.site.register(Review)
-admin.site.register(Category)
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор списков админ-панели: для неотфильтрованного списка таблицы, оценка размера которой
+    не меньше API_COUNT_ESTIMATE_THRESHOLD, количество строк берется из статистики
+    планировщика (cache.estimate_rows) вместо COUNT(*) по всей таблице
+    """
+
+    @cached_property
+    def count(self):
+        threshold = getattr(settings, 'API_COUNT_ESTIMATE_THRESHOLD', None)
+        if threshold is not None and isinstance(self.object_list, QuerySet) and not self.object_list.query.where:
+            estimate = get_estimated_rows(self.object_list)
+            if estimate is not None and estimate >= threshold:
+                return estimate
+        return super().count
+
+
+class IndexedModelAdmin(admin.ModelAdmin):
+    """
+    Базовый класс админки больших таблиц: приблизительное количество строк без фильтра,
+    без второго COUNT(*) по всей таблице при поиске и фильтрации, поиск по индексам.
+
+    search_fields задаются с явным lookup __exact по индексированным полям (name__exact,
+    user__username__exact): startswith/istartswith компилируются в LIKE, который не использует
+    индексы SQLite с сортировкой BINARY (проверка - AdminChangelistTests.test_search_uses_indexes). Условие по полю связанной модели выполняется подзапросом
+    "внешний ключ IN (SELECT id ...)", а не JOIN: условия OR по колонкам разных таблиц
+    не используют индексы. Для моделей с полнотекстовым индексом (search.py) вместо
+    search_fields используется он
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        terms = [unescape_string_literal(term) if term[0] in '"\'' else term for term in smart_split(search_term)]
+        if not terms:
+            return queryset, False
+        if queryset.model in FULL_TEXT_FIELDS and get_backend() is not None:
+            return search(queryset, terms), False
+
+        for term in terms:
+            condition = Q()
+            for field_name in self.get_search_fields(request):
+                name, _, lookup = field_name.partition('__')
+                field = queryset.model._meta.get_field(name)
+                if field.is_relation and (field.many_to_one or field.one_to_one) and lookup:
+                    related = field.related_model._default_manager.filter(**{lookup: term})
+                    condition |= Q(**{f'{name}__in': related.values('pk')})
+                else:
+                    condition |= Q(**{field_name: term})
+            queryset = queryset.filter(condition)
+        return queryset, False
+
+
+@admin.register(Course)
+class CourseAdmin(IndexedModelAdmin):
+    list_display = ['name', 'author', 'updated_at']
+    search_fields = ['name__exact', 'author__exact']  # без полнотекстового индекса
+
+
+@admin.register(User)
+class UserAdmin(IndexedModelAdmin):
+    list_display = ['username', 'email', 'is_staff', 'is_active']
+    search_fields = ['username__exact']
+
+
+@admin.register(UserProfile)
+class UserProfileAdmin(IndexedModelAdmin):
+    list_display = ['name', 'teacher', 'user']
+    list_select_related = ['user']
+    raw_id_fields = ['user']
+    search_fields = ['name__exact', 'teacher__exact', 'user__username__exact']
+
+
+@admin.register(Lesson)
+class LessonAdmin(IndexedModelAdmin):
+    list_display = ['name', 'updated_at']
+    search_fields = ['name__exact']  # без полнотекстового индекса
+
+
+@admin.register(Review)
+class ReviewAdmin(IndexedModelAdmin):
+    """
+    Отзывы: __str__ обращается к курсу и пользователю - они загружаются в запросе страницы
+    """
+
+    list_display = ['__str__', 'rate', 'updated_at']
+    list_select_related = ['course', 'user']
+    raw_id_fields = ['course', 'user']
+    search_fields = ['user__username__exact', 'course__name__exact']
+
+
+@admin.register(Category)
+class CategoryAdmin(IndexedModelAdmin):
+    raw_id_fields = ['course']  # вместо списка выбора из всех курсов
+    search_fields = ['name__exact']
+
+
+class EnrollmentCourseInline(admin.TabularInline):
+    """
+    Курсы записи (связь через явную модель EnrollmentCourse редактируется во вложенной форме)
+    """
+
+    model = EnrollmentCourse
+    extra = 1
+    raw_id_fields = ['course']
+
+
+@admin.register(Enrollment)
+class EnrollmentAdmin(IndexedModelAdmin):
+    """
+    Записи на курс: __str__ обращается к курсам и пользователю,
+    поэтому они загружаются заранее для всей страницы списка
+    """
+
+    list_select_related = ['user']
+    raw_id_fields = ['user']
+    search_fields = ['user__username__exact']
+    inlines = [EnrollmentCourseInline]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related(
+            Prefetch('course', queryset=Course.objects.only('id', 'name'))
+        )
+
+    def save_formset(self, request, form, formset, change):
+        """
+        Курсы записи сохраняются через enrollment.course, а не строками EnrollmentCourse:
+        так срабатывает m2m_changed и его обработчики (updated_at записи, кэш списков, похожие курсы).
+        Обработчики post_save/post_delete модели связи не используются: они отключили бы
+        быстрое каскадное удаление строк связи при удалении курса или записи
+        """
+
+        if formset.model is not EnrollmentCourse:
+            return super().save_formset(request, form, formset, change)
+        formset.save(commit=False)  # new_objects, changed_objects, deleted_objects - для журнала изменений
+        deleted = set(formset.deleted_forms)
+        form.instance.course.set([inline_form.cleaned_data['course'] for inline_form in formset.forms
+                                  if inline_form not in deleted and inline_form.cleaned_data.get('course')])
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ApiEducationalCoursesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api_educational_courses'
+
+    def ready(self):
+        from . import signals  # noqa: F401 - подключение обработчиков сигналов
@@ -0,0 +1,186 @@
+"""
+Асинхронный (ASGI) путь чтения каталога: /async/courses/, /async/lessons/, /async/categories/
+
+Представления - нативные async-представления Django без DRF: запросы к БД выполняются
+через асинхронный ORM (acount, aiterator, aget), поэтому под uvicorn/daphne ожидание
+медленного клиента не занимает поток. Набор данных, сериализатор, фильтры по полям,
+поиск, сортировка и сокращенное представление (sparse.py) берутся из соответствующего
+ModelViewSet, формат ответа совпадает с синхронным путем (пагинация по номеру страницы):
+JSON рендерится первым рендерером DEFAULT_RENDERER_CLASSES, частота запросов ограничивается
+TokenBucketThrottle с той же областью, что у синхронного представления
+"""
+import math
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import HttpResponse
+from django.views import View
+from rest_framework.exceptions import NotFound, Throttled
+from rest_framework.exceptions import ValidationError as APIValidationError
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .search import FULL_TEXT_FIELDS, get_backend, search
+from .sparse import defer_columns, prune_fields, select_fields
+from .throttling import TokenBucketThrottle
+from .views import CategoryViewSet, CourseViewSet, CustomPagination, LessonViewSet
+
+
+class AsyncReadOnlyView(View):
+    """
+    list (без pk) и retrieve (с pk) для модели viewset_class.
+    Поддерживаются параметры page, page_size, ordering, search, fields, view и точные фильтры
+    по полям filterset_fields
+    """
+
+    http_method_names = ['get', 'head', 'options']
+    viewset_class = None
+    pagination_class = CustomPagination
+    throttle_scope = None  # область API_THROTTLE_RATES - basename синхронного представления
+
+    async def get(self, request, pk=None):
+        try:
+            await self.check_throttle(request)
+            if pk is None:
+                return self.render(await self.list(request))
+            return self.render(await self.retrieve(pk))
+        except Throttled as exc:
+            response = self.render({'detail': exc.detail}, status=exc.status_code)
+            response['Retry-After'] = str(exc.wait)
+            return response
+        except NotFound as exc:
+            return self.render({'detail': str(exc) or 'Страница не найдена.'}, status=404)
+        except APIValidationError as exc:
+            return self.render(exc.detail, status=400)
+        except (ValueError, TypeError, ValidationError) as exc:
+            return self.render({'detail': f'Некорректный параметр запроса: {exc}'}, status=400)
+
+    def render(self, data, status=200):
+        """
+        JSON тем же рендерером, что и у DRF (экранирование U+2028/U+2029, UNICODE_JSON, COMPACT_JSON)
+        """
+
+        renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+        content = renderer.render(data, renderer.media_type, {'view': self, 'request': self.request})
+        return HttpResponse(content, status=status, content_type=renderer.media_type)
+
+    async def check_throttle(self, request):
+        """
+        TokenBucketThrottle, как у синхронного пути (DEFAULT_THROTTLE_CLASSES к View не применяются).
+        Пользователь сессии загружается асинхронно: ленивый request.user обратился бы к БД синхронно
+        """
+
+        if hasattr(request, 'auser'):
+            request.user = await request.auser()
+        throttle = TokenBucketThrottle()
+        if not throttle.allow_request(request, self):
+            raise Throttled(throttle.wait())
+
+    def get_serializer(self, instance=None, many=False, selected=None):
+        serializer = self.viewset_class.serializer_class(instance, many=many, context={'request': self.request})
+        if selected is not None:
+            prune_fields(serializer, selected)
+        return serializer
+
+    def get_selected_fields(self, summary):
+        fields = self.viewset_class.serializer_class(context={'request': self.request}).fields
+        return select_fields(self.request.GET, fields, self.viewset_class.heavy_fields, summary)
+
+    def get_queryset(self, selected=None):
+        queryset = self.viewset_class.queryset.all()
+        return defer_columns(queryset, selected) if selected is not None else queryset
+
+    def filter_queryset(self, queryset):
+        """
+        Аналог filter_backends синхронного пути: точные фильтры, поиск, сортировка.
+        Только построение запроса, без обращений к БД
+        """
+
+        params = self.request.GET
+        viewset = self.viewset_class
+        filters = {name: params[name] for name in viewset.filterset_fields if params.get(name, '') != ''}
+        if filters:
+            queryset = queryset.filter(**filters)
+
+        terms = [term for term in params.get(api_settings.SEARCH_PARAM, '').replace(',', ' ').split() if term]
+        if terms:
+            if queryset.model in FULL_TEXT_FIELDS and get_backend() is not None:
+                queryset = search(queryset, terms)
+            else:
+                for term in terms:
+                    condition = Q()
+                    for field in viewset.search_fields:
+                        condition |= Q(**{f'{field}__icontains': term})
+                    queryset = queryset.filter(condition)
+
+        ordering = [field for field in params.get(api_settings.ORDERING_PARAM, '').split(',')
+                    if field.strip().lstrip('-') in viewset.ordering_fields]
+        if ordering:
+            queryset = queryset.order_by(*(field.strip() for field in ordering))
+        elif not queryset.ordered:
+            queryset = queryset.order_by('pk')
+        return queryset
+
+    def get_page_size(self):
+        paginator = self.pagination_class
+        try:
+            size = int(self.request.GET[paginator.page_size_query_param])
+        except (KeyError, ValueError):
+            return paginator.page_size
+        return min(size, paginator.max_page_size) if size > 0 else paginator.page_size
+
+    async def list(self, request):
+        selected = self.get_selected_fields(summary=True)
+        queryset = self.filter_queryset(self.get_queryset(selected))
+        page_size = self.get_page_size()
+        count = await queryset.acount()
+        num_pages = max(math.ceil(count / page_size), 1)
+        page_param = self.pagination_class.page_query_param
+        page = request.GET.get(page_param, 1)
+        if page == 'last':
+            page = num_pages
+        try:
+            page = int(page)
+        except ValueError:
+            raise NotFound('Неправильная страница.')
+        if not 1 <= page <= num_pages:
+            raise NotFound('Неправильная страница.')
+
+        start = (page - 1) * page_size
+        # chunk_size нужен aiterator, чтобы выполнить prefetch_related (например, курсы категорий)
+        objects = [obj async for obj in queryset[start:start + page_size].aiterator(chunk_size=page_size)]
+
+        url = request.build_absolute_uri()
+        previous_url = None
+        if page > 1:
+            previous_url = remove_query_param(url, page_param) if page == 2 else replace_query_param(url, page_param,
+                                                                                                     page - 1)
+        return {
+            'count': count,
+            'next': replace_query_param(url, page_param, page + 1) if page < num_pages else None,
+            'previous': previous_url,
+            'results': self.get_serializer(objects, many=True, selected=selected).data,
+        }
+
+    async def retrieve(self, pk):
+        selected = self.get_selected_fields(summary=False)
+        try:
+            obj = await self.get_queryset(selected).aget(pk=pk)
+        except self.viewset_class.queryset.model.DoesNotExist:
+            raise NotFound('No %s matches the given query.' % self.viewset_class.queryset.model._meta.object_name)
+        return self.get_serializer(obj, selected=selected).data
+
+
+class AsyncCourseView(AsyncReadOnlyView):
+    viewset_class = CourseViewSet
+    throttle_scope = 'courses'
+
+
+class AsyncLessonView(AsyncReadOnlyView):
+    viewset_class = LessonViewSet
+    throttle_scope = 'lessons'
+
+
+class AsyncCategoryView(AsyncReadOnlyView):
+    viewset_class = CategoryViewSet
+    throttle_scope = 'categories'
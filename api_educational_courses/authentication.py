@@ -0,0 +1,145 @@
+"""
+Аутентификация по JWT без загрузки пользователя из БД на каждый запрос.
+
+Пользователь запроса (ClaimsUser) строится из проверенных утверждений токена
+(id, username, is_staff, is_superuser), которые добавляются при выдаче токена
+(ClaimsTokenObtainPairSerializer). Чтобы отзыв доступа работал до истечения токена,
+состояние пользователя (is_active и права) хранится в LRU-кэше процесса с коротким
+временем жизни: деактивация или снятие прав действуют сразу в процессе, где изменен
+пользователь (сброс по сигналу, см. signals.py), и не позже чем через
+API_USER_STATE_CACHE_TIMEOUT секунд в остальных
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+
+UserState = namedtuple('UserState', ['is_active', 'is_staff', 'is_superuser'])
+INACTIVE = UserState(False, False, False)  # состояние удаленного пользователя
+
+
+class UserStateCache:
+    """
+    Потокобезопасный LRU-кэш состояния пользователей с временем жизни записей.
+    Ключ - id пользователя строкой (в токене id может быть как числом, так и строкой)
+    """
+
+    def __init__(self, maxsize=None, timeout=None):
+        self._maxsize = maxsize
+        self._timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def maxsize(self):
+        return self._maxsize or getattr(settings, 'API_USER_STATE_CACHE_SIZE', 10000)
+
+    @property
+    def timeout(self):
+        return self._timeout if self._timeout is not None else getattr(settings, 'API_USER_STATE_CACHE_TIMEOUT', 30)
+
+    def get(self, user_id):
+        user_id = str(user_id)
+        with self._lock:
+            item = self._data.get(user_id)
+            if item is None:
+                return None
+            state, expires = item
+            if expires <= time.monotonic():
+                del self._data[user_id]
+                return None
+            self._data.move_to_end(user_id)
+            return state
+
+    def set(self, user_id, state):
+        user_id = str(user_id)
+        with self._lock:
+            self._data[user_id] = (state, time.monotonic() + self.timeout)
+            self._data.move_to_end(user_id)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def evict(self, user_id):
+        user_id = str(user_id)
+        with self._lock:
+            self._data.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+user_state_cache = UserStateCache()
+
+
+def get_user_state(user_id):
+    """
+    Состояние пользователя из кэша, при промахе - одним запросом к БД
+    """
+
+    state = user_state_cache.get(user_id)
+    if state is None:
+        row = User.objects.filter(pk=user_id).values_list('is_active', 'is_staff', 'is_superuser').first()
+        state = UserState(*row) if row is not None else INACTIVE
+        user_state_cache.set(user_id, state)
+    return state
+
+
+class ClaimsUser(TokenUser):
+    """
+    Пользователь из утверждений токена. Права - пересечение утверждений и текущего
+    состояния: снятие прав действует без перевыпуска токена, а токен без утверждений
+    (выданный до их появления) получает права из состояния
+    """
+
+    def __init__(self, token, state):
+        super().__init__(token)
+        self.state = state
+
+    @property
+    def is_staff(self):
+        return bool(self.token.get('is_staff', self.state.is_staff) and self.state.is_staff)
+
+    @property
+    def is_superuser(self):
+        return bool(self.token.get('is_superuser', self.state.is_superuser) and self.state.is_superuser)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication, возвращающая ClaimsUser вместо объекта User из БД
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        state = get_user_state(user_id)
+        if not state.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return ClaimsUser(validated_token, state)
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    Выдача пары токенов с утверждениями, нужными ClaimsUser
+    """
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token['username'] = user.get_username()
+        token['is_staff'] = user.is_staff
+        token['is_superuser'] = user.is_superuser
+        return token
@@ -0,0 +1,177 @@
+"""
+Нагрузочные замеры API внутри процесса, без внешнего HTTP-сервера.
+
+WSGI - запросы выполняются обработчиком WSGIHandler в пуле потоков (как у gunicorn
+с потоковыми воркерами), ASGI - обработчиком ASGIHandler в одном цикле событий
+(как у uvicorn). client_delay имитирует медленного клиента: задержка при отдаче
+тела ответа, во время которой WSGI-поток занят, а ASGI-воркер обслуживает других
+"""
+import asyncio
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+
+HOST = 'localhost'
+
+
+def percentile(values, percent):
+    """
+    Перцентиль методом ближайшего ранга
+    :param values: список значений
+    :param percent: 0-100
+    """
+
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(int(round(percent / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summarize(latencies, elapsed, errors=0):
+    """
+    :param latencies: время выполнения запросов, секунды
+    :param elapsed: общее время замера, секунды
+    :return: словарь req/s, p50/p95/p99 (мс), количество запросов и ошибок
+    """
+
+    result = {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+    }
+    for percent in (50, 95, 99):
+        result[f'p{percent}_ms'] = round(percentile(latencies, percent) * 1000, 2) if latencies else None
+    return result
+
+
+def _wsgi_environ(url, method='GET', body=b'', headers=None):
+    parts = urlsplit(url)
+    environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': parts.path,
+        'QUERY_STRING': parts.query,
+        'SERVER_NAME': HOST,
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': HOST,
+        'REMOTE_ADDR': '127.0.0.1',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': io.StringIO(),
+        'wsgi.url_scheme': 'http',
+        'wsgi.version': (1, 0),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in (headers or {}).items():
+        key = name.upper().replace('-', '_')
+        environ[key if key == 'CONTENT_TYPE' else f'HTTP_{key}'] = value
+    return environ
+
+
+def wsgi_request(handler, url, method='GET', body=b'', headers=None, client_delay=0.0):
+    """
+    Один запрос через WSGI-обработчик
+    :return: (код ответа, тело ответа, время выполнения в секундах)
+    """
+
+    status = []
+    started = time.perf_counter()
+    response = handler(_wsgi_environ(url, method, body, headers),
+                       lambda code, response_headers, exc_info=None: status.append(code))
+    try:
+        content = b''
+        for chunk in response:
+            content += chunk
+            if client_delay:
+                time.sleep(client_delay)
+    finally:
+        if hasattr(response, 'close'):
+            response.close()
+    return int(status[0].split()[0]), content, time.perf_counter() - started
+
+
+def run_wsgi(url, requests, concurrency, client_delay=0.0):
+    """
+    Замер синхронного пути: concurrency потоков выполняют requests запросов к url
+    """
+
+    handler = WSGIHandler()
+
+    def call(_):
+        code, _content, latency = wsgi_request(handler, url, client_delay=client_delay)
+        return latency, code == 200
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(call, range(requests)))
+    elapsed = time.perf_counter() - started
+    return summarize([latency for latency, _ in results], elapsed, sum(1 for _, ok in results if not ok))
+
+
+async def _asgi_call(handler, url, client_delay):
+    parts = urlsplit(url)
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': parts.path,
+        'raw_path': parts.path.encode(),
+        'query_string': parts.query.encode(),
+        'root_path': '',
+        'headers': [(b'host', HOST.encode())],
+        'client': ('127.0.0.1', 0),
+        'server': (HOST, 80),
+    }
+    request_sent = False
+    disconnected = asyncio.Event()
+    status = []
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await disconnected.wait()  # клиент не отключается до конца ответа
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+        elif message['type'] == 'http.response.body' and client_delay:
+            await asyncio.sleep(client_delay)
+
+    started = time.perf_counter()
+    await handler(scope, receive, send)
+    disconnected.set()
+    return time.perf_counter() - started, status[0] == 200
+
+
+def run_asgi(url, requests, concurrency, client_delay=0.0):
+    """
+    Замер асинхронного пути: до concurrency одновременных запросов в одном цикле событий
+    """
+
+    handler = ASGIHandler()
+
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def limited():
+            async with semaphore:
+                return await _asgi_call(handler, url, client_delay)
+
+        return await asyncio.gather(*(limited() for _ in range(requests)))
+
+    started = time.perf_counter()
+    results = asyncio.run(main())
+    elapsed = time.perf_counter() - started
+    return summarize([latency for latency, _ in results], elapsed, sum(1 for _, ok in results if not ok))
@@ -0,0 +1,106 @@
+"""
+Пакетные операции над коллекцией: /<ресурс>/bulk/
+
+POST   - создание: список объектов
+PATCH  - частичное обновление: список объектов с полем id
+DELETE - удаление: {"ids": [...]} или список id
+
+Вся пачка проверяется сериализатором с many=True (BulkListSerializer) и записывается
+в одной транзакции. При ошибках ничего не записывается, а в ответе 400 возвращается
+список ошибок по элементам в порядке запроса ({} - элемент корректен)
+"""
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from rest_framework import status, serializers
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from .models import bulk_write
+
+
+class BulkWriteMixin:
+    """
+    Примесь к ModelViewSet. Как и perform_create/perform_update/perform_destroy,
+    методы perform_bulk_* можно переопределить для побочных эффектов записи
+    """
+
+    bulk_max_items = 10000  # максимальное количество элементов в одном запросе
+
+    @action(detail=False, methods=['post', 'patch', 'delete'], url_path='bulk')
+    def bulk(self, request, *args, **kwargs):
+        if request.method == 'POST':
+            return self.bulk_create(request)
+        if request.method == 'PATCH':
+            return self.bulk_update(request)
+        return self.bulk_destroy(request)
+
+    def get_bulk_items(self, request):
+        items = request.data
+        if not isinstance(items, list):
+            raise serializers.ValidationError({'non_field_errors': ['Ожидается список объектов.']})
+        if len(items) > self.bulk_max_items:
+            raise serializers.ValidationError(
+                {'non_field_errors': [f'Не более {self.bulk_max_items} объектов в одном запросе.']}
+            )
+        return items
+
+    def get_bulk_serializer(self, *args, **kwargs):
+        serializer = self.get_serializer(*args, many=True, **kwargs)
+        if not serializer.is_valid():
+            raise serializers.ValidationError({'errors': serializer.errors})
+        return serializer
+
+    def bulk_create(self, request):
+        serializer = self.get_bulk_serializer(data=self.get_bulk_items(request))
+        with transaction.atomic():
+            objects = self.perform_bulk_create(serializer)
+        return Response({'created': len(objects), 'ids': [obj.pk for obj in objects]},
+                        status=status.HTTP_201_CREATED)
+
+    def to_pk(self, value):
+        """
+        id из данных запроса, приведенный к типу первичного ключа (как в BulkListSerializer.get_instance)
+        :return: значение ключа или None, если id не задан или не приводится
+        """
+
+        try:
+            return self.get_queryset().model._meta.pk.to_python(value)
+        except DjangoValidationError:
+            return None
+
+    def bulk_update(self, request):
+        items = self.get_bulk_items(request)
+        # неприводимые id - ошибки элементов (BulkListSerializer)
+        ids = [self.to_pk(item.get('id')) for item in items if isinstance(item, dict)]
+        with transaction.atomic():
+            instances = self.get_queryset().select_for_update().in_bulk([pk for pk in ids if pk is not None])
+            serializer = self.get_bulk_serializer(instances, data=items, partial=True)
+            objects = self.perform_bulk_update(serializer)
+        return Response({'updated': len(objects)})
+
+    def bulk_destroy(self, request):
+        ids = request.data.get('ids') if isinstance(request.data, dict) else request.data
+        if isinstance(ids, list):
+            ids = [self.to_pk(pk) for pk in ids]
+        if not isinstance(ids, list) or None in ids:
+            raise serializers.ValidationError({'ids': ['Ожидается список id.']})
+        with transaction.atomic():
+            deleted = self.perform_bulk_destroy(self.get_queryset().filter(pk__in=ids))
+        return Response({'deleted': deleted})
+
+    def perform_bulk_create(self, serializer):
+        return serializer.save()
+
+    def perform_bulk_update(self, serializer):
+        return serializer.save()
+
+    def perform_bulk_destroy(self, queryset):
+        """
+        :return: количество удаленных объектов модели представления
+        """
+
+        model = queryset.model
+        pks = list(queryset.values_list('pk', flat=True))
+        _, deleted = model.objects.filter(pk__in=pks).delete()
+        bulk_write.send(sender=model, pks=pks)
+        return deleted.get(model._meta.label, 0)
@@ -0,0 +1,270 @@
+"""
+Кэш ответов для анонимных GET-запросов к каталогу (курсы, уроки, категории).
+
+В кэше хранятся уже сериализованные данные ответа (response.data) вместе с заголовками
+ETag/Last-Modified. Ключ строится из пространства имен представления, версий, формата
+ответа и пути с нормализованными параметрами запроса. Ответ для кэша всегда читается
+из основной БД: реплика может отставать, и устаревший ответ остался бы в кэше
+до истечения срока уже после инвалидации.
+Инвалидация выполняется увеличением версий (см. обработчики в signals.py):
+- версия объекта - сбрасывает детальные ответы одного объекта;
+- версия списков - сбрасывает все списки пространства имен;
+- версия пространства имен - сбрасывает все ответы пространства имен
+
+Здесь же кэш состояния списков (количество строк и время изменения, см. CachedCountMixin):
+он действует и для авторизованных пользователей, версии ведутся по моделям
+"""
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections, transaction
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+
+from .conditional import is_not_modified, not_modified_response
+from .db_routers import use_primary
+
+KEY_PREFIX = 'api-response'
+ROWS_NAMESPACE = 'rows'  # пространство версий моделей для кэша состояния списков
+VALIDATOR_HEADERS = ('ETag', 'Last-Modified')
+
+
+def get_cache():
+    """
+    Бэкенд кэша ответов: алиас из настройки API_RESPONSE_CACHE_ALIAS
+    (по умолчанию локальная память процесса, для общего кэша - например, Redis)
+    """
+
+    return caches[getattr(settings, 'API_RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def _version_key(namespace, scope):
+    return f'{KEY_PREFIX}:version:{namespace}:{scope}'
+
+
+def _get_versions(namespace, scope):
+    """
+    Текущие версии пространства имен и области (списки или объект).
+    Отсутствующая версия инициализируется временем, а не нулем: после вытеснения
+    счетчика из кэша старые ключи не должны снова стать актуальными
+    """
+
+    cache = get_cache()
+    keys = [_version_key(namespace, 'namespace'), _version_key(namespace, scope)]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def _bump(namespace, scope):
+    cache = get_cache()
+    key = _version_key(namespace, scope)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def _now_and_on_commit(func, *args):
+    # Сброс сразу и после фиксации транзакции: иначе параллельный запрос может
+    # закэшировать еще не измененные данные между сбросом и COMMIT
+    func(*args)
+    transaction.on_commit(lambda: func(*args))
+
+
+def _invalidate_object(namespace, pk):
+    _bump(namespace, f'object:{pk}')
+    _bump(namespace, 'list')
+
+
+def invalidate_object(namespace, pk):
+    """
+    Сбрасывает детальные ответы объекта и все списки пространства имен
+    """
+
+    _now_and_on_commit(_invalidate_object, namespace, pk)
+
+
+def invalidate_namespace(namespace):
+    """
+    Сбрасывает все ответы пространства имен
+    """
+
+    _now_and_on_commit(_bump, namespace, 'namespace')
+
+
+def get_namespace_version(namespace):
+    """
+    Текущая версия пространства имен (увеличивается invalidate_namespace)
+    """
+
+    return _get_versions(namespace, 'namespace')[0]
+
+
+class CachedResponseMixin:
+    """
+    Примесь к ModelViewSet: кэширует ответы list/retrieve для анонимных пользователей.
+    cache_namespace - пространство имен для инвалидации (см. signals.py)
+    """
+
+    cache_namespace = None
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response('list', super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        scope = f'object:{kwargs[self.lookup_url_kwarg or self.lookup_field]}'
+        return self.get_cached_response(scope, super().retrieve, request, *args, **kwargs)
+
+    def get_cache_key(self, request, scope):
+        namespace_version, scope_version = _get_versions(self.cache_namespace, scope)
+        query = urlencode(sorted(request.query_params.lists()), doseq=True)
+        url = f'{request.accepted_renderer.format}|{request.build_absolute_uri(request.path)}?{query}'
+        digest = hashlib.md5(url.encode()).hexdigest()
+        return f'{KEY_PREFIX}:{self.cache_namespace}:{namespace_version}:{scope}:{scope_version}:{digest}'
+
+    def get_cached_response(self, scope, handler, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+
+        cache = get_cache()
+        key = self.get_cache_key(request, scope)
+        cached = cache.get(key)
+        if cached is not None:
+            return self.cached_response(request, *cached)
+
+        with use_primary():
+            response = handler(request, *args, **kwargs)
+        if isinstance(response, Response) and response.status_code == 200:
+            validators = {header: response[header] for header in VALIDATOR_HEADERS if header in response}
+            cache.set(key, (response.data, validators), getattr(settings, 'API_RESPONSE_CACHE_TIMEOUT', 300))
+        return response
+
+    @staticmethod
+    def cached_response(request, data, validators):
+        """
+        Ответ из кэша. Если при сохранении были вычислены ETag/Last-Modified
+        (ConditionalGetMixin), условный запрос обрабатывается здесь же, без обращения к БД
+        """
+
+        etag = validators.get('ETag')
+        last_modified = parse_http_date_safe(validators.get('Last-Modified', ''))
+        if etag is not None and is_not_modified(request, etag, last_modified):
+            return not_modified_response(etag, last_modified)
+        response = Response(data)
+        for header, value in validators.items():
+            response[header] = value
+        return response
+
+
+# Кэш состояния списков
+
+def invalidate_rows(model):
+    """
+    Сбрасывает закэшированные количества строк всех списков, зависящих от модели
+    """
+
+    _now_and_on_commit(_bump, ROWS_NAMESPACE, model._meta.label_lower)
+
+
+def invalidate_all_rows():
+    _now_and_on_commit(_bump, ROWS_NAMESPACE, 'namespace')
+
+
+def estimate_rows(queryset):
+    """
+    Оценка количества строк таблицы по статистике планировщика без COUNT(*):
+    pg_class.reltuples в PostgreSQL, sqlite_stat1 в SQLite (заполняется ANALYZE)
+    :return: количество строк или None, если статистики нет
+    """
+
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+        elif connection.vendor == 'sqlite':
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            # первое число stat - количество строк таблицы (для индекса и для таблицы без индексов)
+            cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    estimate = int(str(row[0]).split()[0])
+    return estimate if estimate >= 0 else None  # reltuples = -1: таблица еще не анализировалась
+
+
+def get_estimated_rows(queryset):
+    """
+    estimate_rows с кэшированием на API_COUNT_CACHE_TIMEOUT секунд
+    :return: оценка количества строк таблицы или None, если статистики нет
+    """
+
+    cache = get_cache()
+    key = f'{KEY_PREFIX}:rows-estimate:{queryset.db}:{queryset.model._meta.label_lower}'
+    estimate = cache.get(key)
+    if estimate is None:
+        estimate = estimate_rows(queryset)
+        estimate = -1 if estimate is None else estimate  # отсутствие статистики тоже кэшируется
+        cache.set(key, estimate, getattr(settings, 'API_COUNT_CACHE_TIMEOUT', 300))
+    return estimate if estimate >= 0 else None
+
+
+class CachedCountMixin:
+    """
+    Примесь к ModelViewSet (перед ConditionalGetMixin): количество строк и время изменения
+    списка (ETag, count пагинации) берутся из кэша вместо COUNT(*) на каждый запрос.
+    Ключ - SQL отфильтрованного запроса и версии моделей count_cache_models, версия модели
+    увеличивается при любой ее записи (signals.py), поэтому ETag и count остаются точными.
+
+    Если список не отфильтрован, а оценка количества строк таблицы не меньше
+    API_COUNT_ESTIMATE_THRESHOLD, агрегат не выполняется вовсе: count в ответе
+    приблизительный (count_approximate, см. CustomPagination), ETag строится по версиям моделей
+    """
+
+    count_cache_models = []  # модели, от которых зависит результат фильтрации и поиска (кроме своей)
+    count_approximate = False  # count текущего ответа - оценка
+    rows_version = None  # версии моделей, если ETag строится по ним
+
+    def get_rows_versions(self, queryset):
+        models = [queryset.model, *self.count_cache_models]
+        return [version for model in models for version in _get_versions(ROWS_NAMESPACE, model._meta.label_lower)]
+
+    def get_resource_state(self, queryset):
+        if self.action != 'list':
+            return super().get_resource_state(queryset)
+
+        cache = get_cache()
+        versions = self.get_rows_versions(queryset)
+        threshold = getattr(settings, 'API_COUNT_ESTIMATE_THRESHOLD', None)
+        if threshold is not None and not queryset.query.where:
+            estimate = get_estimated_rows(queryset)
+            if estimate is not None and estimate >= threshold:
+                self.count_approximate = True
+                self.rows_version = versions
+                return estimate, None
+
+        sql, params = queryset.order_by().query.sql_with_params()
+        source = f'{type(self).__name__}|{queryset.db}|{sql}|{params!r}|{versions}'
+        digest = hashlib.md5(source.encode()).hexdigest()
+        key = f'{KEY_PREFIX}:rows:{digest}'
+        state = cache.get(key)
+        if state is None:
+            state = super().get_resource_state(queryset)
+            cache.set(key, state, getattr(settings, 'API_COUNT_CACHE_TIMEOUT', 300))
+        return state
+
+    def get_etag(self, request, count, last_modified):
+        if self.rows_version is not None:
+            last_modified = f'{last_modified}|{self.rows_version}'
+        return super().get_etag(request, count, last_modified)
@@ -0,0 +1,178 @@
+"""
+Каталог: дерево категория -> курсы (название, автор, статистика оценок) одним ответом.
+
+Ответ /catalog/ - заранее сериализованный JSON неизменяемого снимка в памяти процесса,
+поэтому время ответа не зависит от нагрузки на БД. Версия каталога хранится в кэше
+ответов (cache.py) и увеличивается при изменении курсов, категорий и сводок оценок
+(signals.py). После изменения снимок новой версии один раз строит фоновая задача publish
+(tasks.py) и кладет в тот же кэш. Процесс, заметивший новую версию, продолжает отдавать
+прежний снимок, а фоновый поток (один на процесс) берет опубликованный снимок или, если
+задача еще не выполнена, строит его сам и атомарно подменяет ссылку на снимок.
+Синхронно строится только первый снимок процесса.
+
+/catalog/version/ - версия отдаваемого снимка без обращения к БД: клиенты опрашивают
+ее и запрашивают каталог только при изменении (или используют ETag каталога).
+API_CATALOG_BACKGROUND_REBUILD = False - устаревший снимок перестраивается в запросе
+"""
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.http import quote_etag
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema
+from rest_framework import permissions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .cache import KEY_PREFIX, get_cache, get_namespace_version, invalidate_namespace
+from .conditional import is_not_modified, not_modified_response
+from .models import Category, Course
+from .tasks import task
+
+NAMESPACE = 'catalog'
+
+Snapshot = namedtuple('Snapshot', ['version', 'built_at', 'body', 'etag'])
+
+_snapshot = None
+_build_lock = threading.Lock()
+_rebuild_thread = None
+_rebuild_thread_lock = threading.Lock()
+
+
+def build_tree():
+    """
+    Дерево каталога тремя запросами: категории, связи категория - курс, курсы со статистикой
+    :return: список категорий с курсами
+    """
+
+    courses = {
+        course['id']: course for course in Course.objects.with_rating_stats().order_by('name')
+        .values('id', 'name', 'author', 'reviews_count', 'rating_avg')
+    }
+    for course in courses.values():
+        if course['rating_avg'] is not None:
+            course['rating_avg'] = round(course['rating_avg'], 2)
+    course_ids = {}
+    for category_id, course_id in Category.course.through.objects.values_list('category_id', 'course_id'):
+        course_ids.setdefault(category_id, []).append(course_id)
+    return [
+        {**category, 'courses': sorted((courses[pk] for pk in course_ids.get(category['id'], []) if pk in courses),
+                                       key=lambda course: course['name'])}
+        for category in Category.objects.order_by('name').values('id', 'name')
+    ]
+
+
+def build_snapshot(version):
+    built_at = timezone.now()
+    # версия - строкой: значения больше 2^53 теряют точность в JavaScript
+    data = {'version': str(version), 'built_at': built_at, 'categories': build_tree()}
+    return Snapshot(version, built_at, JSONRenderer().render(data), quote_etag(str(version)))
+
+
+def get_published_key(version):
+    return f'{KEY_PREFIX}:{NAMESPACE}:snapshot:{version}'
+
+
+def rebuild():
+    """
+    Строит снимок текущей версии (или берет опубликованный задачей publish), если отдаваемый устарел.
+    Версия читается до выборки: изменение во время построения увеличит ее, и снимок снова окажется устаревшим
+    :return: отдаваемый снимок
+    """
+
+    global _snapshot
+    with _build_lock:
+        version = get_namespace_version(NAMESPACE)
+        if _snapshot is None or _snapshot.version != version:
+            _snapshot = get_cache().get(get_published_key(version)) or build_snapshot(version)
+        return _snapshot
+
+
+@task(name='catalog.publish')
+def publish():
+    """
+    Снимок текущей версии для всех процессов: строится один раз и кладется в кэш ответов
+    (ставится в очередь после изменения каталога, см. signals.py)
+    """
+
+    snapshot = rebuild()
+    get_cache().set(get_published_key(snapshot.version), snapshot,
+                    getattr(settings, 'API_RESPONSE_CACHE_TIMEOUT', 300))
+
+
+def _rebuild_in_background():
+    # при частых изменениях (например, сводок оценок) снимок строится не чаще раза в интервал
+    interval = getattr(settings, 'API_CATALOG_REBUILD_INTERVAL', 1.0)
+    try:
+        while rebuild().version != get_namespace_version(NAMESPACE):
+            time.sleep(interval)
+    finally:
+        connection.close()
+
+
+def schedule_rebuild():
+    """
+    Перестраивает снимок в фоновом потоке (если поток уже работает, он сам увидит новую версию)
+    """
+
+    global _rebuild_thread
+    if not getattr(settings, 'API_CATALOG_BACKGROUND_REBUILD', True) or _snapshot is None:
+        return  # снимок еще не нужен этому процессу - будет построен при первом запросе
+    with _rebuild_thread_lock:
+        if _rebuild_thread is None or not _rebuild_thread.is_alive():
+            _rebuild_thread = threading.Thread(target=_rebuild_in_background, name='catalog-rebuild', daemon=True)
+            _rebuild_thread.start()
+
+
+def get_snapshot():
+    """
+    Снимок для ответа: текущий, даже если устарел (тогда запускается перестроение)
+    """
+
+    snapshot = _snapshot
+    if snapshot is None or not getattr(settings, 'API_CATALOG_BACKGROUND_REBUILD', True):
+        return rebuild()
+    if snapshot.version != get_namespace_version(NAMESPACE):
+        schedule_rebuild()
+    return snapshot
+
+
+def invalidate():
+    invalidate_namespace(NAMESPACE)
+
+
+class CatalogView(APIView):
+    """
+    Дерево категорий с курсами и статистикой оценок из снимка в памяти (см. описание модуля).
+    ETag - версия снимка
+    """
+
+    permission_classes = [permissions.AllowAny]
+
+    @extend_schema(responses=OpenApiTypes.OBJECT)
+    def get(self, request):
+        snapshot = get_snapshot()
+        if is_not_modified(request, snapshot.etag, None):
+            return not_modified_response(snapshot.etag, None)
+        response = HttpResponse(snapshot.body, content_type='application/json')
+        response['ETag'] = snapshot.etag
+        return response
+
+
+class CatalogVersionView(APIView):
+    """
+    Версия каталога, который сейчас отдает /catalog/
+    """
+
+    permission_classes = [permissions.AllowAny]
+
+    @extend_schema(responses=OpenApiTypes.OBJECT)
+    def get(self, request):
+        snapshot = get_snapshot()
+        return Response({'version': str(snapshot.version), 'built_at': snapshot.built_at})
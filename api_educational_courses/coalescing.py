@@ -0,0 +1,115 @@
+"""
+Объединение одновременных одинаковых GET-запросов (single-flight).
+
+Когда несколько потоков процесса одновременно обрабатывают один и тот же GET
+(путь, параметры, формат, заголовки условного запроса), выборку и сериализацию
+выполняет только первый из них, остальные ждут и получают копию его ответа.
+Аутентификация, права и ограничение частоты проверяются для каждого запроса отдельно,
+поэтому объединяются только представления, ответ которых не зависит от пользователя.
+
+Работает внутри одного процесса (потоковые воркеры). Отключается настройкой
+API_COALESCE_ENABLED = False; API_COALESCE_TIMEOUT - сколько секунд ждать первый запрос,
+после чего запрос выполняется самостоятельно
+"""
+import threading
+
+from django.conf import settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .db_routers import reads_from_replica
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Группа вызовов: одновременные вызовы с одним ключом выполняют функцию один раз
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func, timeout=None):
+        """
+        :return: (результат, получен ли он от другого вызова)
+        """
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if not call.done.wait(timeout):
+                return func(), False
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func()
+        except Exception as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+group = SingleFlight()
+
+
+class CoalescingMixin:
+    """
+    Примесь к ModelViewSet (ставится перед кэшем и условными запросами): объединяет
+    одновременные одинаковые list/retrieve в формате JSON
+    """
+
+    coalesce_actions = ('list', 'retrieve')
+    coalesce_view_attrs = ('json_native',)  # атрибуты представления, нужные для рендеринга ответа
+
+    def list(self, request, *args, **kwargs):
+        return self.coalesced(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.coalesced(super().retrieve, request, *args, **kwargs)
+
+    def get_coalesce_key(self, request):
+        conditions = '|'.join(request.headers.get(header, '') for header in ('If-None-Match', 'If-Modified-Since'))
+        # запрос, закрепленный за основной БД (read-your-writes, db_routers.py), не получает ответ,
+        # прочитанный с отстающей реплики
+        source = 'replica' if reads_from_replica() else 'primary'
+        # абсолютный URL: ссылки next/previous в ответе содержат схему и хост запроса
+        return f'{type(self).__module__}.{type(self).__qualname__}|{self.action}|{request.accepted_renderer.format}|' \
+               f'{request.build_absolute_uri()}|{conditions}|{source}'
+
+    def coalesced(self, handler, request, *args, **kwargs):
+        # выгрузка (StreamingHttpResponse) и HTML-формат не объединяются
+        if not getattr(settings, 'API_COALESCE_ENABLED', True) or self.action not in self.coalesce_actions \
+                or not isinstance(request.accepted_renderer, JSONRenderer):
+            return handler(request, *args, **kwargs)
+
+        def call():
+            response = handler(request, *args, **kwargs)
+            return response, {name: getattr(self, name) for name in self.coalesce_view_attrs if hasattr(self, name)}
+
+        (response, view_attrs), shared = group.do(self.get_coalesce_key(request), call,
+                                                  getattr(settings, 'API_COALESCE_TIMEOUT', 10))
+        if not shared:
+            return response
+        if not isinstance(response, Response):  # объект ответа нельзя отдать нескольким запросам
+            return handler(request, *args, **kwargs)
+        for name, value in view_attrs.items():
+            setattr(self, name, value)
+        headers = {name: value for name, value in response.items() if name.lower() != 'content-type'}
+        return Response(response.data, status=response.status_code, headers=headers)
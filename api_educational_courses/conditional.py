@@ -0,0 +1,136 @@
+"""
+Условные GET-запросы (If-None-Match / If-Modified-Since).
+
+Состояние ресурса определяется одним агрегирующим запросом по отфильтрованному
+queryset: количество строк и максимальные значения полей updated_at. Если клиент
+прислал совпадающий ETag или дату не раньше последнего изменения, возвращается
+304 без выборки и сериализации данных
+"""
+import hashlib
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Count, Max
+from django.http import Http404
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+
+def is_not_modified(request, etag, last_modified):
+    """
+    Проверка заголовков условного запроса (If-None-Match имеет приоритет, RFC 9110)
+    :param etag: ETag ресурса в кавычках
+    :param last_modified: время последнего изменения (timestamp) или None
+    :return: bool
+    """
+
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        return '*' in etags or etag in etags or etag.removeprefix('W/') in etags
+
+    if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return if_modified_since is not None and last_modified is not None \
+        and int(last_modified) <= if_modified_since
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def not_modified_response(etag, last_modified):
+    return set_validators(Response(status=status.HTTP_304_NOT_MODIFIED), etag, last_modified)
+
+
+class ConditionalGetMixin:
+    """
+    Примесь к ModelViewSet: ETag и Last-Modified для list/retrieve.
+    last_modified_fields - поля, изменение которых меняет представление объекта
+    (для курсов это еще и дата изменения сводки оценок)
+    """
+
+    last_modified_fields = ['updated_at']
+    resource_count = None  # количество строк списка, уже посчитанное для ETag (использует пагинация)
+
+    def list(self, request, *args, **kwargs):
+        if self.is_cursor_paginated(request):
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.conditional_response(queryset, super().list, request, *args, **kwargs)
+
+    def is_cursor_paginated(self, request):
+        """
+        Курсорная страница читает только свои строки: агрегат по всему списку для ETag
+        вернул бы COUNT(*), который курсорная пагинация убирает, поэтому валидаторов у нее нет
+        """
+
+        paginator = self.paginator
+        if isinstance(paginator, CursorPagination):
+            return True
+        is_cursor_mode = getattr(paginator, 'is_cursor_mode', None)
+        return is_cursor_mode is not None and is_cursor_mode(request)
+
+    def retrieve(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup = self.get_lookup_value(queryset.model, kwargs[self.lookup_url_kwarg or self.lookup_field])
+        queryset = queryset.filter(**{self.lookup_field: lookup})
+        return self.conditional_response(queryset, super().retrieve, request, *args, **kwargs)
+
+    def get_lookup_value(self, model, value):
+        """
+        Значение из URL, приведенное к типу поля поиска: некорректное (например, /courses/abc/)
+        дает 404, как в get_object, а не ошибку фильтрации
+        """
+
+        opts = model._meta
+        field = opts.pk if self.lookup_field == 'pk' else opts.get_field(self.lookup_field)
+        try:
+            return field.to_python(value)
+        except (TypeError, ValueError, DjangoValidationError):
+            raise Http404
+
+    def get_resource_state(self, queryset):
+        """
+        Количество строк и время последнего изменения одним запросом
+        :return: (count, timestamp или None)
+        """
+
+        maxima = {f'max_{i}': Max(field) for i, field in enumerate(self.last_modified_fields)}
+        state = queryset.order_by().aggregate(count=Count('pk'), **maxima)
+        changed = [value for key, value in state.items() if key != 'count' and value is not None]
+        return state['count'], max(changed).timestamp() if changed else None
+
+    def get_etag(self, request, count, last_modified):
+        source = f'{request.get_full_path()}|{request.accepted_renderer.format}|{count}|{last_modified}'
+        return quote_etag(hashlib.md5(source.encode()).hexdigest())
+
+    def is_expanded(self, request):
+        """
+        Развернуты ли связанные объекты (?expand=, ExpandableFieldsMixin): их изменения
+        не меняют last_modified_fields, поэтому валидаторов у такого ответа нет
+        """
+
+        serializer_class = self.get_serializer_class()
+        expandable = getattr(serializer_class, 'expandable_fields', None)
+        if not expandable:
+            return False
+        expand = request.query_params.get(getattr(serializer_class, 'expand_query_param', 'expand'), '')
+        return not expandable.keys().isdisjoint(expand.split(','))
+
+    def conditional_response(self, queryset, handler, request, *args, **kwargs):
+        if self.is_expanded(request):
+            return handler(request, *args, **kwargs)
+        count, last_modified = self.get_resource_state(queryset)
+        self.resource_count = count
+        etag = self.get_etag(request, count, last_modified)
+        if is_not_modified(request, etag, last_modified):
+            return not_modified_response(etag, last_modified)
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            set_validators(response, etag, last_modified)
+        return response
@@ -0,0 +1,66 @@
+"""
+Повтор записи при блокировке SQLite ("database is locked").
+
+В продакшен-профиле (settings.py, DJANGO_DB_PROFILE=production) записи начинаются
+с BEGIN IMMEDIATE и ждут освобождения БД до timeout. Если ожидание все же
+закончилось ошибкой, обработчик запроса повторяется целиком в новой транзакции:
+транзакция откатывается полностью, поэтому повтор не создает дубликатов
+"""
+import functools
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+
+LOCKED_MESSAGES = ('database is locked', 'database table is locked', 'database is busy')
+
+
+def is_locked_error(exc):
+    return isinstance(exc, OperationalError) and any(message in str(exc) for message in LOCKED_MESSAGES)
+
+
+def retry_on_locked(func, attempts=None, backoff=None):
+    """
+    Выполняет func в транзакции и повторяет ее при блокировке БД
+    с экспоненциальной паузой. Внутри внешней транзакции повтор невозможен,
+    поэтому там func выполняется один раз
+    :param attempts: количество попыток (по умолчанию API_WRITE_RETRY_ATTEMPTS)
+    :param backoff: начальная пауза, секунды (по умолчанию API_WRITE_RETRY_BACKOFF)
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if connection.in_atomic_block:
+            return func(*args, **kwargs)
+
+        total = attempts or getattr(settings, 'API_WRITE_RETRY_ATTEMPTS', 5)
+        delay = backoff if backoff is not None else getattr(settings, 'API_WRITE_RETRY_BACKOFF', 0.05)
+        for attempt in range(1, total + 1):
+            try:
+                with transaction.atomic():
+                    return func(*args, **kwargs)
+            except OperationalError as exc:
+                if attempt == total or not is_locked_error(exc):
+                    raise
+            time.sleep(delay * random.uniform(0.5, 1.5))  # разброс, чтобы писатели не просыпались одновременно
+            delay *= 2
+
+    return wrapper
+
+
+class WriteRetryMixin:
+    """
+    Примесь к ModelViewSet: обработчики POST/PUT/PATCH/DELETE (в том числе
+    дополнительные действия, например bulk) выполняются через retry_on_locked.
+    Данные запроса DRF разбирает один раз, поэтому повтор видит тот же request.data
+    """
+
+    write_methods = ('post', 'put', 'patch', 'delete')
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method.lower() in self.write_methods:
+            handler = getattr(self, request.method.lower(), None)
+            if handler is not None:
+                setattr(self, request.method.lower(), retry_on_locked(handler))
+        return super().dispatch(request, *args, **kwargs)
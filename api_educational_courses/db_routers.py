@@ -0,0 +1,114 @@
+"""
+Чтение с реплик: запросы GET/HEAD/OPTIONS читают из реплики, запись и все
+остальные запросы - из основной БД (default).
+
+Решение принимает ReplicaRoutingMiddleware для каждого запроса и сохраняет его
+в contextvar, который учитывает ReplicaRouter. После изменяющего запроса клиент
+получает cookie, и в течение DATABASE_REPLICA_STICKY_SECONDS его чтения идут в
+основную БД: так он видит свои изменения, даже если реплика еще отстает
+(read-your-writes). Реплики перечисляются в настройке DATABASE_REPLICAS
+"""
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+STICKY_COOKIE = 'db_primary_sticky'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def get_replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+def reads_from_replica():
+    """
+    Допускает ли текущий запрос чтение с реплики (False - чтения идут в основную БД,
+    в том числе если реплики не настроены)
+    """
+
+    return _use_replica.get() and bool(get_replicas())
+
+
+class ReplicaRouter:
+    """
+    Роутер БД: чтение - случайная реплика, если текущий запрос это допускает
+    и основная БД не находится в транзакции; запись и миграции - default
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = get_replicas()
+        if not replicas or not _use_replica.get() or connections['default'].in_atomic_block:
+            return 'default'
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # реплики содержат те же данные, что и основная БД
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in get_replicas()
+
+
+class use_primary:
+    """
+    Контекстный менеджер: чтение из основной БД независимо от запроса
+    (например, сразу после записи вне цикла запрос-ответ)
+    """
+
+    def __enter__(self):
+        self._token = _use_replica.set(False)
+
+    def __exit__(self, *exc_info):
+        _use_replica.reset(self._token)
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Выбор БД для чтения на время запроса и cookie прилипания к основной БД после записи.
+    Поддерживает синхронный и асинхронный режимы, чтобы не добавлять переключение
+    потоков асинхронным представлениям (async_views.py)
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+        return self.finish(request, response)
+
+    async def __acall__(self, request):
+        token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+        return self.finish(request, response)
+
+    @staticmethod
+    def start(request):
+        return _use_replica.set(request.method in SAFE_METHODS and STICKY_COOKIE not in request.COOKIES)
+
+    @staticmethod
+    def finish(request, response):
+        if request.method not in SAFE_METHODS and response.status_code < 400 and get_replicas():
+            response.set_cookie(STICKY_COOKIE, '1', httponly=True, samesite='Lax',
+                                max_age=getattr(settings, 'DATABASE_REPLICA_STICKY_SECONDS', 5))
+        return response
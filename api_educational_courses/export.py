@@ -0,0 +1,122 @@
+"""
+Потоковая выгрузка коллекций: ?format=ndjson или ?format=csv
+
+Строки читаются через QuerySet.iterator(chunk_size=...) и сразу отдаются клиенту
+StreamingHttpResponse, поэтому расход памяти не зависит от размера таблицы.
+Фильтры, поиск и сортировка представления применяются как для обычного списка,
+пагинация не применяется
+"""
+import csv
+import json
+
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+
+def _rows(data):
+    if isinstance(data, dict):
+        return [data]
+    return data or []
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    JSON Lines: один объект на строку
+    """
+
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    @staticmethod
+    def render_row(row):
+        return json.dumps(row, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return ''.join(self.render_row(row) for row in _rows(data)).encode(self.charset)
+
+
+class _Line:
+    """
+    Файлоподобный объект для csv.writer: возвращает записанную строку
+    """
+
+    def write(self, value):
+        return value
+
+
+class CSVRenderer(BaseRenderer):
+    """
+    CSV с заголовком; вложенные списки и словари записываются как JSON
+    """
+
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def __init__(self):
+        self.writer = csv.writer(_Line())
+
+    @staticmethod
+    def format_value(value):
+        if value is None:
+            return ''
+        if isinstance(value, (list, dict)):
+            return json.dumps(value, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'))
+        return value
+
+    def render_header(self, fields):
+        return self.writer.writerow(fields)
+
+    def render_row(self, row, fields):
+        return self.writer.writerow([self.format_value(row.get(field)) for field in fields])
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        rows = _rows(data)
+        if not rows:
+            return b''
+        fields = list(rows[0])
+        lines = [self.render_header(fields)] + [self.render_row(row, fields) for row in rows]
+        return ''.join(lines).encode(self.charset)
+
+
+class StreamingExportMixin:
+    """
+    Примесь к ModelViewSet: list в форматах ndjson/csv отдается потоком без пагинации
+    """
+
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer, CSVRenderer]
+    export_chunk_size = 2000  # строк в одной порции чтения из БД
+
+    def list(self, request, *args, **kwargs):
+        renderer = request.accepted_renderer
+        if isinstance(renderer, (NDJSONRenderer, CSVRenderer)):
+            return self.export(renderer)
+        return super().list(request, *args, **kwargs)
+
+    def export(self, renderer):
+        queryset = self.filter_queryset(self.get_queryset())
+        if not queryset.ordered:
+            queryset = queryset.order_by('pk')
+        # БД выбирается сейчас: строки читаются уже после выхода из middleware (см. db_routers.py)
+        queryset = queryset.using(queryset.db)
+        serializer = self.get_serializer()  # один сериализатор на все строки
+        rows = (serializer.to_representation(obj) for obj in queryset.iterator(chunk_size=self.export_chunk_size))
+
+        if isinstance(renderer, CSVRenderer):
+            fields = [name for name, field in serializer.fields.items() if not field.write_only]
+            lines = (renderer.render_row(row, fields) for row in rows)
+            content = self._prepend(renderer.render_header(fields), lines)
+        else:
+            content = (renderer.render_row(row) for row in rows)
+
+        response = StreamingHttpResponse(content, content_type=f'{renderer.media_type}; charset={renderer.charset}')
+        response['Content-Disposition'] = f'attachment; filename="{self.basename}.{renderer.format}"'
+        return response
+
+    @staticmethod
+    def _prepend(first, rest):
+        yield first
+        yield from rest
@@ -0,0 +1,181 @@
+"""
+Быстрый путь чтения списков (GET list в формате JSON)
+
+Страница читается через values() без создания экземпляров модели, а словари ответа
+строятся заранее скомпилированной функцией: значения берутся по столбцам и преобразуются
+to_representation поля сериализатора только там, где оно меняет значение из БД (даты).
+Ответ совпадает с ответом сериализатора байт в байт, поэтому быстрый путь выбирается,
+только если все поля - обычные поля модели или первичные ключи внешних ключей.
+Для SerializerMethodField, связей M2M и развернутых ?expand= используется обычный list.
+
+Ответы быстрого пути FastJSONRenderer рендерит через orjson, если он установлен.
+Отключается настройкой API_FAST_LIST_ENABLED = False
+"""
+import datetime
+import operator
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, PrimaryKeyRelatedField
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.settings import ISO_8601, api_settings
+
+from .metrics import timed_serialization
+
+try:
+    import orjson
+except ImportError:  # необязательная зависимость: без нее используется стандартный json
+    orjson = None
+
+# Поле сериализатора -> поля модели, значения которых to_representation возвращает без изменений
+IDENTITY_FIELDS = [
+    (serializers.CharField, (models.CharField, models.TextField)),
+    (serializers.IntegerField, (models.IntegerField,)),
+    (serializers.BooleanField, (models.BooleanField,)),
+]
+# Поля, to_representation которых возвращает строку или целое: orjson выведет их так же, как json
+NATIVE_FIELDS = (serializers.DateTimeField, serializers.DateField, serializers.TimeField, serializers.UUIDField,
+                 serializers.IntegerField)
+
+
+def is_identity(field, model_field):
+    if type(field).to_representation is serializers.BigIntegerField.to_representation:
+        # BigIntegerField выводит строку при coerce_to_string
+        return isinstance(model_field, models.IntegerField) \
+            and not getattr(field, 'coerce_to_string', api_settings.COERCE_BIGINT_TO_STRING)
+    # подклассы с собственным to_representation - не подходят
+    return any(type(field).to_representation is field_class.to_representation
+               and isinstance(model_field, model_classes) for field_class, model_classes in IDENTITY_FIELDS)
+
+
+def compile_converter(field):
+    """
+    Преобразование значения из БД в представление поля. Для DateTimeField в формате ISO 8601
+    часовой пояс определяется один раз, а не для каждого значения, как в to_representation
+    """
+
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if type(field).to_representation is not serializers.DateTimeField.to_representation \
+            or type(field).enforce_timezone is not serializers.DateTimeField.enforce_timezone \
+            or output_format is None or output_format.lower() != ISO_8601:
+        return field.to_representation
+    field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if field_timezone is None:
+        return field.to_representation
+
+    def convert(value):
+        if not isinstance(value, datetime.datetime) or value.utcoffset() is None:
+            return field.to_representation(value)
+        try:
+            value = value.astimezone(field_timezone).isoformat()
+        except OverflowError:
+            return field.to_representation(value)
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+    return convert
+
+
+def compile_fields(serializer):
+    """
+    :param serializer: сериализатор объекта (ModelSerializer)
+    :return: (столбцы для values(), функция строка -> словарь представления,
+              представление из строк, целых, bool и None) или None, если поле не поддерживается
+    """
+
+    model = serializer.Meta.model
+    names, columns, converters, native = [], [], [], True
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if isinstance(field, (ManyRelatedField, serializers.BaseSerializer)) or field.source == '*' \
+                or '.' in field.source:
+            return None
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            return None
+        if not model_field.concrete or model_field.many_to_many:
+            return None
+
+        if isinstance(field, PrimaryKeyRelatedField):
+            if not (model_field.many_to_one or model_field.one_to_one) or field.pk_field is not None:
+                return None
+        elif not is_identity(field, model_field):
+            converters.append((name, compile_converter(field)))
+            native = native and isinstance(field, NATIVE_FIELDS)
+        names.append(name)
+        columns.append(model_field.attname)
+
+    if not columns:
+        return None
+    getter = operator.itemgetter(*columns)
+    if len(columns) == 1:
+        getter = lambda row, column=columns[0]: (row[column],)  # noqa: E731
+
+    def build(row):
+        data = dict(zip(names, getter(row)))
+        for name, convert in converters:
+            value = data[name]
+            if value is not None:  # как и сериализатор, None выводится без преобразования
+                data[name] = convert(value)
+        return data
+
+    return columns, build, native
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer, который рендерит ответы быстрого пути через orjson.
+    Результат совпадает с JSONRenderer: компактные разделители, UTF-8 без экранирования,
+    экранирование U+2028/U+2029. Остальные ответы рендерятся стандартным json
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        view = (renderer_context or {}).get('view')
+        if orjson is None or data is None or not getattr(view, 'json_native', False) or self.ensure_ascii \
+                or not self.compact or self.get_indent(accepted_media_type or '', renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data)
+        except orjson.JSONEncodeError:  # например, целое больше 64 бит
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+class FastListMixin:
+    """
+    Примесь к ModelViewSet (ставится непосредственно перед ним): быстрый путь list
+    """
+
+    json_native = False  # ответ можно рендерить через orjson (см. FastJSONRenderer)
+
+    def get_fast_list_fields(self):
+        """
+        :return: результат compile_fields или None, если нужен обычный list
+        """
+
+        if not getattr(settings, 'API_FAST_LIST_ENABLED', True) \
+                or not isinstance(self.request.accepted_renderer, JSONRenderer):
+            return None
+        is_cursor_mode = getattr(self.paginator, 'is_cursor_mode', None)
+        if is_cursor_mode is not None and is_cursor_mode(self.request):
+            return None  # позиция курсора берется из полей сортировки, которых может не быть в values()
+        return compile_fields(self.get_serializer())
+
+    def list(self, request, *args, **kwargs):
+        compiled = self.get_fast_list_fields()
+        if compiled is None:
+            return super().list(request, *args, **kwargs)
+
+        columns, build, native = compiled
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None).values(*columns)
+        page = self.paginate_queryset(queryset)
+        rows = page if page is not None else queryset
+        data = timed_serialization(lambda: [build(row) for row in rows])()
+        self.json_native = native
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
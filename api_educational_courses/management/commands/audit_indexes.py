@@ -0,0 +1,124 @@
+import re
+
+from django.core.exceptions import FieldDoesNotExist
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models.constants import LOOKUP_SEP
+from django.utils import timezone
+
+from api_educational_courses.urls import router
+
+# Признаки плана без индекса: полный просмотр таблицы и сортировка во временной структуре
+PLAN_PATTERNS = {
+    'sqlite': {
+        'filter': re.compile(r'\bSCAN (\S+)$', re.MULTILINE),
+        'ordering': re.compile(r'USE TEMP B-TREE FOR ORDER BY'),
+    },
+    'postgresql': {
+        'filter': re.compile(r'Seq Scan on (\S+)'),
+        'ordering': re.compile(r'^\s*(->\s*)?Sort\b', re.MULTILINE),
+    },
+}
+
+# Значения для построения запроса фильтра (сам запрос не выполняется)
+SAMPLE_VALUES = {
+    'BooleanField': True,
+    'DateField': timezone.localdate,
+    'DateTimeField': timezone.now,
+}
+
+
+def resolve_field(model, path):
+    """
+    Последнее поле пути фильтра (course__name -> Course.name) или None для аннотаций
+    """
+
+    field = None
+    for name in path.split(LOOKUP_SEP):
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if field.is_relation:
+            model = field.related_model
+    return field
+
+
+def sample_value(field):
+    if field.is_relation or field.get_internal_type() in ('AutoField', 'BigAutoField', 'IntegerField',
+                                                          'PositiveIntegerField', 'PositiveBigIntegerField'):
+        return 1
+    value = SAMPLE_VALUES.get(field.get_internal_type(), 'x')
+    return value() if callable(value) else value
+
+
+def explain(queryset):
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                # на маленьких таблицах PostgreSQL выбирает Seq Scan и при наличии индекса
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+
+def audit(registry=None):
+    """
+    Проверка filterset_fields и ordering_fields всех представлений роутера
+    :return: список словарей basename, kind, field, status (ok, missing, exempt, skipped), detail
+    """
+
+    patterns = PLAN_PATTERNS.get(connection.vendor)
+    if patterns is None:
+        raise CommandError(f'Аудит не поддерживается для СУБД {connection.vendor}')
+
+    results = []
+    for _prefix, viewset, basename in registry if registry is not None else router.registry:
+        queryset = viewset.queryset.all()
+        exempt = getattr(viewset, 'index_audit_exempt', {})
+        checks = [('filter', name) for name in getattr(viewset, 'filterset_fields', None) or []] \
+            + [('ordering', name) for name in getattr(viewset, 'ordering_fields', None) or []]
+        for kind, name in checks:
+            row = {'basename': basename, 'kind': kind, 'field': name}
+            field = resolve_field(queryset.model, name)
+            if name in exempt:
+                row.update(status='exempt', detail=exempt[name])
+            elif field is None:
+                row.update(status='skipped', detail='вычисляемое поле (аннотация), индекс невозможен')
+            else:
+                if kind == 'filter':
+                    plan = explain(queryset.filter(**{name: sample_value(field)}))
+                else:
+                    plan = explain(queryset.order_by(name)[:1])
+                missing = patterns[kind].search(plan)
+                row.update(status='missing' if missing else 'ok', detail=plan.replace('\n', ' | '))
+            results.append(row)
+    return results
+
+
+class Command(BaseCommand):
+    """
+    Аудит индексов: для каждого поля filterset_fields/ordering_fields представлений API
+    строится план запроса (EXPLAIN QUERY PLAN в SQLite, EXPLAIN в PostgreSQL).
+    Поле без индекса - полный просмотр таблицы при фильтрации или сортировка
+    во временной структуре. Исключения задаются в атрибуте представления
+    index_audit_exempt = {'поле': 'причина'}
+    """
+
+    help = 'Проверяет, что поля фильтрации и сортировки API поддержаны индексами'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help='Выводить планы запросов')
+
+    def handle(self, *args, **options):
+        results = audit()
+        for row in results:
+            style = {'ok': self.style.SUCCESS, 'missing': self.style.ERROR}.get(row['status'], self.style.WARNING)
+            line = f'{row["basename"]:<16}{row["kind"]:<10}{row["field"]:<24}{style(row["status"])}'
+            if row['status'] in ('exempt', 'skipped') or options['verbose_plans'] or row['status'] == 'missing':
+                line += f'  {row["detail"]}'
+            self.stdout.write(line)
+
+        missing = [f'{row["basename"]}.{row["field"]} ({row["kind"]})' for row in results if row['status'] == 'missing']
+        if missing:
+            raise CommandError(f'Нет индекса для: {", ".join(missing)}')
+        self.stdout.write(self.style.SUCCESS('Все поля фильтрации и сортировки поддержаны индексами'))
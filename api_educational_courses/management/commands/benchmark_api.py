@@ -0,0 +1,222 @@
+import itertools
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import override_settings
+
+from api_educational_courses.authentication import ClaimsTokenObtainPairSerializer
+from api_educational_courses.benchmarking import summarize, wsgi_request
+from api_educational_courses.models import Category, Course, Enrollment, Lesson, Review, User, UserProfile
+from api_educational_courses.urls import router
+
+SCENARIOS = ('list', 'filtered', 'search', 'ordering', 'deep_page', 'detail', 'create')
+
+
+class QueryCounter:
+    """
+    execute_wrapper: количество SQL-запросов текущего потока
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def sample_data():
+    """
+    Образцы объектов для параметров запросов (фильтры, поиск, детальный просмотр, создание)
+    :return: словарь basename -> (объект, фильтры, поисковый термин)
+    """
+
+    course = Course.objects.order_by('pk').first()
+    profile = UserProfile.objects.order_by('pk').first()
+    lesson = Lesson.objects.order_by('pk').first()
+    enrollment = Enrollment.objects.order_by('pk').first()
+    review = Review.objects.order_by('pk').first()
+    category = Category.objects.prefetch_related('course').order_by('pk').first()
+    if None in (course, lesson, review, category):
+        raise CommandError('Недостаточно данных: заполните БД командой seed_data')
+    first_word = lambda text: (text or 'a').split()[0]  # noqa: E731
+    return {
+        'courses': (course, {'author': course.author}, first_word(course.description)),
+        'user-profiles': (profile, {'teacher': profile.teacher} if profile else {}, 'a'),
+        'lessons': (lesson, {'lesson_recording_url': lesson.lesson_recording_url}, first_word(lesson.text)),
+        'enrollments': (enrollment, {'user': enrollment.user_id} if enrollment else {}, 'a'),
+        'reviews': (review, {'course': review.course_id, 'rate': review.rate}, first_word(review.text)),
+        'categories': (category, {'course': next((c.pk for c in category.course.all()), course.pk)}, 'a'),
+    }
+
+
+def create_payloads(run, course_id, user_id):
+    """
+    Данные для POST по basename; уникальные поля - с номером запуска и запроса
+    """
+
+    return {
+        'courses': lambda n: {'name': f'bench-{run}-{n}', 'author': 'benchmark'},
+        'lessons': lambda n: {'name': f'b{run}-{n}'[:20], 'text': 'benchmark',
+                              'lesson_recording_url': 'https://example.com/benchmark'},
+        'categories': lambda n: {'name': f'bench-{run}-{n}', 'course': [course_id]},
+        'reviews': lambda n: {'course': course_id, 'user': user_id, 'rate': n % 11, 'text': 'benchmark'},
+        'enrollments': lambda n: {'user': user_id, 'course': [course_id]},
+    }
+
+
+class Command(BaseCommand):
+    """
+    Нагрузочный замер всех эндпоинтов роутера внутри процесса (WSGIHandler, пул потоков):
+    список, фильтр, поиск, сортировка, последняя страница, детальный просмотр, создание.
+    Результаты (req/s, p50/p95/p99, количество SQL-запросов) записываются в JSON
+    и сравниваются с сохраненным базовым файлом. Созданные объекты удаляются после замера
+    """
+
+    help = 'Замеряет производительность эндпоинтов API и сравнивает с базовыми результатами'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Запросов на сценарий')
+        parser.add_argument('--concurrency', type=int, default=4, help='Потоков-клиентов')
+        parser.add_argument('--only', nargs='*', help='Только указанные basename (courses, reviews, ...)')
+        parser.add_argument('--scenarios', nargs='*', choices=SCENARIOS, default=SCENARIOS)
+        parser.add_argument('--cached', action='store_true',
+                            help='Не обходить кэш ответов (по умолчанию каждый запрос уникален)')
+        parser.add_argument('--output', help='Файл для результатов в формате JSON')
+        parser.add_argument('--baseline', help='Файл базовых результатов для сравнения')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Допустимое ухудшение p95 и req/s относительно базовых, доля')
+
+    @override_settings(API_THROTTLE_ENABLED=False)  # замеряется сервер, а не лимит клиента (throttling.py)
+    def handle(self, *args, **options):
+        admin, created = User.objects.get_or_create(username='benchmark_admin',
+                                                    defaults={'is_staff': True, 'is_superuser': True})
+        token = ClaimsTokenObtainPairSerializer.get_token(admin).access_token
+        self.auth = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+        self.handler = WSGIHandler()
+        self.options = options
+        self.unique = itertools.count()
+
+        samples = sample_data()
+        run = int(time.time()) % 100000
+        payloads = create_payloads(run, samples['courses'][0].pk, samples['reviews'][0].user_id)
+
+        results, created_objects = {}, []
+        for prefix, viewset, basename in router.registry:
+            if options['only'] and basename not in options['only']:
+                continue
+            obj, filters, term = samples[basename]
+            requests = {
+                'list': ('GET', f'/{prefix}/', {}),
+                'filtered': ('GET', f'/{prefix}/', filters),
+                'search': ('GET', f'/{prefix}/', {'search': term}),
+                'ordering': ('GET', f'/{prefix}/', {'ordering': f'-{viewset.ordering_fields[-1]}'}),
+                'deep_page': ('GET', f'/{prefix}/', {'page': 'last'}),
+                'detail': ('GET', f'/{prefix}/{obj.pk}/', {}) if obj is not None else None,
+                'create': ('POST', f'/{prefix}/', payloads[basename]) if basename in payloads else None,
+            }
+            for scenario in options['scenarios']:
+                if requests[scenario] is None:
+                    continue
+                key = f'{basename}:{scenario}'
+                results[key], created = self.measure(*requests[scenario])
+                created_objects += [(prefix, pk) for pk in created]
+                self.stdout.write(self.format_row(key, results[key]))
+
+        for prefix, pk in created_objects:
+            wsgi_request(self.handler, f'/{prefix}/{pk}/', 'DELETE', headers=self.auth)
+
+        report = {'meta': self.meta(), 'results': results}
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, indent=2, ensure_ascii=False)
+        if options['baseline']:
+            self.compare(report, options['baseline'], options['tolerance'])
+
+    def measure(self, method, path, params):
+        """
+        :return: (сводка замера, id созданных объектов)
+        """
+
+        def call(index):
+            if method == 'POST':
+                url, body, headers = path, json.dumps(params(index)).encode(), self.auth
+            else:
+                query = dict(params)
+                if not self.options['cached']:
+                    query['_'] = next(self.unique)  # уникальный URL: ответ не берется из кэша
+                url, body, headers = f'{path}?{urlencode(query)}', b'', {}
+            counter = QueryCounter()
+            wrappers = [conn.execute_wrapper(counter) for conn in connections.all()]
+            for wrapper in wrappers:
+                wrapper.__enter__()
+            try:
+                code, content, latency = wsgi_request(self.handler, url, method, body, headers)
+            finally:
+                for wrapper in reversed(wrappers):
+                    wrapper.__exit__(None, None, None)
+            created_pk = json.loads(content).get('id') if method == 'POST' and code == 201 else None
+            return code, latency, counter.count, created_pk
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.options['concurrency']) as executor:
+            calls = list(executor.map(call, range(self.options['requests'])))
+        elapsed = time.perf_counter() - started
+
+        ok = 201 if method == 'POST' else 200
+        result = summarize([latency for _, latency, _, _ in calls], elapsed,
+                           sum(1 for code, _, _, _ in calls if code != ok))
+        queries = [count for _, _, count, _ in calls]
+        result.update(queries_min=min(queries), queries_avg=round(sum(queries) / len(queries), 2),
+                      queries_max=max(queries))
+        return result, [pk for _, _, _, pk in calls if pk is not None]
+
+    @staticmethod
+    def format_row(key, result):
+        return (f'{key:<28}{result["rps"]:>9} req/s  p50 {result["p50_ms"]:>8} мс  p95 {result["p95_ms"]:>8} мс  '
+                f'p99 {result["p99_ms"]:>8} мс  SQL {result["queries_avg"]:>6} (макс. {result["queries_max"]})  '
+                f'ошибок {result["errors"]}')
+
+    def meta(self):
+        return {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'vendor': connection.vendor,
+            'requests': self.options['requests'],
+            'concurrency': self.options['concurrency'],
+            'cached': self.options['cached'],
+            'rows': {model.__name__: model.objects.count() for model in (User, Course, Lesson, Enrollment,
+                                                                         Review, Category)},
+        }
+
+    def compare(self, report, path, tolerance):
+        """
+        Регрессия: p95 или req/s хуже базовых больше чем на tolerance,
+        либо SQL-запросов на запрос или ошибок больше, чем в базовом замере
+        """
+
+        with open(path) as file:
+            baseline = json.load(file)['results']
+
+        regressions = []
+        for key, result in report['results'].items():
+            base = baseline.get(key)
+            if base is None:
+                continue
+            if result['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+                regressions.append(f'{key}: p95 {base["p95_ms"]} -> {result["p95_ms"]} мс')
+            if result['rps'] < base['rps'] * (1 - tolerance):
+                regressions.append(f'{key}: {base["rps"]} -> {result["rps"]} req/s')
+            # минимум не зависит от повторов записи при блокировках (retry_on_locked)
+            if result['queries_min'] > base['queries_min']:
+                regressions.append(f'{key}: SQL-запросов {base["queries_min"]} -> {result["queries_min"]}')
+            if result['errors'] > base['errors']:
+                regressions.append(f'{key}: ошибок {base["errors"]} -> {result["errors"]}')
+
+        if regressions:
+            raise CommandError('Регрессии относительно базовых результатов:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS(f'Регрессий нет (допуск {tolerance:.0%})'))
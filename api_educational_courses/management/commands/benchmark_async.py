@@ -0,0 +1,45 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from api_educational_courses.benchmarking import run_asgi, run_wsgi
+
+DEFAULT_PATHS = ['/courses/', '/lessons/', '/categories/']
+
+
+class Command(BaseCommand):
+    """
+    Сравнение синхронного (WSGI, ModelViewSet) и асинхронного (ASGI, async_views.py)
+    путей чтения каталога: req/s и p99 для одинаковых запросов
+    """
+
+    help = 'Сравнивает req/s и p99 каталога через WSGI и ASGI (/async/...)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', default=DEFAULT_PATHS,
+                            help='Пути синхронного API; асинхронный путь - с префиксом /async')
+        parser.add_argument('--requests', type=int, default=200, help='Количество запросов на путь')
+        parser.add_argument('--concurrency', type=int, default=50, help='Одновременных клиентов')
+        parser.add_argument('--wsgi-threads', type=int, default=8,
+                            help='Потоков WSGI-сервера (одновременно обслуживаемых запросов)')
+        parser.add_argument('--client-delay', type=float, default=0.0,
+                            help='Задержка медленного клиента при чтении ответа, секунды')
+        parser.add_argument('--json', action='store_true', help='Вывести результаты в формате JSON')
+
+    def handle(self, *args, **options):
+        results = []
+        for path in options['paths']:
+            wsgi = run_wsgi(path, options['requests'], options['wsgi_threads'], options['client_delay'])
+            asgi = run_asgi(f'/async{path}', options['requests'], options['concurrency'], options['client_delay'])
+            results.append({'path': path, 'wsgi': wsgi, 'asgi': asgi})
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(f'{"path":<24}{"server":<8}{"req/s":>10}{"p50, ms":>10}{"p99, ms":>10}{"errors":>8}')
+        for result in results:
+            for server in ('wsgi', 'asgi'):
+                row = result[server]
+                self.stdout.write(f'{result["path"]:<24}{server:<8}{row["rps"]:>10}{row["p50_ms"]:>10}'
+                                  f'{row["p99_ms"]:>10}{row["errors"]:>8}')
@@ -0,0 +1,72 @@
+import json
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from api_educational_courses import fastlist
+from api_educational_courses.benchmarking import summarize, wsgi_request
+from api_educational_courses.cache import get_cache
+
+DEFAULT_PATHS = ['/reviews/?page_size=1000&view=full', '/lessons/?page_size=1000&view=full',
+                 '/user_profiles/?page_size=1000']
+MODES = ('serializer', 'fast_json', 'fast_orjson')
+
+
+class Command(BaseCommand):
+    """
+    Сравнение обычного list (ModelSerializer + json) с быстрым путем fastlist.py
+    на стандартном json и на orjson. Запросы выполняются по очереди, кэш ответов
+    очищается перед каждым; тела ответов всех режимов должны совпадать байт в байт
+    """
+
+    help = 'Сравнивает время списков через сериализатор и через быстрый путь (values() + orjson)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', default=DEFAULT_PATHS)
+        parser.add_argument('--requests', type=int, default=30, help='Количество запросов на путь и режим')
+        parser.add_argument('--json', action='store_true', help='Вывести результаты в формате JSON')
+
+    @override_settings(API_THROTTLE_ENABLED=False)  # замеряется сервер, а не лимит клиента (throttling.py)
+    def handle(self, *args, **options):
+        handler = WSGIHandler()
+        results = []
+        for path in options['paths']:
+            bodies, row = {}, {'path': path}
+            for mode in MODES:
+                bodies[mode], row[mode] = self.measure(handler, path, mode, options['requests'])
+            if len(set(bodies.values())) != 1:
+                raise CommandError(f'{path}: ответы режимов различаются')
+            row['speedup'] = round(row['serializer']['p50_ms'] / row['fast_orjson']['p50_ms'], 2)
+            results.append(row)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f'{"path":<40}{"mode":<14}{"req/s":>8}{"p50, ms":>10}{"p99, ms":>10}')
+        for row in results:
+            for mode in MODES:
+                result = row[mode]
+                self.stdout.write(f'{row["path"]:<40}{mode:<14}{result["rps"]:>8}{result["p50_ms"]:>10}'
+                                  f'{result["p99_ms"]:>10}')
+            self.stdout.write(f'{row["path"]:<40}ускорение p50: x{row["speedup"]}')
+
+    @staticmethod
+    def measure(handler, path, mode, requests):
+        if mode == 'fast_orjson' and fastlist.orjson is None:
+            raise CommandError('orjson не установлен: pip install orjson')
+        orjson = fastlist.orjson
+        latencies, body = [], None
+        try:
+            if mode == 'fast_json':
+                fastlist.orjson = None
+            with override_settings(API_FAST_LIST_ENABLED=mode != 'serializer'):
+                for _ in range(requests):
+                    get_cache().clear()
+                    code, body, latency = wsgi_request(handler, path)
+                    if code != 200:
+                        raise CommandError(f'{path}: статус {code}')
+                    latencies.append(latency)
+        finally:
+            fastlist.orjson = orjson
+        return body, summarize(latencies, sum(latencies))
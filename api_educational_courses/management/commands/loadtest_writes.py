@@ -0,0 +1,101 @@
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import got_request_exception
+from django.db import connection
+from django.test import override_settings
+
+from api_educational_courses.authentication import ClaimsTokenObtainPairSerializer
+from api_educational_courses.benchmarking import summarize, wsgi_request
+from api_educational_courses.db import is_locked_error
+from api_educational_courses.models import Course, User
+
+
+class Command(BaseCommand):
+    """
+    Нагрузочный тест конкурентной записи: несколько потоков с заданной суммарной
+    частотой создают отзывы через POST /reviews/ (полный путь запроса: аутентификация,
+    сериализатор, транзакция со сводкой оценок). Тестовый курс удаляется после замера
+    вместе с отзывами. Запускать с профилем БД, который проверяется,
+    например DJANGO_DB_PROFILE=production
+    """
+
+    help = 'Проверяет отсутствие ошибок блокировки SQLite при конкурентной записи отзывов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=16, help='Одновременных писателей (потоков)')
+        parser.add_argument('--rate', type=float, default=100, help='Целевая частота записи, запросов в секунду')
+        parser.add_argument('--duration', type=float, default=10, help='Длительность теста, секунды')
+        parser.add_argument('--keep', action='store_true', help='Не удалять тестовый курс и отзывы')
+        parser.add_argument('--json', action='store_true', help='Вывести результаты в формате JSON')
+
+    @override_settings(API_THROTTLE_ENABLED=False)  # замеряется сервер, а не лимит клиента (throttling.py)
+    def handle(self, *args, **options):
+        user, _ = User.objects.get_or_create(username='loadtest')
+        course = Course.objects.create(name=f'loadtest-{time.time_ns()}'[:30], author='loadtest')
+        token = ClaimsTokenObtainPairSerializer.get_token(user).access_token
+        headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+
+        handler = WSGIHandler()
+        total = max(int(options['rate'] * options['duration']), 1)
+        exceptions = Counter()
+        lock = threading.Lock()
+
+        def on_exception(sender, request=None, **kwargs):
+            exc = sys.exc_info()[1]
+            with lock:
+                exceptions['database is locked' if is_locked_error(exc) else repr(exc)] += 1
+
+        got_request_exception.connect(on_exception)
+        started = time.perf_counter()
+
+        def write(index):
+            delay = started + index / options['rate'] - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)  # равномерная подача запросов с целевой частотой
+            body = json.dumps({'course': course.id, 'user': user.id, 'rate': index % 11, 'text': f'#{index}'})
+            code, _content, latency = wsgi_request(handler, '/reviews/', 'POST', body.encode(), headers)
+            return code, latency
+
+        try:
+            with ThreadPoolExecutor(max_workers=options['writers']) as executor:
+                results = list(executor.map(write, range(total)))
+            elapsed = time.perf_counter() - started
+        finally:
+            got_request_exception.disconnect(on_exception)
+            if not options['keep']:
+                course.delete()
+
+        statuses = Counter(code for code, _ in results)
+        result = summarize([latency for _, latency in results], elapsed, sum(statuses.values()) - statuses[201])
+        result.update(
+            target_rps=options['rate'],
+            writers=options['writers'],
+            statuses=dict(statuses),
+            exceptions=dict(exceptions),
+            journal_mode=self.journal_mode(),
+            profile='production' if settings.DATABASES['default'].get('OPTIONS', {}).get('init_command')
+            else 'default',
+        )
+
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2, ensure_ascii=False))
+        else:
+            for key, value in result.items():
+                self.stdout.write(f'{key:<14}{value}')
+        if result['errors']:
+            raise CommandError(f'Ошибок записи: {result["errors"]}')
+        self.stdout.write(self.style.SUCCESS('Ошибок блокировки нет'))
+
+    @staticmethod
+    def journal_mode():
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            return cursor.fetchone()[0]
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api_educational_courses import recommendations
+
+
+class Command(BaseCommand):
+    """
+    Полный пересчет матрицы совместных записей на курсы и списков похожих курсов.
+    Используется для первоначального заполнения, после пакетной записи (BulkWriteMixin,
+    seed_data) и изменения категорий, а также периодически для исправления расхождений
+    """
+
+    help = 'Пересчитывает похожие курсы по записям на курсы и категориям'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Размер пакета для чтения записей и bulk_create')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        courses = recommendations.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Курсов с похожими: {courses} ({time.perf_counter() - started:.1f} с)'
+        ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from api_educational_courses.models import CourseRatingSummary
+
+
+class Command(BaseCommand):
+    """
+    Полный пересчет таблицы CourseRatingSummary по отзывам.
+    Используется для первоначального заполнения и исправления расхождений
+    """
+
+    help = 'Пересчитывает сводку оценок курсов по таблице отзывов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Размер пакета для bulk_create')
+
+    def handle(self, *args, **options):
+        created = CourseRatingSummary.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано сводок: {created}'))
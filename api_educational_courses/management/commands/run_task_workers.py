@@ -0,0 +1,38 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from api_educational_courses.tasks import WorkerPool, run_pending
+
+
+class Command(BaseCommand):
+    """
+    Отдельный процесс обработчиков фоновых задач (таблица Job, см. tasks.py).
+    Работает до SIGINT/SIGTERM; с --once выполняет готовые задачи и завершается
+    """
+
+    help = 'Запускает обработчики фоновых задач'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Потоков-обработчиков')
+        parser.add_argument('--poll-interval', type=float, default=None,
+                            help='Пауза опроса очереди, секунды (по умолчанию API_TASKS_POLL_INTERVAL)')
+        parser.add_argument('--batch-size', type=int, default=10, help='Задач, которые поток берет за раз')
+        parser.add_argument('--once', action='store_true', help='Выполнить готовые задачи и завершиться')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            processed = run_pending('once', batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Выполнено задач: {processed}'))
+            return
+
+        stopped = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stopped.set())
+        pool = WorkerPool(options['workers'], options['poll_interval'], options['batch_size']).start()
+        self.stdout.write(f'Обработчики задач запущены ({pool.name}, потоков: {pool.workers})')
+        while not stopped.wait(1):
+            pass
+        self.stdout.write('Остановка: ожидание текущих задач')
+        pool.stop()
@@ -0,0 +1,184 @@
+import itertools
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from api_educational_courses import recommendations
+from api_educational_courses.cache import invalidate_all_rows, invalidate_namespace
+from api_educational_courses.models import (Category, Course, CourseRatingSummary, Enrollment, EnrollmentCourse,
+                                            Lesson, Review, User, UserProfile, RATE_MAX, RATE_MIN)
+
+USER_PREFIX = 'seed_user_'
+COURSE_PREFIX = 'Seed course '
+LESSON_PREFIX = 'Seed lesson '
+CATEGORY_PREFIX = 'Seed category '
+
+WORDS = ['python', 'django', 'api', 'данные', 'алгоритмы', 'веб', 'базы', 'тесты', 'асинхронность', 'кэш',
+         'индексы', 'аналитика', 'машинное', 'обучение', 'сети', 'безопасность', 'фронтенд', 'облако']
+AUTHORS = [f'Автор {i}' for i in range(200)]
+TEACHERS = [f'Преподаватель {i}' for i in range(500)]
+
+
+class Command(BaseCommand):
+    """
+    Синтетические данные реалистичного объема для нагрузочных замеров (benchmark_api).
+    Все строки создаются через bulk_create пачками, сводка оценок пересчитывается в конце.
+    Объекты помечены префиксами (seed_user_, Seed course ...), --clear удаляет их
+    """
+
+    help = 'Заполняет БД синтетическими пользователями, курсами, отзывами, записями и категориями'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--courses', type=int, default=5_000)
+        parser.add_argument('--reviews', type=int, default=1_000_000)
+        parser.add_argument('--lessons', type=int, default=2_000)
+        parser.add_argument('--categories', type=int, default=50)
+        parser.add_argument('--max-enrollment-courses', type=int, default=5,
+                            help='Максимум курсов в одной записи (у каждого пользователя одна запись)')
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help='Множитель всех объемов, например 0.01 для быстрой проверки')
+        parser.add_argument('--batch-size', type=int, default=5_000)
+        parser.add_argument('--seed', type=int, default=42, help='Начальное значение генератора случайных чисел')
+        parser.add_argument('--clear', action='store_true', help='Удалить ранее созданные синтетические данные')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        if options['clear']:
+            self.clear()
+            return
+
+        self.random = random.Random(options['seed'])
+        scale = options['scale']
+        counts = {name: max(int(options[name] * scale), 1)
+                  for name in ('users', 'courses', 'reviews', 'lessons', 'categories')}
+
+        user_ids = self.step('Пользователи', self.create_users, counts['users'])
+        course_ids = self.step('Курсы', self.create_courses, counts['courses'])
+        self.step('Уроки', self.create_lessons, counts['lessons'])
+        self.step('Категории', self.create_categories, counts['categories'], course_ids)
+        self.step('Записи на курсы', self.create_enrollments, user_ids, course_ids,
+                  options['max_enrollment_courses'])
+        self.step('Отзывы', self.create_reviews, counts['reviews'], user_ids, course_ids)
+        self.step('Сводка оценок', CourseRatingSummary.rebuild, batch_size=self.batch_size)
+        self.step('Похожие курсы', recommendations.rebuild, batch_size=self.batch_size)
+        self.step('Статистика планировщика', self.analyze)
+        self.invalidate_caches()
+
+    @staticmethod
+    def analyze():
+        # после массовой загрузки: планы запросов и оценка количества строк (CachedCountMixin)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    @staticmethod
+    def invalidate_caches():
+        # bulk_create не отправляет сигналы сброса кэша ответов и количества строк
+        for namespace in ('courses', 'lessons', 'categories'):
+            invalidate_namespace(namespace)
+        invalidate_all_rows()
+
+    def step(self, title, func, *args, **kwargs):
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.stdout.write(f'{title}: {time.perf_counter() - started:.1f} с')
+        return result
+
+    def bulk_create(self, model, objects):
+        """
+        Создание пачками; объекты генерируются лениво, в памяти одна пачка
+        :return: список id созданных объектов
+        """
+
+        ids, batch = [], []
+        with transaction.atomic():
+            for obj in objects:
+                batch.append(obj)
+                if len(batch) == self.batch_size:
+                    ids += [created.pk for created in model.objects.bulk_create(batch)]
+                    batch = []
+            if batch:
+                ids += [created.pk for created in model.objects.bulk_create(batch)]
+        return ids
+
+    def text(self, words):
+        return ' '.join(self.random.choice(WORDS) for _ in range(words))
+
+    def create_users(self, count):
+        password = make_password('password')  # один хэш на всех: хэширование - самая дорогая часть
+        start = User.objects.filter(username__startswith=USER_PREFIX).count()
+        user_ids = self.bulk_create(User, (
+            User(username=f'{USER_PREFIX}{start + i}', password=password, email=f'{USER_PREFIX}{start + i}@example.com')
+            for i in range(count)
+        ))
+        self.bulk_create(UserProfile, (
+            UserProfile(user_id=user_id, name=f'Студент {user_id}', teacher=self.random.choice(TEACHERS))
+            for user_id in user_ids
+        ))
+        return user_ids
+
+    def create_courses(self, count):
+        start = Course.objects.filter(name__startswith=COURSE_PREFIX).count()
+        return self.bulk_create(Course, (
+            Course(name=f'{COURSE_PREFIX}{start + i}', description=self.text(12), author=self.random.choice(AUTHORS))
+            for i in range(count)
+        ))
+
+    def create_lessons(self, count):
+        start = Lesson.objects.filter(name__startswith=LESSON_PREFIX).count()
+        return self.bulk_create(Lesson, (
+            Lesson(name=f'{LESSON_PREFIX}{start + i}', text=self.text(60),
+                   lesson_recording_url=f'https://video.example.com/{start + i}')
+            for i in range(count)
+        ))
+
+    def create_categories(self, count, course_ids):
+        start = Category.objects.filter(name__startswith=CATEGORY_PREFIX).count()
+        category_ids = self.bulk_create(Category, (Category(name=f'{CATEGORY_PREFIX}{start + i}') for i in range(count)))
+        through = Category.course.through
+        self.bulk_create(through, (
+            through(category_id=category_id, course_id=course_id)
+            for course_id in course_ids
+            for category_id in self.random.sample(category_ids, min(self.random.randint(1, 3), len(category_ids)))
+        ))
+        return category_ids
+
+    def create_enrollments(self, user_ids, course_ids, max_courses):
+        enrollment_ids = self.bulk_create(Enrollment, (Enrollment(user_id=user_id) for user_id in user_ids))
+        self.bulk_create(EnrollmentCourse, (
+            EnrollmentCourse(enrollment_id=enrollment_id, course_id=course_id)
+            for enrollment_id in enrollment_ids
+            for course_id in self.random.sample(course_ids, min(self.random.randint(1, max_courses), len(course_ids)))
+        ))
+        return enrollment_ids
+
+    def create_reviews(self, count, user_ids, course_ids):
+        # каждый десятый курс популярнее остальных, оценки смещены к высоким
+        course_weights = list(itertools.accumulate(5 if index % 10 == 0 else 1 for index in range(len(course_ids))))
+        rates = list(range(RATE_MIN, RATE_MAX + 1))
+        rate_weights = list(itertools.accumulate([1, 1, 1, 1, 2, 3, 4, 6, 8, 8, 6][:len(rates)]))
+        return self.bulk_create(Review, (
+            Review(course_id=self.random.choices(course_ids, cum_weights=course_weights)[0],
+                   user_id=self.random.choice(user_ids),
+                   rate=self.random.choices(rates, cum_weights=rate_weights)[0],
+                   text=self.text(self.random.randint(0, 30)) or None)
+            for _ in range(count)
+        ))
+
+    def clear(self):
+        # сводка оценок пересчитывается ниже целиком, а не по каждому каскадно удаленному отзыву
+        with transaction.atomic(), CourseRatingSummary.manual_updates():
+            deleted = {
+                'users': User.objects.filter(username__startswith=USER_PREFIX).delete()[0],
+                'courses': Course.objects.filter(name__startswith=COURSE_PREFIX).delete()[0],
+                'lessons': Lesson.objects.filter(name__startswith=LESSON_PREFIX).delete()[0],
+                'categories': Category.objects.filter(name__startswith=CATEGORY_PREFIX).delete()[0],
+            }
+        CourseRatingSummary.rebuild(batch_size=self.batch_size)
+        recommendations.rebuild(batch_size=self.batch_size)
+        self.analyze()
+        self.invalidate_caches()
+        self.stdout.write(self.style.SUCCESS(f'Удалено строк (с каскадом): {deleted}'))
@@ -0,0 +1,34 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    """
+    Локальная замена репликации для SQLite: копирует основную БД в файлы реплик
+    (DJANGO_DB_REPLICAS) через online backup API, не останавливая запись.
+    В продакшене реплики поддерживаются средствами репликации СУБД
+    """
+
+    help = 'Копирует основную БД SQLite в файлы реплик для чтения'
+
+    def handle(self, *args, **options):
+        default = settings.DATABASES['default']
+        if default['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('Команда предназначена только для SQLite')
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('Реплики не заданы: укажите пути в DJANGO_DB_REPLICAS')
+
+        source = sqlite3.connect(default['NAME'])
+        try:
+            for alias in settings.DATABASE_REPLICAS:
+                path = settings.DATABASES[alias]['NAME']
+                target = sqlite3.connect(path)
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write(self.style.SUCCESS(f'{alias}: {path}'))
+        finally:
+            source.close()
@@ -0,0 +1,257 @@
+"""
+Метрики запросов API: по имени маршрута и методу собираются количество SQL-запросов,
+время SQL, время сериализации (to_representation и рендеринг ответа), размер ответа
+и общее время. Значения накапливаются в гистограммах процесса и отдаются на /metrics/
+в текстовом формате Prometheus (каждый процесс сервера отдает свои значения).
+
+Повтор одного шаблона SQL больше API_N_PLUS_ONE_THRESHOLD раз за запрос (признак N+1)
+и запросы дольше API_SLOW_QUERY_MS записываются в лог api_educational_courses.queries
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger('api_educational_courses.queries')
+
+_current = ContextVar('request_metrics', default=None)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    """
+    Гистограмма Prometheus с метками (потокобезопасная)
+    """
+
+    def __init__(self, name, documentation, buckets, label_names=('route', 'method')):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.label_names = label_names
+        self._values = {}  # метки -> [счетчики корзин, сумма, количество]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.label_names)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0, 0)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    @staticmethod
+    def _labels(pairs):
+        return ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                        for name, value in pairs)
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, (counts, total, count) in values:
+            labels = list(zip(self.label_names, key))
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{self._labels(labels + [("le", bound)])}}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{self._labels(labels + [("le", "+Inf")])}}} {count}')
+            lines.append(f'{self.name}_sum{{{self._labels(labels)}}} {total}')
+            lines.append(f'{self.name}_count{{{self._labels(labels)}}} {count}')
+        return lines
+
+
+REQUEST_DURATION = Histogram('api_request_duration_seconds', 'Время обработки запроса', DURATION_BUCKETS)
+DB_QUERIES = Histogram('api_db_queries', 'Количество SQL-запросов за запрос', QUERY_BUCKETS)
+DB_DURATION = Histogram('api_db_duration_seconds', 'Суммарное время SQL за запрос', DURATION_BUCKETS)
+SERIALIZATION_DURATION = Histogram('api_serialization_duration_seconds',
+                                   'Время сериализации и рендеринга ответа', DURATION_BUCKETS)
+RESPONSE_SIZE = Histogram('api_response_size_bytes', 'Размер тела ответа', SIZE_BUCKETS)
+HISTOGRAMS = [REQUEST_DURATION, DB_QUERIES, DB_DURATION, SERIALIZATION_DURATION, RESPONSE_SIZE]
+
+_IN_LIST = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+_NUMBER = re.compile(r'\b\d+\b')
+
+
+def sql_template(sql):
+    """
+    Шаблон запроса: списки параметров IN (...) и числа в тексте (LIMIT/OFFSET) схлопываются
+    """
+
+    return _NUMBER.sub('N', _IN_LIST.sub('(%s, ...)', sql))
+
+
+class RequestMetrics:
+    """
+    Метрики одного запроса (собираются обертками execute и сериализатора)
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.serialization_seconds = 0.0
+        self.templates = Counter()
+        self.slow_queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.sql_seconds += elapsed
+            self.templates[sql_template(sql)] += 1
+            if elapsed * 1000 >= getattr(settings, 'API_SLOW_QUERY_MS', 200):
+                self.slow_queries.append((elapsed, sql))
+
+
+def timed_serialization(func):
+    """
+    Время выполнения func добавляется к времени сериализации текущего запроса
+    """
+
+    def wrapper(*args, **kwargs):
+        metrics = _current.get()
+        if metrics is None:
+            return func(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            metrics.serialization_seconds += time.perf_counter() - started
+
+    return wrapper
+
+
+class MetricsMixin:
+    """
+    Примесь к ModelViewSet: учитывает время to_representation сериализатора
+    в метриках запроса (рендеринг учитывает MetricsMiddleware)
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        serializer.to_representation = timed_serialization(serializer.to_representation)
+        return serializer
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Обертка execute всех соединений: запрос учитывается в метриках текущего запроса, если они собираются.
+    Метрики берутся из контекстной переменной, поэтому учитываются и запросы асинхронного ORM,
+    который выполняет их в другом потоке со своими соединениями
+    """
+
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def install_query_recorder(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@receiver(connection_created)
+def install_query_recorder_on_connect(sender, connection, **kwargs):
+    install_query_recorder(connection)
+
+
+class MetricsMiddleware:
+    """
+    Сбор метрик запроса. Должен стоять первым в MIDDLEWARE, чтобы учитывать
+    запросы к БД всех остальных middleware. Поддерживает синхронный и асинхронный режимы,
+    чтобы не добавлять переключение потоков асинхронным представлениям (async_views.py)
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        for connection in connections.all():  # соединения, открытые до подключения обработчика connection_created
+            install_query_recorder(connection)
+        metrics, token, started = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, started)
+
+    async def __acall__(self, request):
+        metrics, token, started = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, started)
+
+    @staticmethod
+    def start():
+        metrics = RequestMetrics()
+        return metrics, _current.set(metrics), time.perf_counter()
+
+    def finish(self, request, response, metrics, started):
+        match = getattr(request, 'resolver_match', None)
+        route = match.view_name if match is not None and match.view_name else 'unmatched'
+        if route != 'metrics':
+            self.record(route, request.method, metrics, response, time.perf_counter() - started)
+        return response
+
+    def process_template_response(self, request, response):
+        """
+        Рендеринг ответа DRF выполняется после этого хука: засекаем его время
+        """
+
+        response.render = timed_serialization(response.render)
+        return response
+
+    @staticmethod
+    def record(route, method, metrics, response, elapsed):
+        labels = {'route': route, 'method': method}
+        REQUEST_DURATION.observe(elapsed, **labels)
+        DB_QUERIES.observe(metrics.queries, **labels)
+        DB_DURATION.observe(metrics.sql_seconds, **labels)
+        SERIALIZATION_DURATION.observe(metrics.serialization_seconds, **labels)
+        if not response.streaming:
+            RESPONSE_SIZE.observe(len(response.content), **labels)
+
+        threshold = getattr(settings, 'API_N_PLUS_ONE_THRESHOLD', 10)
+        for template, count in metrics.templates.items():
+            if count > threshold:
+                logger.warning('N+1: %s %s - шаблон выполнен %d раз: %s', method, route, count, template)
+        for seconds, sql in metrics.slow_queries:
+            logger.warning('Медленный запрос: %s %s - %.1f мс: %s', method, route, seconds * 1000, sql)
+
+
+def metrics_view(request):
+    """
+    Метрики в текстовом формате Prometheus. Доступ - с адресов API_METRICS_ALLOWED_IPS
+    """
+
+    if request.META.get('REMOTE_ADDR') not in getattr(settings, 'API_METRICS_ALLOWED_IPS', ['127.0.0.1', '::1']):
+        return HttpResponseForbidden()
+    lines = [line for histogram in HISTOGRAMS for line in histogram.expose()]
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
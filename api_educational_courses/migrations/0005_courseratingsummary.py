@@ -0,0 +1,66 @@
+# Generated by Django 5.2 on 2026-10-18 13:08
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_rating_summary(apps, schema_editor):
+    """
+    Первоначальное заполнение сводки оценок по существующим отзывам
+    """
+
+    Course = apps.get_model('api_educational_courses', 'Course')
+    Review = apps.get_model('api_educational_courses', 'Review')
+    CourseRatingSummary = apps.get_model('api_educational_courses', 'CourseRatingSummary')
+
+    buckets = {f'bucket_{score}': models.Count('id', filter=models.Q(rate=score)) for score in range(11)}
+    stats = {
+        row.pop('course'): row
+        for row in Review.objects.order_by().values('course').annotate(
+            count=models.Count('id'), total=models.Sum('rate'), **buckets
+        )
+    }
+    CourseRatingSummary.objects.bulk_create(
+        CourseRatingSummary(course_id=course_id, **stats.get(course_id, {}))
+        for course_id in Course.objects.values_list('id', flat=True)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_educational_courses', '0004_alter_review_rate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseRatingSummary',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_summary', serialize=False, to='api_educational_courses.course')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Количество отзывов')),
+                ('total', models.PositiveBigIntegerField(default=0, verbose_name='Сумма оценок')),
+                ('bucket_0', models.PositiveIntegerField(default=0)),
+                ('bucket_1', models.PositiveIntegerField(default=0)),
+                ('bucket_2', models.PositiveIntegerField(default=0)),
+                ('bucket_3', models.PositiveIntegerField(default=0)),
+                ('bucket_4', models.PositiveIntegerField(default=0)),
+                ('bucket_5', models.PositiveIntegerField(default=0)),
+                ('bucket_6', models.PositiveIntegerField(default=0)),
+                ('bucket_7', models.PositiveIntegerField(default=0)),
+                ('bucket_8', models.PositiveIntegerField(default=0)),
+                ('bucket_9', models.PositiveIntegerField(default=0)),
+                ('bucket_10', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Сводка оценок курса',
+                'verbose_name_plural': 'Сводки оценок курсов',
+            },
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='rate',
+            field=models.IntegerField(default=0, error_messages={'blank': 'ПУстые данные', 'invalid': 'invalid', 'null': 'null', 'required': 'Обязательное поле'}, help_text='От 1 до 10', validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(10)], verbose_name='Оценка'),
+        ),
+        migrations.RunPython(fill_rating_summary, migrations.RunPython.noop),
+    ]
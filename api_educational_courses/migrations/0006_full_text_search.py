@@ -0,0 +1,77 @@
+from django.db import migrations
+
+
+class RunSQLForVendor(migrations.RunSQL):
+    """
+    RunSQL только для одной СУБД (полнотекстовые индексы у SQLite и PostgreSQL разные)
+    """
+
+    def __init__(self, vendor, sql, reverse_sql):
+        self.vendor = vendor
+        super().__init__(sql, reverse_sql)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+# DDL на момент миграции записан здесь, а не берется из search.py: миграция не должна меняться
+# вместе с кодом приложения. search.py восстанавливает те же объекты после migrate (post_migrate),
+# в том числе после отката этой миграции, поэтому создание допускает уже существующие объекты
+
+def sqlite_fts(table, columns):
+    fts = f'{table}_fts'
+    names = ', '.join(columns)
+    new_values = ', '.join(f'new.{column}' for column in columns)
+    old_values = ', '.join(f'old.{column}' for column in columns)
+    return RunSQLForVendor(
+        'sqlite',
+        [
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({names}, '
+            f"content='{table}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+            f'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN '
+            f'INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new_values}); END',
+            f'CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN '
+            f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old_values}); END",
+            f'CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {table} BEGIN '
+            f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old_values}); "
+            f'INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new_values}); END',
+            f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+        ],
+        [
+            f'DROP TRIGGER IF EXISTS {fts}_ai',
+            f'DROP TRIGGER IF EXISTS {fts}_ad',
+            f'DROP TRIGGER IF EXISTS {fts}_au',
+            f'DROP TABLE IF EXISTS {fts}',
+        ],
+    )
+
+
+def postgres_fts(table, columns):
+    document = " || ' ' || ".join(f"coalesce({column}, '')" for column in columns)
+    return RunSQLForVendor(
+        'postgresql',
+        [f"CREATE INDEX IF NOT EXISTS {table}_fts ON {table} USING GIN (to_tsvector('simple', {document}))"],
+        [f'DROP INDEX IF EXISTS {table}_fts'],
+    )
+
+
+class Migration(migrations.Migration):
+    """
+    Полнотекстовые индексы для курсов и уроков (FTS5 в SQLite, GIN по tsvector в PostgreSQL)
+    """
+
+    dependencies = [
+        ('api_educational_courses', '0005_courseratingsummary'),
+    ]
+
+    operations = [
+        sqlite_fts('api_educational_courses_course', ['name', 'description', 'author']),
+        sqlite_fts('api_educational_courses_lesson', ['name', 'text', 'lesson_recording_url']),
+        postgres_fts('api_educational_courses_course', ['name', 'description', 'author']),
+        postgres_fts('api_educational_courses_lesson', ['name', 'text', 'lesson_recording_url']),
+    ]
@@ -0,0 +1,88 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Индексы для полей фильтрации и сортировки API (см. команду audit_indexes).
+    Промежуточная таблица записей на курсы становится явной моделью EnrollmentCourse:
+    таблица, ее столбцы и уникальный индекс уже существуют, поэтому меняется только
+    состояние миграций, а в БД добавляется составной индекс (course, enrollment)
+    """
+
+    dependencies = [
+        ('api_educational_courses', '0007_updated_at'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='EnrollmentCourse',
+                    fields=[
+                        ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                        ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                                     to='api_educational_courses.course')),
+                        ('enrollment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                                         to='api_educational_courses.enrollment')),
+                    ],
+                    options={
+                        'verbose_name': 'Курс записи',
+                        'verbose_name_plural': 'Курсы записи',
+                        'db_table': 'api_educational_courses_enrollment_course',
+                        'unique_together': {('enrollment', 'course')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='enrollment',
+                    name='course',
+                    field=models.ManyToManyField(related_name='enrollments',
+                                                 through='api_educational_courses.EnrollmentCourse',
+                                                 to='api_educational_courses.course'),
+                ),
+            ],
+            database_operations=[],
+        ),
+        migrations.AddIndex(
+            model_name='enrollmentcourse',
+            index=models.Index(fields=['course', 'enrollment'], name='enrollment_course_course_idx'),
+        ),
+        migrations.AlterField(
+            model_name='course',
+            name='author',
+            field=models.CharField(db_index=True, max_length=40, verbose_name='Автор курса'),
+        ),
+        migrations.AlterField(
+            model_name='course',
+            name='description',
+            field=models.CharField(blank=True, db_index=True, help_text='Направление курса? Для кого подойдет?',
+                                   max_length=150, null=True, verbose_name='Описание курса'),
+        ),
+        migrations.AlterField(
+            model_name='lesson',
+            name='lesson_recording_url',
+            field=models.URLField(db_index=True, verbose_name='Ссылка на запись урока'),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='name',
+            field=models.CharField(db_index=True, max_length=40, verbose_name='ФИО студента'),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='teacher',
+            field=models.CharField(db_index=True, max_length=40, verbose_name='ФИО преподавателя'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['course', 'rate'], name='review_course_rate_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['user', 'course'], name='review_user_course_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['rate'], name='review_rate_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2 on 2026-10-18 13:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_educational_courses', '0008_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseCooccurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.IntegerField(default=0, verbose_name='Количество студентов')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api_educational_courses.course')),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api_educational_courses.course')),
+            ],
+            options={
+                'verbose_name': 'Совместные записи на курсы',
+                'verbose_name_plural': 'Совместные записи на курсы',
+                'unique_together': {('course', 'other')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CourseNeighbor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Место')),
+                ('score', models.FloatField(verbose_name='Сходство')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbors', to='api_educational_courses.course')),
+                ('neighbor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api_educational_courses.course')),
+            ],
+            options={
+                'verbose_name': 'Похожий курс',
+                'verbose_name_plural': 'Похожие курсы',
+                'unique_together': {('course', 'rank')},
+            },
+        ),
+    ]
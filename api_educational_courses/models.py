@@ -1,13 +1,33 @@
-from django.db import models
+from django.db import models, transaction
 # from django.contrib.auth.models import User
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth import get_user_model
 from datetime import date, datetime
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
 from django.core import validators
+from django.db.models import F
+from django.db.models.functions import Cast, Coalesce, NullIf
+from django.dispatch import Signal
+from django.utils import timezone
 """
 Рассматриваются 7 таблиц условно обобщающих функционал онлайн-курсов
 """
 
+RATE_MIN = 0  # минимальная оценка отзыва
+RATE_MAX = 10  # максимальная оценка отзыва
+RATE_SCORES = range(RATE_MIN, RATE_MAX + 1)  # все возможные оценки (корзины гистограммы)
+
+# Сигнал об изменении сводки оценок (course_id=None - пересчитаны все курсы)
+rating_summary_changed = Signal()
+# Сводку оценок обновляет вызывающий код, а не сигналы отзывов (CourseRatingSummary.manual_updates)
+_manual_rating_updates = ContextVar('manual_rating_updates', default=False)
+# Сигнал о пакетной записи (bulk_create/bulk_update/delete по списку id не отправляют post_save):
+# sender - модель, pks - id измененных объектов. Для строк связей M2M (sender - промежуточная модель)
+# также action ('post_remove' или 'post_add', как в m2m_changed) и pairs - пары (id объекта, id связанного)
+bulk_write = Signal()
+
 class User(AbstractUser):
     """
     Таблица 'Пользователь', содержащая в себе
@@ -23,15 +43,21 @@ class UserProfile(models.Model):
     name - ФИО студента
     teacher - ФИО преподавателя
     user - связь с таблицей 'Пользователь'
+    updated_at - дата изменения
     """
 
     name = models.CharField(max_length=40,
+                            db_index=True,
                             verbose_name="ФИО студента")
     teacher = models.CharField(max_length=40,
+                               db_index=True,
                                verbose_name="ФИО преподавателя")
     user = models.OneToOneField(User,
                                 on_delete=models.CASCADE,
                                 related_name="user_profile")
+    updated_at = models.DateTimeField(auto_now=True,
+                                      db_index=True,
+                                      verbose_name="Дата изменения")
 
     def __str__(self):
         return self.name
@@ -42,12 +68,36 @@ class UserProfile(models.Model):
 
 
 
+class CourseQuerySet(models.QuerySet):
+    """
+    Набор запросов для таблицы 'Курс'
+    """
+
+    def with_rating_stats(self):
+        """
+        Добавляет к каждому курсу статистику оценок (количество отзывов,
+        средняя оценка, гистограмма) из таблицы CourseRatingSummary.
+        Один LEFT JOIN без группировки, не зависящий от количества отзывов
+        :return: QuerySet
+        """
+
+        buckets = {
+            f'rating_bucket_{score}': Coalesce(f'rating_summary__bucket_{score}', 0)
+            for score in RATE_SCORES
+        }
+        return self.annotate(reviews_count=Coalesce('rating_summary__count', 0),
+                             rating_avg=Cast('rating_summary__total', models.FloatField())
+                                        / NullIf('rating_summary__count', 0),
+                             **buckets)
+
+
 class Course(models.Model):
     """
     Таблица 'Курс', содержащая в себе
     name - название курса
     description - описание курса
     author - автор курса
+    updated_at - дата изменения
     """
 
     name = models.CharField(max_length=30,
@@ -57,14 +107,43 @@ class Course(models.Model):
     description = models.CharField(max_length=150,
                                    null=True,
                                   blank=True,
+                                  db_index=True,
                                   verbose_name="Описание курса",
                                   help_text="Направление курса? Для кого подойдет?")
     author = models.CharField(max_length=40,
+                              db_index=True,
                               verbose_name="Автор курса")
+    updated_at = models.DateTimeField(auto_now=True,
+                                      db_index=True,
+                                      verbose_name="Дата изменения")
+
+    objects = CourseQuerySet.as_manager()
 
     def __str__(self):
         return f'{self.name}, автор: {self.author}'
 
+    def get_rating_stats(self):
+        """
+        Статистика оценок курса: берется из аннотаций with_rating_stats(),
+        а если объект получен без них (например, после создания) - одним запросом
+        :return: dict с ключами count, avg, histogram
+        """
+
+        if not hasattr(self, 'reviews_count'):
+            annotated = Course.objects.with_rating_stats().filter(pk=self.pk).values(
+                'reviews_count', 'rating_avg', *(f'rating_bucket_{score}' for score in RATE_SCORES)
+            ).first() or {}
+            for score in RATE_SCORES:
+                setattr(self, f'rating_bucket_{score}', annotated.get(f'rating_bucket_{score}', 0))
+            self.reviews_count = annotated.get('reviews_count', 0)
+            self.rating_avg = annotated.get('rating_avg')
+
+        return {
+            'count': self.reviews_count,
+            'avg': self.rating_avg,
+            'histogram': {str(score): getattr(self, f'rating_bucket_{score}') for score in RATE_SCORES},
+        }
+
     class Meta:
         verbose_name = "Курс"
         verbose_name_plural = "Курсы"
@@ -76,6 +155,7 @@ class Lesson(models.Model):
     name - название урока
     text - описание урока
     lesson_recording_url - ссылка на запись урока
+    updated_at - дата изменения
     """
 
     name = models.CharField(max_length=20,
@@ -86,7 +166,11 @@ class Lesson(models.Model):
                             null=False,
                             help_text="Содержание лекции")
     lesson_recording_url = models.URLField(max_length=200,
+                                           db_index=True,
                                            verbose_name="Ссылка на запись урока")
+    updated_at = models.DateTimeField(auto_now=True,
+                                      db_index=True,
+                                      verbose_name="Дата изменения")
 
     def __str__(self):
         return self.name
@@ -101,12 +185,16 @@ class Enrollment(models.Model):
     Таблица 'Запись на курс', содержащая в себе
     user - связь с конкретным пользователем, записанным на курсы
     course - курс обучения
+    updated_at - дата изменения (в том числе состава курсов)
     """
     user = models.ForeignKey(User,
                              on_delete=models.CASCADE,
                              related_name="enrollments",
                              verbose_name="Пользователь")
-    course = models.ManyToManyField('Course', related_name='enrollments')
+    course = models.ManyToManyField('Course', related_name='enrollments', through='EnrollmentCourse')
+    updated_at = models.DateTimeField(auto_now=True,
+                                      db_index=True,
+                                      verbose_name="Дата изменения")
 
     def __str__(self):
         # course_list = []
@@ -119,6 +207,28 @@ class Enrollment(models.Model):
         verbose_name_plural = "Записи"
 
 
+class EnrollmentCourse(models.Model):
+    """
+    Промежуточная таблица 'Запись - курс' (до миграции 0008 создавалась Django автоматически).
+    Составной индекс (course, enrollment) покрывает выборку записей курса
+    без обращения к строкам таблицы
+    """
+
+    id = models.BigAutoField(primary_key=True)  # как у автоматически созданной таблицы (DEFAULT_AUTO_FIELD)
+    enrollment = models.ForeignKey(Enrollment, on_delete=models.CASCADE)
+    course = models.ForeignKey('Course', on_delete=models.CASCADE)
+
+    class Meta:
+        db_table = 'api_educational_courses_enrollment_course'
+        unique_together = [('enrollment', 'course')]
+        indexes = [models.Index(fields=['course', 'enrollment'], name='enrollment_course_course_idx')]
+        verbose_name = "Курс записи"
+        verbose_name_plural = "Курсы записи"
+
+    def __str__(self):
+        return f'{self.enrollment_id} - {self.course_id}'
+
+
 class Review(models.Model):
     """
     Таблица 'Отзывы', содержащая в себе
@@ -126,6 +236,7 @@ class Review(models.Model):
     user - связь с конкретным пользователем, автором отзыва
     text - текст отзыва
     rate - оценка
+    updated_at - дата изменения
     """
 
     course = models.ForeignKey(Course,
@@ -142,16 +253,39 @@ class Review(models.Model):
                              default=0,
                              verbose_name="Оценка",
                              help_text="От 1 до 10",
-                               validators=[validators.MinValueValidator(0), validators.MaxValueValidator(10)],
+                               validators=[validators.MinValueValidator(RATE_MIN), validators.MaxValueValidator(RATE_MAX)],
                                error_messages={'blank': 'ПУстые данные', 'required': 'Обязательное поле', 'null':'null', 'invalid':'invalid'})
+    updated_at = models.DateTimeField(auto_now=True,
+                                      db_index=True,
+                                      verbose_name="Дата изменения")
 
 
     def __str__(self):
         return f'({self.rate:.0f}/10) {self.course}, студент: {self.user}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_rating()
+        return instance
+
+    def remember_rating(self):
+        """
+        Запоминает сохраненные в БД курс и оценку: по ним сигнал post_save исключает
+        прежнюю оценку из сводки (CourseRatingSummary) без дополнительного запроса
+        """
+
+        if 'course_id' in self.__dict__ and 'rate' in self.__dict__:  # не отложенные поля
+            self._saved_rating = (self.course_id, self.rate)
+
     class Meta:
         verbose_name = "Отзыв"
         verbose_name_plural = "Отзывы"
+        indexes = [
+            models.Index(fields=['course', 'rate'], name='review_course_rate_idx'),  # фильтр ?course=&rate=
+            models.Index(fields=['user', 'course'], name='review_user_course_idx'),  # отзывы пользователя по курсу
+            models.Index(fields=['rate'], name='review_rate_idx'),  # фильтр ?rate= без курса
+        ]
 
 
 class Category(models.Model):
@@ -159,6 +293,7 @@ class Category(models.Model):
     Таблица 'Категории', содержащая в себе
     name - название категории
     course - курсы категории
+    updated_at - дата изменения (в том числе состава курсов)
     """
 
     name = models.CharField(max_length=30,
@@ -166,6 +301,9 @@ class Category(models.Model):
                             verbose_name="Название категории",
                             help_text="Название категории уникальное. Ограничение 15 знаков")
     course = models.ManyToManyField('Course', related_name='categories')
+    updated_at = models.DateTimeField(auto_now=True,
+                                      db_index=True,
+                                      verbose_name="Дата изменения")
 
     def __str__(self):
         return self.name
@@ -173,3 +311,216 @@ class Category(models.Model):
     class Meta:
         verbose_name = "Категория"
         verbose_name_plural = "Категории"
+
+
+class CourseRatingSummary(models.Model):
+    """
+    Таблица 'Сводка оценок курса' (денормализованная), содержащая в себе
+    course - связь с курсом
+    count - количество отзывов
+    total - сумма оценок
+    bucket_0 ... bucket_10 - количество отзывов с соответствующей оценкой
+    updated_at - дата изменения
+    Обновляется инкрементально сигналами записи и удаления отзывов (signals.py), в том числе
+    каскадного, и пакетными операциями; пересчитывается командой rebuild_rating_summary
+    """
+
+    course = models.OneToOneField(Course,
+                                  on_delete=models.CASCADE,
+                                  primary_key=True,
+                                  related_name='rating_summary')
+    count = models.PositiveIntegerField(default=0, verbose_name="Количество отзывов")
+    total = models.PositiveBigIntegerField(default=0, verbose_name="Сумма оценок")
+    bucket_0 = models.PositiveIntegerField(default=0)
+    bucket_1 = models.PositiveIntegerField(default=0)
+    bucket_2 = models.PositiveIntegerField(default=0)
+    bucket_3 = models.PositiveIntegerField(default=0)
+    bucket_4 = models.PositiveIntegerField(default=0)
+    bucket_5 = models.PositiveIntegerField(default=0)
+    bucket_6 = models.PositiveIntegerField(default=0)
+    bucket_7 = models.PositiveIntegerField(default=0)
+    bucket_8 = models.PositiveIntegerField(default=0)
+    bucket_9 = models.PositiveIntegerField(default=0)
+    bucket_10 = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True,
+                                      db_index=True,
+                                      verbose_name="Дата изменения")
+
+    def __str__(self):
+        return f'{self.course_id}: {self.count} отзывов'
+
+    @classmethod
+    @contextmanager
+    def manual_updates(cls):
+        """
+        Внутри блока сигналы записи отзывов не обновляют сводку: ее обновляет вызывающий
+        код, например пакетные операции - одним UPDATE на курс (ReviewViewSet.perform_bulk_*)
+        """
+
+        token = _manual_rating_updates.set(True)
+        try:
+            yield
+        finally:
+            _manual_rating_updates.reset(token)
+
+    @classmethod
+    def is_updated_manually(cls):
+        return _manual_rating_updates.get()
+
+    @classmethod
+    def apply_review(cls, course_id, rate, sign=1):
+        """
+        Атомарно учитывает (sign=1) или исключает (sign=-1) оценку отзыва.
+        Используются F()-выражения, поэтому параллельные записи не теряют обновлений
+        :param course_id: id курса
+        :param rate: оценка отзыва
+        :param sign: 1 - отзыв добавлен, -1 - отзыв удален
+        """
+
+        cls.apply_reviews(course_id, [rate], sign)
+
+    @classmethod
+    def apply_reviews(cls, course_id, rates, sign=1):
+        """
+        То же, что apply_review, для нескольких отзывов одного курса одним UPDATE
+        :param rates: оценки отзывов
+        """
+
+        rates = list(rates)
+        changes = {
+            'count': F('count') + sign * len(rates),
+            'total': F('total') + sign * sum(rates),
+            'updated_at': timezone.now(),
+        }
+        for rate, number in Counter(rates).items():
+            if rate in RATE_SCORES:  # старые отзывы могли быть сохранены до появления валидации оценки
+                changes[f'bucket_{rate}'] = F(f'bucket_{rate}') + sign * number
+        with transaction.atomic():
+            if not cls.objects.filter(course_id=course_id).update(**changes):
+                cls.objects.get_or_create(course_id=course_id)
+                cls.objects.filter(course_id=course_id).update(**changes)
+        rating_summary_changed.send(sender=cls, course_id=course_id)
+
+    @classmethod
+    def rebuild(cls, batch_size=1000):
+        """
+        Полностью пересчитывает сводку по таблице отзывов (один агрегирующий
+        запрос и пакетная вставка)
+        :param batch_size: размер пакета для bulk_create
+        :return: количество созданных строк
+        """
+
+        buckets = {
+            f'bucket_{score}': models.Count('id', filter=models.Q(rate=score))
+            for score in RATE_SCORES
+        }
+        stats = {
+            row.pop('course'): row
+            for row in Review.objects.order_by().values('course').annotate(
+                count=models.Count('id'), total=models.Sum('rate'), **buckets
+            )
+        }
+        summaries = (cls(course_id=course_id, **stats.get(course_id, {}))
+                     for course_id in Course.objects.values_list('id', flat=True).iterator())
+        with transaction.atomic():
+            cls.objects.all().delete()
+            created = cls.objects.bulk_create(summaries, batch_size=batch_size)
+        rating_summary_changed.send(sender=cls, course_id=None)
+        return len(created)
+
+    class Meta:
+        verbose_name = "Сводка оценок курса"
+        verbose_name_plural = "Сводки оценок курсов"
+
+
+class CourseCooccurrence(models.Model):
+    """
+    Таблица 'Совместные записи на курсы' (разреженная матрица курс x курс), содержащая в себе
+    course, other - пара курсов (хранятся обе пары: (a, b) и (b, a))
+    count - количество студентов, записанных на оба курса; при course = other - на сам курс
+    Строки курсов пересчитываются фоновой задачей после записи на них, вся матрица -
+    командой rebuild_course_neighbors (см. recommendations.py)
+    """
+
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='+')
+    other = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='+')
+    count = models.IntegerField(default=0, verbose_name="Количество студентов")
+
+    def __str__(self):
+        return f'{self.course_id} - {self.other_id}: {self.count}'
+
+    class Meta:
+        unique_together = [('course', 'other')]
+        verbose_name = "Совместные записи на курсы"
+        verbose_name_plural = "Совместные записи на курсы"
+
+
+class CourseNeighbor(models.Model):
+    """
+    Таблица 'Похожие курсы' (top-K по матрице совместных записей), содержащая в себе
+    course - курс
+    neighbor - похожий курс
+    rank - место в списке похожих (с 0)
+    score - мера сходства
+    """
+
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='neighbors')
+    neighbor = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField(verbose_name="Место")
+    score = models.FloatField(verbose_name="Сходство")
+
+    def __str__(self):
+        return f'{self.course_id} -> {self.neighbor_id} ({self.score:.3f})'
+
+    class Meta:
+        unique_together = [('course', 'rank')]  # индекс (course, rank) - выборка top-K без сортировки
+        verbose_name = "Похожий курс"
+        verbose_name_plural = "Похожие курсы"
+
+
+class Job(models.Model):
+    """
+    Таблица 'Фоновая задача' (очередь задач без внешнего брокера, см. tasks.py), содержащая в себе
+    name - имя зарегистрированной задачи
+    args, kwargs - аргументы вызова (JSON)
+    dedupe_key - ключ дедупликации: в очереди не больше одной ожидающей задачи с этим ключом
+    status - состояние: pending - ожидает, running - выполняется, failed - попытки исчерпаны
+    (выполненные задачи удаляются)
+    attempts, max_attempts - выполненные и допустимые попытки
+    run_after - время, не раньше которого задача выполняется (отложенный повтор)
+    claimed_by - обработчик, взявший задачу
+    last_error - ошибка последней попытки
+    created_at, updated_at - даты создания и изменения
+    """
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUSES = [(PENDING, 'Ожидает'), (RUNNING, 'Выполняется'), (FAILED, 'Ошибка')]
+
+    name = models.CharField(max_length=100, verbose_name="Задача")
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    dedupe_key = models.CharField(max_length=200, null=True, blank=True, verbose_name="Ключ дедупликации")
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING, verbose_name="Состояние")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Попыток")
+    max_attempts = models.PositiveSmallIntegerField(default=5, verbose_name="Максимум попыток")
+    run_after = models.DateTimeField(default=timezone.now, verbose_name="Выполнить после")
+    claimed_by = models.CharField(max_length=64, blank=True, default='', verbose_name="Обработчик")
+    last_error = models.TextField(blank=True, default='', verbose_name="Ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
+
+    def __str__(self):
+        return f'{self.name} ({self.status}, попыток: {self.attempts})'
+
+    class Meta:
+        verbose_name = "Фоновая задача"
+        verbose_name_plural = "Фоновые задачи"
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),  # выборка готовых задач
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['dedupe_key'], condition=models.Q(status='pending'),
+                                    name='job_pending_dedupe_key'),
+        ]
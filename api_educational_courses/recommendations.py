@@ -0,0 +1,251 @@
+"""
+Похожие курсы: "студенты этого курса также проходили".
+
+Матрица совместных записей курс x курс хранится разреженно в таблице CourseCooccurrence
+(на диагонали - количество студентов курса), top-K соседей каждого курса - в таблице
+CourseNeighbor, поэтому /courses/<id>/similar/ читает K строк по индексу (course, rank).
+
+Сходство - косинусная мера по студентам: совместные / sqrt(студентов a * студентов b),
+плюс API_SIMILAR_COURSES_CATEGORY_WEIGHT * такая же мера по общим категориям.
+Кандидаты - только курсы с общими студентами.
+
+Полный пересчет (rebuild) - один проход по записям на курсы, сгруппированным по студенту,
+в транзакции, которая блокирует запись в матрицу (lock_matrix).
+После записи на курс и отписки (m2m_changed, удаление записи, пакетная запись BulkWriteMixin)
+фоновая задача refresh_cooccurrence пересчитывает строки матрицы этих курсов по текущим записям,
+а затем задачи refresh_neighbors - списки соседей затронутых курсов (см. signals.py, tasks.py).
+После изменения категорий фоновой задачей обновляются списки курсов категории и курсов,
+у которых с ними общие студенты (with_candidates)
+"""
+import itertools
+import math
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+
+from .models import Category, CourseCooccurrence, CourseNeighbor, EnrollmentCourse
+from .tasks import enqueue_many, task
+
+DELETE_BATCH_SIZE = 200  # пар в одном DELETE: глубина выражения WHERE в SQLite ограничена
+
+
+def get_neighbors_count():
+    return getattr(settings, 'API_SIMILAR_COURSES_COUNT', 10)
+
+
+def get_max_user_courses():
+    # у студента с N курсами N * (N - 1) пар: записи "на все курсы" не учитываются в парах
+    return getattr(settings, 'API_SIMILAR_COURSES_MAX_USER_COURSES', 100)
+
+
+def similarity(co_enrolled, students_a, students_b, shared_categories, categories_a, categories_b):
+    score = co_enrolled / math.sqrt(students_a * students_b)
+    if shared_categories:
+        weight = getattr(settings, 'API_SIMILAR_COURSES_CATEGORY_WEIGHT', 0.2)
+        score += weight * shared_categories / math.sqrt(categories_a * categories_b)
+    return score
+
+
+def top_neighbors(course_id, row, students, categories, k):
+    """
+    :param row: {id курса: количество совместных студентов} - строка матрицы
+    :param students: {id курса: количество студентов} - диагональ матрицы
+    :param categories: {id курса: множество id категорий}
+    :return: до k пар (id курса, сходство) по убыванию сходства (при равенстве - по id)
+    """
+
+    own = categories.get(course_id, set())
+    scored = []
+    for other, co_enrolled in row.items():
+        if other == course_id or co_enrolled <= 0 or not students.get(other):
+            continue
+        other_categories = categories.get(other, set())
+        scored.append((other, similarity(co_enrolled, students[course_id], students[other],
+                                         len(own & other_categories), len(own), len(other_categories))))
+    scored.sort(key=lambda item: (-item[1], item[0]))
+    return scored[:k]
+
+
+def course_categories(course_ids=None):
+    through = Category.course.through.objects.all()
+    if course_ids is not None:
+        through = through.filter(course_id__in=course_ids)
+    categories = defaultdict(set)
+    for course_id, category_id in through.values_list('course_id', 'category_id').iterator():
+        categories[course_id].add(category_id)
+    return categories
+
+
+def build_matrix(batch_size=1000, course_ids=None):
+    """
+    Матрица совместных записей одним проходом по записям на курсы, упорядоченным по студенту
+    :param course_ids: только строки этих курсов (проход по записям их студентов)
+    :return: {id курса: Counter {id курса: количество студентов}}
+    """
+
+    max_courses = get_max_user_courses()
+    matrix = defaultdict(Counter)
+    rows = EnrollmentCourse.objects.order_by('enrollment__user_id').values_list('enrollment__user_id', 'course_id')
+    if course_ids is not None:
+        rows = rows.filter(enrollment__user_id__in=EnrollmentCourse.objects.filter(course_id__in=course_ids)
+                           .values('enrollment__user_id'))
+    for _, group in itertools.groupby(rows.iterator(chunk_size=batch_size), key=lambda row: row[0]):
+        courses = {course_id for _, course_id in group}  # студент может быть записан на курс дважды
+        for course_id in (courses if course_ids is None else courses & course_ids):
+            matrix[course_id][course_id] += 1
+            if len(courses) <= max_courses:
+                for other in courses - {course_id}:
+                    matrix[course_id][other] += 1
+    return matrix
+
+
+def lock_matrix():
+    """
+    Блокирует запись в матрицу до конца текущей транзакции: пересчеты (rebuild, refresh_cooccurrence)
+    читают записи на курсы и пишут матрицу по очереди. В PostgreSQL - LOCK TABLE в режиме
+    SHARE ROW EXCLUSIVE (конфликтует сам с собой, чтение не блокирует), в SQLite - пустой UPDATE:
+    он начинает записывающую транзакцию, а она в SQLite одна на всю базу
+    """
+
+    table = connection.ops.quote_name(CourseCooccurrence._meta.db_table)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE')
+        else:
+            cursor.execute(f'UPDATE {table} SET count = count WHERE 0 = 1')
+
+
+@task(name='recommendations.rebuild')
+def rebuild(batch_size=1000):
+    """
+    Полный пересчет матрицы совместных записей и списков похожих курсов.
+    Записи на курсы читаются после блокировки матрицы (lock_matrix)
+    :return: количество курсов, для которых найдены похожие
+    """
+
+    with transaction.atomic():
+        lock_matrix()
+        CourseCooccurrence.objects.all().delete()
+        CourseNeighbor.objects.all().delete()
+
+        matrix = build_matrix(batch_size)
+        categories = course_categories()
+        students = {course_id: row[course_id] for course_id, row in matrix.items()}
+        k = get_neighbors_count()
+        neighbors = {course_id: top_neighbors(course_id, row, students, categories, k)
+                     for course_id, row in matrix.items()}
+
+        CourseCooccurrence.objects.bulk_create(
+            (CourseCooccurrence(course_id=course_id, other_id=other, count=count)
+             for course_id, row in matrix.items() for other, count in row.items()),
+            batch_size=batch_size,
+        )
+        CourseNeighbor.objects.bulk_create(
+            (CourseNeighbor(course_id=course_id, neighbor_id=other, rank=rank, score=score)
+             for course_id, top in neighbors.items() for rank, (other, score) in enumerate(top)),
+            batch_size=batch_size,
+        )
+    return sum(1 for top in neighbors.values() if top)
+
+
+def schedule_cooccurrence_refresh(course_ids):
+    # по задаче на курс: серия записей на популярный курс пересчитает его строку один раз
+    enqueue_many(refresh_cooccurrence,
+                 ((([course_id],), {}, f'course-cooccurrence:{course_id}') for course_id in sorted(course_ids)))
+
+
+def schedule_neighbors_refresh(course_ids):
+    enqueue_many(refresh_neighbors,
+                 ((([course_id],), {}, f'course-neighbors:{course_id}') for course_id in sorted(course_ids)))
+
+
+@task(name='recommendations.refresh_cooccurrence')
+def refresh_cooccurrence(course_ids):
+    """
+    Пересчет строк матрицы курсов (и симметричных им столбцов) по текущим записям на курсы
+    после записи студентов на эти курсы или отписки. Задача выполняется после фиксации,
+    возможно после других записей и полного пересчета, поэтому строки пересчитываются
+    целиком, а не изменяются на разницу: повтор и порядок задач результат не меняют
+    :return: id курсов, списки соседей которых поставлены на обновление
+    """
+
+    course_ids = set(course_ids)
+    if not course_ids:
+        return set()
+    with transaction.atomic():
+        lock_matrix()
+        matrix = build_matrix(course_ids=course_ids)
+        new = {}
+        for course_id, row in matrix.items():
+            for other, count in row.items():
+                new[course_id, other] = new[other, course_id] = count
+        old = {}
+        for course_id, other, count in CourseCooccurrence.objects.filter(course_id__in=course_ids) \
+                .values_list('course_id', 'other_id', 'count'):
+            old[course_id, other] = old[other, course_id] = count
+        removed = [pair for pair in old if pair not in new]
+        changed = [pair for pair, count in new.items() if old.get(pair) != count]
+
+        for start in range(0, len(removed), DELETE_BATCH_SIZE):
+            condition = Q()
+            for a, b in removed[start:start + DELETE_BATCH_SIZE]:
+                condition |= Q(course_id=a, other_id=b)
+            CourseCooccurrence.objects.filter(condition).delete()
+        CourseCooccurrence.objects.bulk_create(
+            [CourseCooccurrence(course_id=a, other_id=b, count=new[a, b]) for a, b in changed],
+            update_conflicts=True, unique_fields=['course', 'other'], update_fields=['count'],
+        )
+
+    affected = course_ids.union(*(pair for pair in removed + changed))
+    schedule_neighbors_refresh(affected)
+    return affected
+
+
+def with_candidates(course_ids):
+    """
+    :return: id курсов и всех курсов, у которых с ними общие студенты - кандидатов в их соседи
+    """
+
+    course_ids = set(course_ids)
+    return course_ids.union(CourseCooccurrence.objects.filter(course_id__in=course_ids, count__gt=0)
+                            .values_list('other_id', flat=True))
+
+
+@task(name='recommendations.refresh_candidates')
+def refresh_candidates(course_ids):
+    """
+    Ставит на обновление списки соседей курсов и всех их кандидатов в соседи
+    (после изменения категорий курсов)
+    """
+
+    schedule_neighbors_refresh(with_candidates(course_ids))
+
+
+@task(name='recommendations.refresh_neighbors')
+def refresh_neighbors(course_ids):
+    """
+    Пересчет списков соседей курсов по текущим строкам матрицы
+    """
+
+    course_ids = set(course_ids)
+    if not course_ids:
+        return
+    rows = defaultdict(dict)
+    for course_id, other, count in CourseCooccurrence.objects.filter(course_id__in=course_ids, count__gt=0) \
+            .values_list('course_id', 'other_id', 'count'):
+        rows[course_id][other] = count
+    involved = course_ids.union(*(row.keys() for row in rows.values()))
+    students = dict(CourseCooccurrence.objects.filter(course_id__in=involved, other_id=F('course_id'))
+                    .values_list('course_id', 'count'))
+    categories = course_categories(involved)
+    k = get_neighbors_count()
+
+    with transaction.atomic():
+        CourseNeighbor.objects.filter(course_id__in=course_ids).delete()
+        CourseNeighbor.objects.bulk_create(
+            CourseNeighbor(course_id=course_id, neighbor_id=other, rank=rank, score=score)
+            for course_id in course_ids if students.get(course_id)
+            for rank, (other, score) in enumerate(top_neighbors(course_id, rows[course_id], students, categories, k))
+        )
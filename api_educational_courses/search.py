@@ -0,0 +1,199 @@
+"""
+Полнотекстовый поиск по курсам и урокам.
+
+SQLite - виртуальные таблицы FTS5 (external content), которые синхронизируются
+с основными таблицами триггерами. PostgreSQL - GIN-индексы по выражению to_tsvector.
+В обоих случаях результаты сортируются по релевантности (поле search_rank,
+чем меньше значение, тем выше релевантность)
+"""
+import re
+
+from django.db import connection as default_connection
+from rest_framework import filters
+
+from .models import Course, Lesson
+
+# Модели и поля, по которым строится полнотекстовый индекс
+FULL_TEXT_FIELDS = {
+    Course: ('name', 'description', 'author'),
+    Lesson: ('name', 'text', 'lesson_recording_url'),
+}
+
+POSTGRES_CONFIG = 'simple'  # конфигурация to_tsvector: без стемминга, подходит для смешанных языков
+
+
+def _columns(model):
+    return [model._meta.get_field(name).column for name in FULL_TEXT_FIELDS[model]]
+
+
+class SQLiteFullTextBackend:
+    """
+    Поиск через FTS5: таблица <таблица модели>_fts, ранжирование bm25
+    """
+
+    @staticmethod
+    def fts_table(model):
+        return f'{model._meta.db_table}_fts'
+
+    @staticmethod
+    def build_query(terms):
+        """
+        Каждый термин экранируется и ищется по префиксу, термины объединяются по И
+        """
+
+        return ' '.join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+
+    def install(self, connection, model):
+        """
+        Создает таблицу FTS5 и триггеры синхронизации, если их еще нет.
+        SQLite удаляет триггеры при пересоздании таблицы в миграциях,
+        поэтому при их отсутствии индекс также перестраивается
+        :return: True, если что-то было создано
+        """
+
+        table, fts = model._meta.db_table, self.fts_table(model)
+        columns = _columns(model)
+        names = ', '.join(columns)
+        new_values = ', '.join(f'new.{column}' for column in columns)
+        old_values = ', '.join(f'old.{column}' for column in columns)
+        triggers = {
+            f'{fts}_ai': f'AFTER INSERT ON {table} BEGIN '
+                         f'INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new_values}); END',
+            f'{fts}_ad': f'AFTER DELETE ON {table} BEGIN '
+                         f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old_values}); END",
+            f'{fts}_au': f'AFTER UPDATE ON {table} BEGIN '
+                         f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old_values}); "
+                         f'INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new_values}); END',
+        }
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s", [table])
+            existing = {row[0] for row in cursor.fetchall()}
+            missing = [name for name in triggers if name not in existing]
+            if not missing:
+                return False
+
+            cursor.execute(f'CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({names}, '
+                           f"content='{table}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')")
+            for name in missing:
+                cursor.execute(f'CREATE TRIGGER {name} {triggers[name]}')
+            cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+        return True
+
+    def uninstall(self, connection, model):
+        fts = self.fts_table(model)
+        with connection.cursor() as cursor:
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {fts}_{suffix}')
+            cursor.execute(f'DROP TABLE IF EXISTS {fts}')
+
+    def search(self, queryset, terms):
+        table, fts = queryset.model._meta.db_table, self.fts_table(queryset.model)
+        return queryset.extra(
+            tables=[fts],
+            where=[f'{fts}.rowid = {table}.id', f'{fts} MATCH %s'],
+            params=[self.build_query(terms)],
+            select={'search_rank': f'{fts}.rank'},
+        ).order_by('search_rank')
+
+
+class PostgresFullTextBackend:
+    """
+    Поиск через tsvector: GIN-индекс по тому же выражению, что и в запросе, ранжирование ts_rank
+    """
+
+    @staticmethod
+    def index_name(model):
+        return f'{model._meta.db_table}_fts'
+
+    @staticmethod
+    def vector(model):
+        document = " || ' ' || ".join(f"coalesce({column}, '')" for column in _columns(model))
+        return f"to_tsvector('{POSTGRES_CONFIG}', {document})"
+
+    @staticmethod
+    def build_query(terms):
+        """
+        Из терминов удаляются служебные символы tsquery, каждый ищется по префиксу
+        """
+
+        words = [word for term in terms for word in re.split(r'\W+', term) if word]
+        return ' & '.join(f"'{word}':*" for word in words)
+
+    def install(self, connection, model):
+        with connection.cursor() as cursor:
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {self.index_name(model)} '
+                           f'ON {model._meta.db_table} USING GIN ({self.vector(model)})')
+        return True
+
+    def uninstall(self, connection, model):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP INDEX IF EXISTS {self.index_name(model)}')
+
+    def search(self, queryset, terms):
+        query = self.build_query(terms)
+        if not query:
+            return queryset.none()
+        tsquery = f"to_tsquery('{POSTGRES_CONFIG}', %s)"
+        return queryset.extra(
+            where=[f'{self.vector(queryset.model)} @@ {tsquery}'],
+            params=[query],
+            select={'search_rank': f'-ts_rank({self.vector(queryset.model)}, {tsquery})'},
+            select_params=[query],
+        ).order_by('search_rank')
+
+
+BACKENDS = {
+    'sqlite': SQLiteFullTextBackend(),
+    'postgresql': PostgresFullTextBackend(),
+}
+
+
+def get_backend(connection=default_connection):
+    """
+    Бэкенд поиска для текущей СУБД или None, если полнотекстовый поиск не поддерживается
+    """
+
+    return BACKENDS.get(connection.vendor)
+
+
+def install_full_text_indexes(connection=default_connection):
+    """
+    Создает недостающие полнотекстовые индексы (вызывается после migrate; миграция 0006 содержит свою копию DDL)
+    """
+
+    backend = get_backend(connection)
+    if backend is not None:
+        for model in FULL_TEXT_FIELDS:
+            backend.install(connection, model)
+
+
+def uninstall_full_text_indexes(connection=default_connection):
+    backend = get_backend(connection)
+    if backend is not None:
+        for model in FULL_TEXT_FIELDS:
+            backend.uninstall(connection, model)
+
+
+def search(queryset, terms):
+    """
+    Полнотекстовый поиск по queryset с сортировкой по релевантности
+    :param queryset: QuerySet модели из FULL_TEXT_FIELDS
+    :param terms: список искомых терминов
+    :return: QuerySet с аннотацией search_rank
+    """
+
+    return get_backend().search(queryset, terms)
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    Замена SearchFilter для моделей с полнотекстовым индексом:
+    вместо LIKE '%term%' по всем полям используется индекс FTS5/tsvector.
+    Для остальных моделей и СУБД работает как обычный SearchFilter
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms or queryset.model not in FULL_TEXT_FIELDS or get_backend() is None:
+            return super().filter_queryset(request, queryset, view)
+        return search(queryset, terms)
@@ -1,18 +1,312 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils import timezone
 from rest_framework import serializers
-from api_educational_courses.models import Course, UserProfile, Lesson, Enrollment, Review, Category
-from django.core import validators
+from rest_framework.validators import UniqueValidator
+from drf_spectacular.utils import extend_schema_field
+from api_educational_courses.models import Course, User, UserProfile, Lesson, Enrollment, Review, Category, CourseNeighbor
+from api_educational_courses.models import RATE_MIN, RATE_MAX, bulk_write
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField, который при пакетной записи берет связанные объекты
+    из заранее загруженного словаря BulkListSerializer.related_objects
+    вместо отдельного запроса на каждый элемент
+    """
+
+    def to_internal_value(self, data):
+        name = self.parent.field_name if isinstance(self.parent, serializers.ManyRelatedField) else self.field_name
+        preloaded = (getattr(self.root, 'related_objects', None) or {}).get(name)
+        if preloaded is None or isinstance(data, bool):
+            return super().to_internal_value(data)
+        pk_field, preloaded = preloaded
+        try:
+            pk = pk_field.to_python(data)
+        except DjangoValidationError:
+            return super().to_internal_value(data)
+        if pk not in preloaded:
+            self.fail('does_not_exist', pk_value=data)
+        return preloaded[pk]
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """
+    Сериализатор списка для пакетной записи (many=True):
+    - связанные объекты всех элементов загружаются одним запросом на поле;
+    - уникальность полей проверяется одним запросом на поле, а не на каждый элемент;
+    - create/update выполняются через bulk_create/bulk_update, связи M2M -
+      пакетной вставкой в промежуточную таблицу.
+    Для обновления instance - словарь {id: объект}, id берется из элементов данных.
+    Ошибки возвращаются списком по элементам ({} - элемент корректен)
+    """
+
+    related_objects = None
+
+    @property
+    def model(self):
+        return self.child.Meta.model
+
+    def get_instance(self, data):
+        """
+        Обновляемый объект для элемента данных (по его полю id) или None.
+        id, который не приводится к типу ключа, - ошибка элемента
+        """
+
+        if not isinstance(data, dict):
+            return None
+        try:
+            pk = self.model._meta.pk.to_python(data.get('id'))
+        except DjangoValidationError:
+            raise serializers.ValidationError({'id': ['Некорректный id.']})
+        return self.instance.get(pk)
+
+    def run_child_validation(self, data):
+        if isinstance(self.instance, dict):
+            self.child.instance = self.get_instance(data)
+            if self.child.instance is None:
+                raise serializers.ValidationError({'id': ['Объект с таким id не найден.']})
+            self.child.initial_data = data
+        return super().run_child_validation(data)
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            return super().to_internal_value(data)
+
+        self.related_objects = self.preload_related_objects(data)
+        unique_fields = self.detach_unique_validators()
+        validated, errors = None, {}
+        try:
+            validated = super().to_internal_value(data)
+        except serializers.ValidationError as exc:
+            errors = dict(enumerate(exc.detail)) if isinstance(exc.detail, list) else dict(exc.detail)
+        for index, error in self.check_unique(data, unique_fields).items():
+            errors.setdefault(index, {}).update(error)
+
+        errors = {index: error for index, error in errors.items() if error}
+        if errors:
+            raise serializers.ValidationError([errors.get(index, {}) for index in range(len(data))])
+        return validated
+
+    def preload_related_objects(self, data):
+        """
+        Загружает связанные объекты, на которые ссылаются элементы, одним in_bulk на поле
+        :return: {имя поля: (поле первичного ключа, {pk: объект})}
+        """
+
+        related_objects = {}
+        for name, field in self.child.fields.items():
+            if field.read_only:
+                continue
+            many = isinstance(field, serializers.ManyRelatedField)
+            relation = field.child_relation if many else field
+            if not isinstance(relation, BulkPrimaryKeyRelatedField):
+                continue
+
+            pk_field = relation.get_queryset().model._meta.pk
+            pks = set()
+            for item in data:
+                values = item.get(name) if isinstance(item, dict) else None
+                for value in (values if many and isinstance(values, list) else [values]):
+                    try:
+                        if value is not None and not isinstance(value, bool):
+                            pks.add(pk_field.to_python(value))
+                    except DjangoValidationError:
+                        pass  # ошибка типа будет выдана при валидации элемента
+            related_objects[name] = pk_field, relation.get_queryset().in_bulk(pks)
+        return related_objects
+
+    def detach_unique_validators(self):
+        """
+        Убирает UniqueValidator у полей дочернего сериализатора (проверка выполняется в check_unique)
+        :return: {имя поля: валидатор}
+        """
+
+        unique_fields = {}
+        for name, field in self.child.fields.items():
+            validators = [validator for validator in field.validators if isinstance(validator, UniqueValidator)]
+            if validators:
+                unique_fields[name] = validators[0]
+                field.validators = [validator for validator in field.validators if validator not in validators]
+        return unique_fields
+
+    def check_unique(self, data, unique_fields):
+        """
+        Проверка уникальности: одним запросом к БД и по дубликатам внутри пакета
+        :return: {индекс элемента: {поле: [ошибка]}}
+        """
+
+        errors = {}
+        updated_pks = list(self.instance) if isinstance(self.instance, dict) else []
+        for name, validator in unique_fields.items():
+            source = self.child.fields[name].source
+            values = {}
+            for index, item in enumerate(data):
+                value = item.get(name) if isinstance(item, dict) else None
+                if isinstance(value, str):
+                    value = value.strip()
+                if value is not None:
+                    values.setdefault(value, []).append(index)
+            existing = set(self.model.objects.filter(**{f'{source}__in': list(values)})
+                           .exclude(pk__in=updated_pks).values_list(source, flat=True))
+            for value, indexes in values.items():
+                if value in existing or len(indexes) > 1:
+                    for index in indexes:
+                        errors.setdefault(index, {})[name] = [validator.message]
+        return errors
+
+    def split_m2m(self, attrs):
+        """
+        Делит данные элемента на значения полей модели и связи M2M.
+        Внешние ключи передаются как <поле>_id: так конструктор модели и bulk_create
+        не проверяют и не кэшируют связанные объекты (заметно быстрее на больших пачках)
+        """
+
+        fields, m2m = {}, {}
+        for name, value in attrs.items():
+            field = self.model._meta.get_field(name)
+            if field.many_to_many:
+                m2m[name] = value
+            elif field.many_to_one and value is not None:
+                fields[field.attname] = value.pk
+            else:
+                fields[name] = value
+        return fields, m2m
+
+    def set_m2m(self, objects_with_m2m, clear=False):
+        """
+        Пакетная запись связей M2M напрямую в промежуточные таблицы.
+        Вместо m2m_changed после удаления и после добавления строк отправляется bulk_write
+        с промежуточной моделью в sender, action ('post_remove'/'post_add') и pairs -
+        парами (id объекта, id связанного объекта)
+        :param objects_with_m2m: список пар (объект, {имя поля: [связанные объекты]})
+        :param clear: удалить прежние связи (обновление)
+        """
+
+        for field in self.model._meta.many_to_many:
+            rows = [(obj, values[field.name]) for obj, values in objects_with_m2m if field.name in values]
+            if not rows:
+                continue
+            through = field.remote_field.through
+            source, target = f'{field.m2m_field_name()}_id', f'{field.m2m_reverse_field_name()}_id'
+            if clear:
+                removed = through.objects.filter(**{f'{source}__in': [obj.pk for obj, _ in rows]})
+                removed_rows = list(removed.values_list('pk', source, target))
+                removed.delete()
+                bulk_write.send(sender=through, pks=[pk for pk, _, _ in removed_rows], action='post_remove',
+                                pairs=[(obj_pk, related_pk) for _, obj_pk, related_pk in removed_rows])
+            created = through.objects.bulk_create(
+                through(**{source: obj.pk, target: related.pk})
+                for obj, related_objects in rows
+                for related in {related.pk: related for related in related_objects}.values()
+            )
+            bulk_write.send(sender=through, pks=[row.pk for row in created], action='post_add',
+                            pairs=[(getattr(row, source), getattr(row, target)) for row in created])
+
+    def create(self, validated_data):
+        objects, objects_with_m2m = [], []
+        for attrs in validated_data:
+            fields, m2m = self.split_m2m(attrs)
+            obj = self.model(**fields)
+            objects.append(obj)
+            objects_with_m2m.append((obj, m2m))
+        self.model.objects.bulk_create(objects)
+        self.set_m2m(objects_with_m2m)
+        bulk_write.send(sender=self.model, pks=[obj.pk for obj in objects])
+        return objects
+
+    def update(self, instance, validated_data):
+        objects, objects_with_m2m, changed = [], [], set()
+        for item, attrs in zip(self.initial_data, validated_data):
+            obj = self.get_instance(item)
+            fields, m2m = self.split_m2m(attrs)
+            for name, value in fields.items():
+                setattr(obj, name, value)
+            changed.update(fields)
+            objects.append(obj)
+            objects_with_m2m.append((obj, m2m))
+        for field in self.model._meta.concrete_fields:
+            if getattr(field, 'auto_now', False):  # bulk_update не вызывает pre_save()
+                now = timezone.now()
+                for obj in objects:
+                    setattr(obj, field.attname, now)
+                changed.add(field.name)
+        if changed:
+            self.model.objects.bulk_update(objects, changed)
+        self.set_m2m(objects_with_m2m, clear=True)
+        bulk_write.send(sender=self.model, pks=[obj.pk for obj in objects])
+        return objects
+
+
+class ExpandableFieldsMixin:
+    """
+    Позволяет развернуть связанные поля при чтении: ?expand=course,user.
+    expandable_fields - словарь 'имя поля': сериализатор развернутого представления.
+    Связанные объекты должны быть заранее загружены в представлении
+    (select_related/prefetch_related), иначе появятся запросы на каждую строку
+    """
+
+    expandable_fields = {}
+    expand_query_param = 'expand'
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or request.method != 'GET':
+            return fields
+
+        expand = set(request.query_params.get(self.expand_query_param, '').split(','))
+        for name, serializer_class in self.expandable_fields.items():
+            if name in expand:
+                fields[name] = serializer_class(many=isinstance(fields[name], serializers.ManyRelatedField),
+                                                read_only=True)
+        return fields
+
+
+class CourseShortSerializer(serializers.ModelSerializer):
+    """
+    Краткое представление курса для вложения в другие объекты
+    """
+
+    class Meta:
+        model = Course
+        fields = ['id', 'name']
+
+
+class UserShortSerializer(serializers.ModelSerializer):
+    """
+    Краткое представление пользователя для вложения в другие объекты
+    """
+
+    class Meta:
+        model = User
+        fields = ['id', 'username']
 
 
 class CourseModelSerializer(serializers.ModelSerializer):
     """
-    Удалить, создать, обновить и вернуть новый объект Course на основе предоставленных данных
+    Удалить, создать, обновить и вернуть новый объект Course на основе предоставленных данных.
+    Дополнительно возвращает статистику оценок курса (только чтение)
     """
 
+    reviews_count = serializers.SerializerMethodField()
+    rating_avg = serializers.SerializerMethodField()
+    rating_histogram = serializers.SerializerMethodField()
+
     class Meta:
         model = Course
         fields = '__all__'
         read_only_fields = ['id']
 
+    def get_reviews_count(self, obj) -> int:
+        return obj.get_rating_stats()['count']
+
+    def get_rating_avg(self, obj) -> float | None:
+        avg = obj.get_rating_stats()['avg']
+        return round(avg, 2) if avg is not None else None
+
+    def get_rating_histogram(self, obj) -> dict[str, int]:
+        return obj.get_rating_stats()['histogram']
+
 
 class UserProfileModelSerializer(serializers.ModelSerializer):
     """
@@ -30,21 +324,32 @@ class LessonModelSerializer(serializers.ModelSerializer):
     Удалить, создать, обновить и вернуть новый объект Lesson на основе предоставленных данных
     """
 
+    serializer_related_field = BulkPrimaryKeyRelatedField
+
     class Meta:
         model = Lesson
         fields = '__all__'
         read_only_fields = ['id']
+        list_serializer_class = BulkListSerializer  # пакетная запись, см. BulkWriteMixin
 
 
-class EnrollmentModelSerializer(serializers.ModelSerializer):
+class EnrollmentModelSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     """
-    Удалить, создать, обновить и вернуть новый объект Enrollment на основе предоставленных данных
+    Удалить, создать, обновить и вернуть новый объект Enrollment на основе предоставленных данных.
+    Поля course и user можно развернуть параметром ?expand=course,user
     """
 
+    expandable_fields = {'course': CourseShortSerializer, 'user': UserShortSerializer}
+
+    serializer_related_field = BulkPrimaryKeyRelatedField
+    # Связь через явную модель EnrollmentCourse: ModelSerializer сделал бы поле только для чтения
+    course = BulkPrimaryKeyRelatedField(many=True, queryset=Course.objects.all())
+
     class Meta:
         model = Enrollment
         fields = '__all__'
         read_only_fields = ['id']
+        list_serializer_class = BulkListSerializer  # пакетная запись, см. BulkWriteMixin
 
 
 class ReviewModelSerializer(serializers.ModelSerializer):
@@ -52,12 +357,15 @@ class ReviewModelSerializer(serializers.ModelSerializer):
     Удалить, создать, обновить и вернуть новый объект Review на основе предоставленных данных
     """
 
-    rate = serializers.IntegerField()#validators=[validators.MinValueValidator(0), validators.MaxValueValidator(10)])
+    rate = serializers.IntegerField(min_value=RATE_MIN, max_value=RATE_MAX)
+
+    serializer_related_field = BulkPrimaryKeyRelatedField
 
     class Meta:
         model = Review
         fields = '__all__'
         read_only_fields = ['id']
+        list_serializer_class = BulkListSerializer  # пакетная запись, см. BulkWriteMixin
 
     # def validate(self, attrs):
     #     print()
@@ -73,3 +381,75 @@ class CategoryModelSerializer(serializers.ModelSerializer):
         model = Category
         fields = '__all__'
         read_only_fields = ['id']
+
+
+class CategoryShortSerializer(serializers.ModelSerializer):
+    """
+    Краткое представление категории для вложения в другие объекты
+    """
+
+    class Meta:
+        model = Category
+        fields = ['id', 'name']
+
+
+class DashboardReviewSerializer(serializers.ModelSerializer):
+    """
+    Отзыв пользователя в панели /me/dashboard/
+    """
+
+    class Meta:
+        model = Review
+        fields = ['id', 'rate', 'text', 'updated_at']
+
+
+class DashboardCourseSerializer(serializers.ModelSerializer):
+    """
+    Курс в панели /me/dashboard/: категории, статистика оценок и отзыв пользователя.
+    Ожидает курсы с аннотациями with_rating_stats() и предзагруженными
+    categories и own_reviews (см. DashboardView)
+    """
+
+    categories = CategoryShortSerializer(many=True, read_only=True)
+    rating = serializers.SerializerMethodField()
+    review = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Course
+        fields = ['id', 'name', 'description', 'author', 'categories', 'rating', 'review']
+
+    def get_rating(self, obj) -> dict:
+        stats = obj.get_rating_stats()
+        return {**stats, 'avg': round(stats['avg'], 2) if stats['avg'] is not None else None}
+
+    @extend_schema_field(DashboardReviewSerializer(allow_null=True))
+    def get_review(self, obj):
+        # отзывы отсортированы от нового к старому, выводится последний
+        return DashboardReviewSerializer(obj.own_reviews[0]).data if obj.own_reviews else None
+
+
+class DashboardSerializer(serializers.Serializer):
+    """
+    Панель пользователя /me/dashboard/
+    """
+
+    user = UserShortSerializer(read_only=True)
+    courses = DashboardCourseSerializer(many=True, read_only=True)
+
+
+class SimilarCourseSerializer(serializers.ModelSerializer):
+    """
+    Похожий курс для /courses/<id>/similar/ (строка CourseNeighbor с загруженным neighbor)
+    """
+
+    id = serializers.IntegerField(source='neighbor_id')
+    name = serializers.CharField(source='neighbor.name')
+    author = serializers.CharField(source='neighbor.author')
+    score = serializers.SerializerMethodField()
+
+    class Meta:
+        model = CourseNeighbor
+        fields = ['id', 'name', 'author', 'score']
+
+    def get_score(self, obj) -> float:
+        return round(obj.score, 4)
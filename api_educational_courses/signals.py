@@ -0,0 +1,278 @@
+from django.core.signals import request_started
+from django.db import connections, transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_migrate, pre_save, post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import catalog, recommendations
+from .tasks import enqueue, start_worker_pool
+from .authentication import user_state_cache
+from .cache import invalidate_object, invalidate_namespace, invalidate_rows
+from .models import (User, UserProfile, Course, Lesson, Category, Enrollment, Review, CourseRatingSummary,
+                     rating_summary_changed, bulk_write)
+from .search import install_full_text_indexes
+
+
+@receiver(post_migrate)
+def restore_full_text_indexes(sender, app_config=None, using='default', **kwargs):
+    """
+    После migrate восстанавливает полнотекстовые индексы: SQLite удаляет триггеры
+    синхронизации при пересоздании таблицы в миграциях (ALTER через копирование)
+    """
+
+    if app_config is not None and app_config.name == 'api_educational_courses':
+        install_full_text_indexes(connections[using])
+
+
+@receiver(request_started)
+def start_task_workers(sender, **kwargs):
+    """
+    Пул обработчиков фоновых задач запускается в процессе, который обрабатывает запросы
+    (после fork), а не при импорте wsgi.py/asgi.py (tasks.enable_worker_pool)
+    """
+
+    start_worker_pool()
+
+
+@receiver([post_save, post_delete], sender=User)
+def evict_user_state(sender, instance, **kwargs):
+    """
+    Деактивация или изменение прав пользователя действуют без ожидания истечения
+    записи в кэше состояния (authentication.py)
+    """
+
+    user_state_cache.evict(instance.pk)
+    transaction.on_commit(lambda: user_state_cache.evict(instance.pk))
+
+
+# Инвалидация кэша ответов (cache.py)
+
+@receiver([post_save, post_delete], sender=Course)
+def invalidate_course(sender, instance, **kwargs):
+    invalidate_object('courses', instance.pk)
+    if kwargs['signal'] is post_delete:
+        # строки связи с категориями удаляются каскадно без сигнала m2m_changed
+        invalidate_namespace('categories')
+
+
+@receiver(rating_summary_changed, sender=CourseRatingSummary)
+def invalidate_course_rating(sender, course_id, **kwargs):
+    if course_id is None:
+        invalidate_namespace('courses')
+    else:
+        invalidate_object('courses', course_id)
+
+
+@receiver([post_save, post_delete], sender=Lesson)
+def invalidate_lesson(sender, instance, **kwargs):
+    invalidate_object('lessons', instance.pk)
+
+
+@receiver(bulk_write, sender=Lesson)
+def invalidate_lessons(sender, pks, **kwargs):
+    invalidate_namespace('lessons')
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category(sender, instance, **kwargs):
+    invalidate_object('categories', instance.pk)
+
+
+@receiver(m2m_changed, sender=Category.course.through)
+def invalidate_category_courses(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        invalidate_object('categories', instance.pk)
+    elif pk_set is None:  # course.categories.clear()
+        invalidate_namespace('categories')
+    else:
+        for pk in pk_set:
+            invalidate_object('categories', pk)
+
+
+# Сводка оценок курса (CourseRatingSummary): обновляется в транзакции записи отзыва,
+# в том числе из админ-панели и при каскадном удалении отзывов пользователя
+
+def apply_rating(rating, sign):
+    course_id, rate = rating
+    CourseRatingSummary.apply_review(course_id, rate, sign)
+
+
+@receiver(pre_save, sender=Review)
+def remember_review_rating(sender, instance, raw=False, using=None, **kwargs):
+    # объект создан не загрузкой из БД (Review(pk=...)): прежние курс и оценка читаются запросом
+    if raw or CourseRatingSummary.is_updated_manually() or instance.pk is None \
+            or '_saved_rating' in instance.__dict__:
+        return
+    instance._saved_rating = Review.objects.using(using).filter(pk=instance.pk).values_list('course_id', 'rate').first()
+
+
+@receiver(post_save, sender=Review)
+def update_rating_summary(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or CourseRatingSummary.is_updated_manually():
+        return
+    if update_fields is not None and not {'course', 'course_id', 'rate'} & set(update_fields):
+        return
+    previous = None if created else instance.__dict__.get('_saved_rating')
+    current = (instance.course_id, instance.rate)
+    if previous != current:
+        if previous is not None:
+            apply_rating(previous, -1)
+        apply_rating(current, 1)
+    instance.remember_rating()
+
+
+@receiver(post_delete, sender=Review)
+def exclude_deleted_rating(sender, instance, origin=None, **kwargs):
+    if CourseRatingSummary.is_updated_manually():
+        return
+    if isinstance(origin, Course) or isinstance(origin, QuerySet) and origin.model is Course:
+        return  # сводка удаляемого курса удаляется каскадно вместе с его отзывами
+    apply_rating((instance.course_id, instance.rate), -1)
+
+
+# Инвалидация кэша состояния списков (cache.py, CachedCountMixin)
+
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=UserProfile)
+@receiver([post_save, post_delete], sender=Course)
+@receiver([post_save, post_delete], sender=Lesson)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Enrollment)
+@receiver([post_save, post_delete], sender=Review)
+@receiver(bulk_write)
+def invalidate_model_rows(sender, **kwargs):
+    invalidate_rows(sender)
+
+
+@receiver(rating_summary_changed, sender=CourseRatingSummary)
+def invalidate_rating_rows(sender, **kwargs):
+    invalidate_rows(CourseRatingSummary)
+
+
+@receiver(m2m_changed, sender=Category.course.through)
+@receiver(m2m_changed, sender=Enrollment.course.through)
+def invalidate_m2m_rows(sender, action, **kwargs):
+    """
+    Состав курсов меняет результат фильтра по курсу и updated_at владельца связи
+    """
+
+    if action.startswith('post_'):
+        invalidate_rows(Category if sender is Category.course.through else Enrollment)
+
+
+# Дата изменения (updated_at) для объектов, представление которых включает связи M2M
+
+@receiver(m2m_changed, sender=Category.course.through)
+@receiver(m2m_changed, sender=Enrollment.course.through)
+def touch_m2m_owner(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """
+    Изменение состава курсов меняет представление категории/записи на курс,
+    поэтому обновляется их updated_at (на нем основаны ETag и Last-Modified)
+    """
+
+    owner_model = Category if sender is Category.course.through else Enrollment
+    if not reverse:
+        if action.startswith('post_'):
+            owner_model.objects.filter(pk=instance.pk).update(updated_at=timezone.now())
+    elif action == 'pre_clear':
+        # после очистки связанные объекты уже не найти
+        instance._touched_owner_pks = list(model.objects.filter(course=instance).values_list('pk', flat=True))
+    elif action == 'post_clear':
+        owner_model.objects.filter(pk__in=instance.__dict__.pop('_touched_owner_pks', [])) \
+            .update(updated_at=timezone.now())
+    elif action in ('post_add', 'post_remove'):
+        owner_model.objects.filter(pk__in=pk_set).update(updated_at=timezone.now())
+
+
+@receiver(pre_delete, sender=Course)
+def touch_course_owners(sender, instance, **kwargs):
+    """
+    Строки связи с удаляемым курсом удаляются каскадно без сигнала m2m_changed
+    """
+
+    now = timezone.now()
+    Category.objects.filter(course=instance).update(updated_at=now)
+    Enrollment.objects.filter(course=instance).update(updated_at=now)
+    invalidate_rows(Category)
+    invalidate_rows(Enrollment)
+
+
+# Похожие курсы (recommendations.py): строки матрицы и списки соседей - фоновыми задачами
+
+@receiver(m2m_changed, sender=Enrollment.course.through)
+def refresh_cooccurrence_after_enrollment_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse and action == 'pre_clear':
+        instance._cooccurrence_courses = set(instance.course.values_list('pk', flat=True))
+        return
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        course_ids = {instance.pk}
+    elif action == 'post_clear':
+        course_ids = instance.__dict__.pop('_cooccurrence_courses', set())
+    else:
+        course_ids = pk_set or set()
+    recommendations.schedule_cooccurrence_refresh(course_ids)
+
+
+@receiver(pre_delete, sender=Enrollment)
+def remember_enrollment_courses(sender, instance, **kwargs):
+    # строки связи удаляются каскадно без сигнала m2m_changed
+    instance._cooccurrence_courses = set(instance.course.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Enrollment)
+def refresh_cooccurrence_after_enrollment_delete(sender, instance, **kwargs):
+    recommendations.schedule_cooccurrence_refresh(instance.__dict__.pop('_cooccurrence_courses', set()))
+
+
+@receiver(bulk_write, sender=Enrollment.course.through)
+def refresh_cooccurrence_after_bulk_write(sender, pairs, **kwargs):
+    # BulkListSerializer пишет строки связи напрямую, без m2m_changed
+    recommendations.schedule_cooccurrence_refresh({course_id for _, course_id in pairs})
+
+
+@receiver(m2m_changed, sender=Category.course.through)
+def refresh_neighbors_after_category_change(sender, instance, action, reverse, pk_set, **kwargs):
+    # общие категории входят в сходство курса со всеми курсами, у которых с ним общие студенты
+    if not reverse and action == 'pre_clear':
+        instance._neighbor_courses = set(instance.course.values_list('pk', flat=True))
+        return
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        course_ids = {instance.pk}
+    elif action == 'post_clear':
+        course_ids = instance.__dict__.pop('_neighbor_courses', set())
+    else:
+        course_ids = pk_set or set()
+    if course_ids:
+        enqueue(recommendations.refresh_candidates, sorted(course_ids))
+
+
+@receiver(pre_delete, sender=Category)
+def remember_category_courses(sender, instance, **kwargs):
+    # строки связи удаляются каскадно без сигнала m2m_changed
+    instance._neighbor_courses = set(instance.course.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Category)
+def refresh_neighbors_after_category_delete(sender, instance, **kwargs):
+    courses = instance.__dict__.pop('_neighbor_courses', set())
+    if courses:
+        enqueue(recommendations.refresh_candidates, sorted(courses))
+
+
+# Снимок каталога (catalog.py): новая версия сразу, построение снимка - фоновой задачей
+
+@receiver([post_save, post_delete], sender=Course)
+@receiver([post_save, post_delete], sender=Category)
+@receiver(m2m_changed, sender=Category.course.through)
+@receiver(rating_summary_changed, sender=CourseRatingSummary)
+def invalidate_catalog(sender, action='post_', **kwargs):
+    if action.startswith('post_'):
+        catalog.invalidate()
+        enqueue(catalog.publish, dedupe_key='catalog:publish')
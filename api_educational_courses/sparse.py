@@ -0,0 +1,101 @@
+"""
+Сокращенное представление объектов при чтении
+
+?fields=id,name - выводятся только перечисленные поля (sparse fieldsets), для list,
+retrieve и выгрузки (?format=ndjson/csv).
+Список по умолчанию выводится без тяжелых полей heavy_fields (например, текста урока),
+?view=full - полное представление. Детальный просмотр и выгрузка по умолчанию полные.
+
+Столбцы невыводимых полей не читаются из БД (QuerySet.defer()). Поля SerializerMethodField
+должны брать данные из аннотаций или уже выводимых полей, иначе чтение отложенного
+столбца выполнит отдельный запрос на каждую строку
+"""
+from rest_framework import serializers
+
+from .export import CSVRenderer, NDJSONRenderer
+
+FIELDS_PARAM = 'fields'
+VIEW_PARAM = 'view'
+FULL_VIEW = 'full'
+
+
+def select_fields(params, fields, heavy_fields=(), summary=False):
+    """
+    :param params: параметры запроса
+    :param fields: поля сериализатора {имя: поле}
+    :param heavy_fields: поля, не выводимые в сокращенном представлении
+    :param summary: сокращенное представление по умолчанию (список)
+    :return: выводимые поля {имя: поле} или None - все поля
+    """
+
+    requested = [name.strip() for name in params.get(FIELDS_PARAM, '').split(',') if name.strip()]
+    if requested:
+        unknown = [name for name in requested if name not in fields]
+        if unknown:
+            raise serializers.ValidationError({FIELDS_PARAM: [f'Неизвестные поля: {", ".join(unknown)}.']})
+        return {name: field for name, field in fields.items() if name in requested}
+    if summary and heavy_fields and params.get(VIEW_PARAM) != FULL_VIEW:
+        return {name: field for name, field in fields.items() if name not in heavy_fields}
+    return None
+
+
+def prune_fields(serializer, selected):
+    """
+    Оставляет в сериализаторе (или в дочернем сериализаторе списка) только выбранные поля
+    """
+
+    serializer = getattr(serializer, 'child', serializer)
+    for name in list(serializer.fields):
+        if name not in selected:
+            serializer.fields.pop(name)
+    return serializer
+
+
+def defer_columns(queryset, selected):
+    """
+    Откладывает чтение столбцов модели, которые не нужны выбранным полям.
+    Внешние ключи из select_related не откладываются (Django запрещает такое сочетание)
+    """
+
+    used = {field.source.split('.')[0] for field in selected.values()}
+    related = queryset.query.select_related
+    used.update(related if isinstance(related, dict) else ())
+    deferred = [field.name for field in queryset.model._meta.concrete_fields
+                if not field.primary_key and field.name not in used]
+    return queryset.defer(*deferred) if deferred else queryset
+
+
+class SparseFieldsMixin:
+    """
+    Примесь к ModelViewSet: ?fields=..., сокращенный список без heavy_fields и ?view=full
+    """
+
+    heavy_fields = []  # поля, не выводимые в списке по умолчанию
+
+    def get_selected_fields(self):
+        """
+        :return: выводимые поля {имя: поле} или None - все поля
+        """
+
+        request = self.request
+        if request is None or request.method not in ('GET', 'HEAD') or self.action not in ('list', 'retrieve'):
+            return None
+        if getattr(self, '_selected_fields_request', None) is not request:
+            export = isinstance(getattr(request, 'accepted_renderer', None), (NDJSONRenderer, CSVRenderer))
+            fields = self.get_serializer_class()(context=self.get_serializer_context()).fields
+            self._selected_fields = select_fields(request.query_params, fields, self.heavy_fields,
+                                                  summary=self.action == 'list' and not export)
+            self._selected_fields_request = request
+        return self._selected_fields
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        selected = self.get_selected_fields()
+        return defer_columns(queryset, selected) if selected is not None else queryset
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        selected = self.get_selected_fields()
+        if selected is not None:
+            prune_fields(serializer, selected)
+        return serializer
@@ -0,0 +1,255 @@
+"""
+Фоновые задачи: побочные действия записи выполняются вне обработчика запроса.
+
+Очередь - таблица Job в основной БД, без внешнего брокера: задачи переживают перезапуск.
+- Функция регистрируется декоратором @task и ставится в очередь вызовом enqueue(...):
+  строка Job вставляется после фиксации транзакции (transaction.on_commit), поэтому
+  откаченная запись (в том числе повтор retry_on_locked) задач не создает.
+- dedupe_key: пока задача с ключом ожидает выполнения, такие же задачи не добавляются
+  (частичный уникальный индекс), например одно обновление соседей популярного курса
+  на серию записей.
+- Ошибка - повтор с экспоненциальной паузой API_TASKS_RETRY_DELAY * 2^(попытка - 1),
+  после max_attempts попыток задача остается со статусом failed.
+- Задача, взятая обработчиком, который затем завершился аварийно, возвращается в очередь
+  через API_TASKS_LEASE_TIMEOUT секунд, поэтому задачи должны быть идемпотентными.
+
+Выполняет задачи пул потоков WorkerPool: в процессе веб-сервера (API_TASKS_WORKERS,
+разрешается в wsgi.py/asgi.py, см. enable_worker_pool) или отдельно - командой run_task_workers.
+API_TASKS_EAGER = True - задачи выполняются сразу после фиксации транзакции, без очереди
+"""
+import logging
+import os
+import threading
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .db import retry_on_locked
+from .models import Job
+
+logger = logging.getLogger('api_educational_courses.tasks')
+
+_registry = {}
+_wakeup = threading.Event()  # новые задачи в этом процессе: пул не ждет окончания паузы опроса
+
+
+def task(name=None, max_attempts=None):
+    """
+    Регистрирует функцию как фоновую задачу.
+    Аргументы вызова должны сериализоваться в JSON
+    :param name: имя задачи (по умолчанию - модуль и имя функции)
+    :param max_attempts: попыток (по умолчанию API_TASKS_MAX_ATTEMPTS)
+    """
+
+    def decorator(func):
+        func.task_name = name or f'{func.__module__}.{func.__qualname__}'
+        func.max_attempts = max_attempts
+        _registry[func.task_name] = func
+        return func
+
+    return decorator
+
+
+def get_task(name):
+    return _registry.get(name)
+
+
+def enqueue(func, *args, dedupe_key=None, delay=0, **kwargs):
+    """
+    Ставит задачу в очередь после фиксации текущей транзакции
+    :param func: функция, зарегистрированная через @task
+    :param dedupe_key: ключ дедупликации ожидающих задач
+    :param delay: отсрочка выполнения, секунды
+    """
+
+    enqueue_many(func, [(args, kwargs, dedupe_key)], delay)
+
+
+def enqueue_many(func, calls, delay=0):
+    """
+    То же, что enqueue, для нескольких вызовов одной задачи одной вставкой
+    :param calls: тройки (args, kwargs, dedupe_key)
+    """
+
+    calls = list(calls)
+    if not calls:
+        return
+    if getattr(settings, 'API_TASKS_EAGER', False):
+        transaction.on_commit(lambda: [func(*args, **kwargs) for args, kwargs, _ in calls])
+        return
+
+    run_after = timezone.now() + timedelta(seconds=delay)
+    max_attempts = func.max_attempts or getattr(settings, 'API_TASKS_MAX_ATTEMPTS', 5)
+    jobs = [Job(name=func.task_name, args=list(args), kwargs=kwargs, dedupe_key=dedupe_key,
+                max_attempts=max_attempts, run_after=run_after) for args, kwargs, dedupe_key in calls]
+    transaction.on_commit(lambda: _insert(jobs))
+
+
+def _insert(jobs):
+    # ожидающая задача с тем же dedupe_key уже есть - строка не вставляется
+    retry_on_locked(Job.objects.bulk_create)(jobs, ignore_conflicts=True)
+    start_worker_pool()
+    _wakeup.set()
+
+
+def _claimable(now):
+    lease = now - timedelta(seconds=getattr(settings, 'API_TASKS_LEASE_TIMEOUT', 300))
+    return Q(status=Job.PENDING, run_after__lte=now) | Q(status=Job.RUNNING, updated_at__lt=lease)
+
+
+@retry_on_locked
+def claim_jobs(worker, limit):
+    """
+    Берет до limit готовых задач. Условный UPDATE по тем же условиям, что и выборка,
+    не дает двум обработчикам взять одну задачу (в PostgreSQL выборка еще и
+    пропускает заблокированные строки - SKIP LOCKED)
+    :param worker: имя обработчика
+    :return: список задач
+    """
+
+    now = timezone.now()
+    candidates = Job.objects.filter(_claimable(now)).order_by('run_after', 'id')
+    if connection.features.has_select_for_update_skip_locked:
+        candidates = candidates.select_for_update(skip_locked=True)
+    ids = list(candidates.values_list('id', flat=True)[:limit])
+    if not ids:
+        return []
+    claim = f'{worker}:{uuid.uuid4().hex[:8]}'
+    Job.objects.filter(_claimable(now), id__in=ids).update(status=Job.RUNNING, claimed_by=claim,
+                                                            attempts=F('attempts') + 1, updated_at=now)
+    return list(Job.objects.filter(id__in=ids, claimed_by=claim, status=Job.RUNNING).order_by('run_after', 'id'))
+
+
+def run_job(job):
+    """
+    Выполняет взятую задачу: успешная удаляется, при ошибке назначается повтор
+    или (попытки исчерпаны) статус failed
+    :return: bool - задача выполнена
+    """
+
+    func = get_task(job.name)
+    try:
+        if func is None:
+            raise LookupError(f'Задача {job.name} не зарегистрирована')
+        func(*job.args, **job.kwargs)
+    except Exception as exc:
+        logger.exception('Задача %s (id %s, попытка %s) завершилась ошибкой', job.name, job.pk, job.attempts)
+        changes = {'last_error': repr(exc), 'claimed_by': ''}
+        if job.attempts >= job.max_attempts:
+            changes['status'] = Job.FAILED
+        else:
+            delay = getattr(settings, 'API_TASKS_RETRY_DELAY', 5) * 2 ** (job.attempts - 1)
+            changes.update(status=Job.PENDING, run_after=timezone.now() + timedelta(seconds=delay))
+        try:
+            retry_on_locked(Job.objects.filter(pk=job.pk, claimed_by=job.claimed_by).update)(**changes)
+        except IntegrityError:  # уже ожидает такая же задача (dedupe_key): повтор выполнит она
+            retry_on_locked(Job.objects.filter(pk=job.pk, claimed_by=job.claimed_by).delete)()
+        return False
+    retry_on_locked(Job.objects.filter(pk=job.pk, claimed_by=job.claimed_by).delete)()
+    return True
+
+
+def run_pending(worker='inline', limit=None, batch_size=10):
+    """
+    Выполняет готовые задачи в текущем потоке, пока они есть
+    :param limit: максимум задач
+    :return: количество выполненных (успешно или нет) задач
+    """
+
+    processed = 0
+    while limit is None or processed < limit:
+        jobs = claim_jobs(worker, batch_size if limit is None else min(batch_size, limit - processed))
+        if not jobs:
+            break
+        for job in jobs:
+            run_job(job)
+        processed += len(jobs)
+    return processed
+
+
+class WorkerPool:
+    """
+    Пул потоков, выполняющих задачи из таблицы Job. Каждый поток берет задачи пачками
+    по batch_size, а если их нет - ждет poll_interval секунд или постановки задачи в этом процессе
+    """
+
+    def __init__(self, workers=None, poll_interval=None, batch_size=10, name=None):
+        self.workers = workers if workers is not None else getattr(settings, 'API_TASKS_WORKERS', 2)
+        self.poll_interval = poll_interval if poll_interval is not None \
+            else getattr(settings, 'API_TASKS_POLL_INTERVAL', 1.0)
+        self.batch_size = batch_size
+        self.name = name or f'worker-{uuid.uuid4().hex[:6]}'
+        self.stopped = threading.Event()
+        self.threads = []
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self.run, args=(f'{self.name}-{index}',), name=f'{self.name}-{index}',
+                                      daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def stop(self, timeout=None):
+        self.stopped.set()
+        _wakeup.set()
+        for thread in self.threads:
+            thread.join(timeout)
+
+    def run(self, worker):
+        try:
+            while not self.stopped.is_set():
+                close_old_connections()
+                try:
+                    processed = run_pending(worker, limit=self.batch_size, batch_size=self.batch_size)
+                except Exception:
+                    logger.exception('Ошибка обработчика задач %s', worker)
+                    processed = 0
+                if not processed:
+                    _wakeup.wait(self.poll_interval)
+                    _wakeup.clear()
+        finally:
+            connection.close()
+
+
+_pool = None
+_pool_pid = None  # процесс, в котором запущен _pool: потоки не переживают fork
+_pool_lock = threading.Lock()
+_pool_enabled = False
+
+
+def enable_worker_pool():
+    """
+    Разрешает пул обработчиков в процессах веб-сервера (вызывается в wsgi.py/asgi.py).
+    Сам пул запускается не при импорте, а лениво - при первом запросе (обработчик request_started
+    в signals.py) или постановке задачи в каждом процессе. Сервер, загружающий приложение
+    до fork (gunicorn --preload, uwsgi без lazy-apps), иначе запустил бы потоки только
+    в главном процессе, который запросы не обрабатывает, а рабочие процессы остались бы без них.
+    Команды manage.py и тесты пул не запускают
+    """
+
+    global _pool_enabled
+    _pool_enabled = True
+
+
+def start_worker_pool():
+    """
+    Запускает пул обработчиков в текущем процессе, если он разрешен (enable_worker_pool)
+    и еще не запущен (один на процесс). API_TASKS_WORKERS = 0 - задачи выполняются
+    только командой run_task_workers
+    """
+
+    global _pool, _pool_pid
+    if not _pool_enabled or _pool_pid == os.getpid():
+        return _pool
+    with _pool_lock:
+        if _pool_pid != os.getpid():
+            _pool = None
+            if not getattr(settings, 'API_TASKS_EAGER', False) and getattr(settings, 'API_TASKS_WORKERS', 2) > 0:
+                _pool = WorkerPool().start()
+            _pool_pid = os.getpid()
+    return _pool
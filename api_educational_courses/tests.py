@@ -1,3 +1,1646 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import Course, User, UserProfile, Review, CourseRatingSummary, Enrollment, Lesson, Category
+from .models import CourseCooccurrence, CourseNeighbor, EnrollmentCourse, Job
+from . import catalog, recommendations, tasks, throttling
+from .coalescing import SingleFlight
+from .authentication import user_state_cache
+from .db import retry_on_locked
+from .db_routers import STICKY_COOKIE, ReplicaRouter, ReplicaRoutingMiddleware, reads_from_replica
+from .management.commands.audit_indexes import PLAN_PATTERNS, audit, explain
+from .metrics import DB_QUERIES, HISTOGRAMS, MetricsMiddleware, sql_template
+from .views import CourseViewSet, ReviewViewSet
+
+
+class APITestCase(TestCase):
+    """
+    Базовый класс тестов API: клиент DRF и пустые кэши перед каждым тестом
+    """
+
+    client_class = APIClient
+
+    def setUp(self):
+        cache.clear()
+        user_state_cache.clear()
+        throttling.get_store().clear()
+
+
+class CourseRatingStatsTests(APITestCase):
+    """
+    Статистика оценок в ответах /courses/
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user(username='student', password='pass')
+        cls.course = Course.objects.create(name='Python', author='Автор')
+        cls.empty_course = Course.objects.create(name='Django', author='Автор')
+        for rate in (4, 8, 8):
+            Review.objects.create(course=cls.course, user=cls.student, rate=rate)
+        CourseRatingSummary.rebuild()
+
+    def test_list_contains_rating_stats(self):
+        response = self.client.get('/courses/', {'ordering': '-rating_avg'})
+        self.assertEqual(response.status_code, 200)
+        first, second = response.data['results']
+        self.assertEqual(first['id'], self.course.id)
+        self.assertEqual(first['reviews_count'], 3)
+        self.assertEqual(first['rating_avg'], 6.67)
+        self.assertEqual(first['rating_histogram']['8'], 2)
+        self.assertEqual(first['rating_histogram']['0'], 0)
+        self.assertEqual(second['reviews_count'], 0)
+        self.assertIsNone(second['rating_avg'])
+
+    def test_list_query_count_does_not_depend_on_page_size(self):
+        with self.assertNumQueries(2):  # COUNT(*) и max(updated_at) для ETag + страница с агрегатами
+            self.client.get('/courses/', {'page_size': 1})
+        with self.assertNumQueries(2):
+            self.client.get('/courses/', {'page_size': 100})
+
+
+class CourseRatingSummaryTests(APITestCase):
+    """
+    Инкрементальное обновление сводки оценок при записи отзывов через API
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='pass')
+        cls.course = Course.objects.create(name='Python', author='Автор')
+        cls.other_course = Course.objects.create(name='Django', author='Автор')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.admin)
+
+    def summary(self, course):
+        return CourseRatingSummary.objects.get(course=course)
+
+    def test_create_update_delete_keep_summary_in_sync(self):
+        response = self.client.post('/reviews/', {'course': self.course.id, 'user': self.admin.id, 'rate': 7})
+        self.assertEqual(response.status_code, 201)
+        summary = self.summary(self.course)
+        self.assertEqual((summary.count, summary.total, summary.bucket_7), (1, 7, 1))
+
+        review_id = response.data['id']
+        self.client.patch(f'/reviews/{review_id}/', {'course': self.other_course.id, 'rate': 3})
+        summary = self.summary(self.course)
+        self.assertEqual((summary.count, summary.total, summary.bucket_7), (0, 0, 0))
+        other = self.summary(self.other_course)
+        self.assertEqual((other.count, other.total, other.bucket_3), (1, 3, 1))
+
+        self.client.delete(f'/reviews/{review_id}/')
+        other = self.summary(self.other_course)
+        self.assertEqual((other.count, other.total, other.bucket_3), (0, 0, 0))
+
+    def test_writes_outside_api_keep_summary_in_sync(self):
+        student = User.objects.create_user(username='student')
+        review = Review.objects.create(course=self.course, user=student, rate=4)  # например, админ-панель
+        Review.objects.create(course=self.other_course, user=student, rate=6)
+        Review.objects.create(course=self.course, user=self.admin, rate=8)
+        review.rate = 9
+        review.save()
+        Review(pk=review.pk, course=self.other_course, user=student, rate=2).save()  # без загрузки из БД
+        self.assertEqual((self.summary(self.course).count, self.summary(self.course).total), (1, 8))
+        self.assertEqual((self.summary(self.other_course).count, self.summary(self.other_course).total), (2, 8))
+
+        student.delete()  # отзывы удаляются каскадно
+        self.assertEqual((self.summary(self.other_course).count, self.summary(self.other_course).total), (0, 0))
+        self.course.delete()  # сводка удаляется вместе с курсом
+        self.assertFalse(CourseRatingSummary.objects.filter(course_id=self.course.id).exists())
+
+        CourseRatingSummary.rebuild()
+        self.assertEqual(self.summary(self.other_course).count, 0)
+
+    def test_rate_out_of_range_is_rejected(self):
+        response = self.client.post('/reviews/', {'course': self.course.id, 'user': self.admin.id, 'rate': 11})
+        self.assertEqual(response.status_code, 400)
+
+    def test_rebuild_matches_incremental_state(self):
+        for rate in (1, 10, 10):
+            self.client.post('/reviews/', {'course': self.course.id, 'user': self.admin.id, 'rate': rate})
+        incremental = self.summary(self.course)
+        CourseRatingSummary.rebuild()
+        rebuilt = self.summary(self.course)
+        self.assertEqual((incremental.count, incremental.total, incremental.bucket_10),
+                         (rebuilt.count, rebuilt.total, rebuilt.bucket_10))
+        self.assertEqual(self.summary(self.other_course).count, 0)
+
+
+class CursorPaginationTests(APITestCase):
+    """
+    Курсорная пагинация по id
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user(username='student', password='pass')
+        cls.course = Course.objects.create(name='Python', author='Автор')
+        Review.objects.bulk_create(Review(course=cls.course, user=cls.student, rate=5) for _ in range(7))
+
+    def test_cursor_mode_walks_all_rows_without_count(self):
+        seen = []
+        url, params = '/reviews/', {'pagination': 'cursor', 'page_size': 3}
+        while url:
+            with self.assertNumQueries(1):  # только выборка страницы, без COUNT(*)
+                response = self.client.get(url, params)
+            self.assertNotIn('count', response.data)
+            self.assertNotIn('ETag', response)
+            seen += [row['id'] for row in response.data['results']]
+            url, params = response.data['next'], None
+        self.assertEqual(seen, sorted(Review.objects.values_list('id', flat=True)))
+
+    def test_page_number_mode_is_default(self):
+        response = self.client.get('/reviews/')
+        self.assertEqual(response.data['count'], 7)
+
+
+class EnrollmentQueryCountTests(APITestCase):
+    """
+    Количество запросов при выводе записей на курс не зависит от размера страницы
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='pass')
+        courses = Course.objects.bulk_create(Course(name=f'Курс {i}', author='Автор') for i in range(3))
+        for i in range(20):
+            user = User.objects.create_user(username=f'student{i}')
+            enrollment = Enrollment.objects.create(user=user)
+            enrollment.course.set(courses)
+
+    @override_settings(API_COUNT_ESTIMATE_THRESHOLD=None)
+    def assertConstantQueries(self, url, expected, **params):
+        for page_size in (2, 20):
+            cache.clear()  # без закэшированного количества строк (CachedCountMixin)
+            with self.assertNumQueries(expected):
+                response = self.client.get(url, {'page_size': page_size, **params})
+            self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_list(self):
+        response = self.assertConstantQueries('/enrollments/', 3)  # COUNT(*) + страница + курсы
+        self.assertEqual(len(response.data['results'][0]['course']), 3)
+
+    def test_list_expanded(self):
+        response = self.assertConstantQueries('/enrollments/', 3, expand='course,user')
+        row = response.data['results'][0]
+        self.assertEqual(row['course'][0].keys(), {'id', 'name'})
+        self.assertEqual(row['user'].keys(), {'id', 'username'})
+
+    @override_settings(API_COUNT_ESTIMATE_THRESHOLD=None)
+    def test_admin_changelist(self):
+        self.client.force_login(self.admin)
+        # сессия, пользователь, COUNT(*), страница из 20 записей, курсы
+        with self.assertNumQueries(5):
+            response = self.client.get('/admin/api_educational_courses/enrollment/')
+        self.assertEqual(response.status_code, 200)
+
+
+class FullTextSearchTests(APITestCase):
+    """
+    Полнотекстовый поиск по курсам и урокам
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.lesson = Lesson.objects.create(name='Декораторы', text='Функции высшего порядка и замыкания',
+                                           lesson_recording_url='https://example.com/1')
+        cls.other = Lesson.objects.create(name='Генераторы', text='Ленивые вычисления, функции yield',
+                                          lesson_recording_url='https://example.com/2')
+        Course.objects.create(name='Python', description='Основы языка', author='Иванов')
+
+    def search(self, url, term):
+        response = self.client.get(url, {'search': term})
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data['results']]
+
+    def test_search_by_prefix_and_rank(self):
+        self.assertEqual(self.search('/lessons/', 'замыкан'), [self.lesson.id])
+        self.assertCountEqual(self.search('/lessons/', 'функции'), [self.lesson.id, self.other.id])
+        # больше совпадений - выше релевантность
+        self.assertEqual(self.search('/lessons/', 'генераторы yield'), [self.other.id])
+        ranked = Lesson.objects.create(name='Yield', text='yield, yield from и yield в генераторах',
+                                       lesson_recording_url='https://example.com/3')
+        self.assertEqual(self.search('/lessons/', 'yield'), [ranked.id, self.other.id])
+        self.assertEqual(len(self.search('/courses/', 'иванов')), 1)
+
+    def test_index_follows_writes(self):
+        self.lesson.text = 'Контекстные менеджеры'
+        self.lesson.save()
+        self.assertEqual(self.search('/lessons/', 'замыкан'), [])
+        self.assertEqual(self.search('/lessons/', 'контекстные'), [self.lesson.id])
+        self.lesson.delete()
+        self.assertEqual(self.search('/lessons/', 'контекстные'), [])
+
+    def test_special_characters_are_escaped(self):
+        self.assertEqual(self.search('/lessons/', '"yield OR *'), [])
+        self.assertEqual(self.search('/lessons/', 'NEAR(yield'), [])
+
+
+class ResponseCacheTests(APITestCase):
+    """
+    Кэш ответов для анонимных GET-запросов и его инвалидация по сигналам
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user(username='student', password='pass')
+        cls.course = Course.objects.create(name='Python', author='Автор')
+        cls.category = Category.objects.create(name='Программирование')
+
+    def assertCached(self, url, **params):
+        self.client.get(url, params)
+        with self.assertNumQueries(0):
+            return self.client.get(url, params)
+
+    def test_repeated_request_is_served_from_cache(self):
+        first = self.client.get('/courses/', {'page_size': 5, 'ordering': 'id'})
+        # порядок параметров не влияет на ключ
+        with self.assertNumQueries(0):
+            second = self.client.get('/courses/?ordering=id&page_size=5')
+        self.assertEqual(first.data, second.data)
+
+    @override_settings(DATABASE_REPLICAS=['replica_1'])
+    def test_cache_is_filled_from_primary(self):
+        routed = []
+
+        def db_for_read(router, model, **hints):
+            routed.append(reads_from_replica())
+            return 'default'
+
+        with mock.patch.object(ReplicaRouter, 'db_for_read', db_for_read):
+            self.client.get('/courses/')
+        self.assertTrue(routed)
+        self.assertNotIn(True, routed)  # отставшая реплика не попадает в кэш
+
+    def test_authenticated_requests_are_not_cached(self):
+        self.client.force_authenticate(self.student)
+        self.client.get('/courses/')
+        with self.assertNumQueries(2):
+            self.client.get('/courses/')
+
+    def test_model_change_invalidates_list_and_detail(self):
+        self.assertCached('/courses/')
+        self.assertCached(f'/courses/{self.course.id}/')
+        self.course.author = 'Другой автор'
+        self.course.save()
+        self.assertEqual(self.client.get('/courses/').data['results'][0]['author'], 'Другой автор')
+        self.assertEqual(self.client.get(f'/courses/{self.course.id}/').data['author'], 'Другой автор')
+
+    def test_review_changes_course_rating(self):
+        self.assertCached(f'/courses/{self.course.id}/')
+        CourseRatingSummary.apply_review(self.course.id, 9)
+        self.assertEqual(self.client.get(f'/courses/{self.course.id}/').data['reviews_count'], 1)
+
+    def test_category_courses_m2m_invalidates_category(self):
+        self.assertCached(f'/categories/{self.category.id}/')
+        self.course.categories.add(self.category)  # изменение со стороны курса
+        self.assertEqual(self.client.get(f'/categories/{self.category.id}/').data['course'], [self.course.id])
+        self.course.delete()
+        self.assertEqual(self.client.get(f'/categories/{self.category.id}/').data['course'], [])
+
+
+class ConditionalGetTests(APITestCase):
+    """
+    ETag / Last-Modified и ответ 304 без сериализации данных
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user(username='student', password='pass')
+        cls.course = Course.objects.create(name='Python', author='Автор')
+        cls.category = Category.objects.create(name='Программирование')
+        cls.review = Review.objects.create(course=cls.course, user=cls.student, rate=5)
+
+    def test_etag_round_trip(self):
+        response = self.client.get('/reviews/')
+        etag = response['ETag']
+        with self.assertNumQueries(0):  # count/max(updated_at) из кэша состояния списков (CachedCountMixin)
+            response = self.client.get('/reviews/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(response.content)
+
+        self.review.text = 'Отличный курс'
+        self.review.save()
+        response = self.client.get('/reviews/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_expanded_response_has_no_validators(self):
+        enrollment = Enrollment.objects.create(user=self.student)
+        enrollment.course.set([self.course])
+        self.client.force_authenticate(self.student)
+        self.assertIn('ETag', self.client.get('/enrollments/'))
+        for url in ('/enrollments/', f'/enrollments/{enrollment.id}/'):
+            response = self.client.get(url, {'expand': 'course'})
+            # переименование курса не меняет updated_at записи - ETag отдал бы устаревшее название
+            self.assertNotIn('ETag', response)
+            self.assertNotIn('Last-Modified', response)
+
+    def test_if_modified_since(self):
+        response = self.client.get(f'/reviews/{self.review.id}/')
+        response = self.client.get(f'/reviews/{self.review.id}/',
+                                   HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_depends_on_query(self):
+        first = self.client.get('/reviews/', {'page_size': 1})
+        second = self.client.get('/reviews/', {'page_size': 2})
+        self.assertNotEqual(first['ETag'], second['ETag'])
+
+    def test_m2m_change_updates_category_etag(self):
+        etag = self.client.get(f'/categories/{self.category.id}/')['ETag']
+        self.course.categories.add(self.category)
+        response = self.client.get(f'/categories/{self.category.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_cached_response_answers_conditional_request(self):
+        etag = self.client.get('/courses/')['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/courses/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        CourseRatingSummary.apply_review(self.course.id, 7)
+        self.assertEqual(self.client.get('/courses/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_invalid_pk_is_not_found(self):
+        self.client.force_authenticate(self.student)
+        for path in ('courses', 'lessons', 'reviews', 'enrollments', 'categories', 'user_profiles'):
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get(f'/{path}/abc/').status_code, 404)
+                self.assertEqual(self.client.get(f'/{path}/0/').status_code, 404)
+
+
+class BulkWriteTests(APITestCase):
+    """
+    Пакетные эндпоинты /<ресурс>/bulk/
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='pass')
+        cls.courses = Course.objects.bulk_create(Course(name=f'Курс {i}', author='Автор') for i in range(3))
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.admin)
+
+    def test_bulk_create_reviews_updates_summary_with_constant_queries(self):
+        CourseRatingSummary.rebuild()
+        queries = []
+        for size in (30, 150):  # оба размера помещаются в один INSERT
+            items = [{'course': self.courses[i % 3].id, 'user': self.admin.id, 'rate': i % 11} for i in range(size)]
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.post('/reviews/bulk/', items, format='json')
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(response.data['created'], size)
+            queries.append(len(context))
+        self.assertEqual(queries[0], queries[1])  # без запросов на каждый элемент
+        self.assertEqual(Review.objects.count(), 180)
+        self.assertEqual(CourseRatingSummary.objects.get(course=self.courses[0]).count, 60)
+
+    def test_bulk_create_returns_per_item_errors(self):
+        items = [
+            {'course': self.courses[0].id, 'user': self.admin.id, 'rate': 5},
+            {'course': 999999, 'user': self.admin.id, 'rate': 5},
+            {'course': self.courses[0].id, 'user': self.admin.id, 'rate': 50},
+        ]
+        response = self.client.post('/reviews/bulk/', items, format='json')
+        self.assertEqual(response.status_code, 400)
+        errors = response.data['errors']
+        self.assertEqual(errors[0], {})
+        self.assertIn('course', errors[1])
+        self.assertIn('rate', errors[2])
+        self.assertFalse(Review.objects.exists())
+
+    def test_bulk_enrollments_write_m2m(self):
+        items = [{'user': self.admin.id, 'course': [course.id for course in self.courses]} for _ in range(5)]
+        response = self.client.post('/enrollments/bulk/', items, format='json')
+        self.assertEqual(response.status_code, 201)
+        ids = response.data['ids']
+        self.assertEqual(Enrollment.course.through.objects.filter(enrollment_id__in=ids).count(), 15)
+
+        response = self.client.patch('/enrollments/bulk/', [{'id': pk, 'course': [self.courses[0].id]} for pk in ids],
+                                     format='json')
+        self.assertEqual(response.data['updated'], 5)
+        self.assertEqual(Enrollment.course.through.objects.filter(enrollment_id__in=ids).count(), 5)
+
+    def test_bulk_update_and_delete_reviews(self):
+        ids = self.client.post('/reviews/bulk/', [
+            {'course': self.courses[0].id, 'user': self.admin.id, 'rate': 2} for _ in range(4)
+        ], format='json').data['ids']
+        response = self.client.patch('/reviews/bulk/', [{'id': pk, 'rate': 9} for pk in ids[:2]] + [{'id': 0}],
+                                     format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('id', response.data['errors'][2])
+
+        self.client.patch('/reviews/bulk/', [{'id': pk, 'rate': 9} for pk in ids[:2]], format='json')
+        summary = CourseRatingSummary.objects.get(course=self.courses[0])
+        self.assertEqual((summary.count, summary.bucket_2, summary.bucket_9), (4, 2, 2))
+
+        response = self.client.delete('/reviews/bulk/', {'ids': ids}, format='json')
+        self.assertEqual(response.data['deleted'], 4)
+        summary = CourseRatingSummary.objects.get(course=self.courses[0])
+        self.assertEqual((summary.count, summary.total), (0, 0))
+
+    def test_bulk_ids_are_converted_to_pk_type(self):
+        ids = self.client.post('/reviews/bulk/', [
+            {'course': self.courses[0].id, 'user': self.admin.id, 'rate': 2} for _ in range(3)
+        ], format='json').data['ids']
+        response = self.client.patch('/reviews/bulk/', [{'id': str(pk), 'rate': 7} for pk in ids[:2]], format='json')
+        self.assertEqual(response.data['updated'], 2)
+        self.assertEqual(Review.objects.filter(rate=7).count(), 2)
+
+        response = self.client.patch('/reviews/bulk/', [{'id': str(ids[0]), 'rate': 8}, {'id': 'abc', 'rate': 8}],
+                                     format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'][0], {})
+        self.assertEqual(response.data['errors'][1]['id'], ['Некорректный id.'])
+
+        self.assertEqual(self.client.delete('/reviews/bulk/', ['abc'], format='json').status_code, 400)
+        response = self.client.delete('/reviews/bulk/', {'ids': [str(pk) for pk in ids]}, format='json')
+        self.assertEqual(response.data['deleted'], 3)
+
+    def test_bulk_lessons_check_uniqueness_in_batch_and_db(self):
+        Lesson.objects.create(name='Занятый', text='-', lesson_recording_url='https://example.com/')
+        items = [{'name': name, 'text': '-', 'lesson_recording_url': 'https://example.com/'}
+                 for name in ('Новый', 'Занятый', 'Дубль', 'Дубль')]
+        response = self.client.post('/lessons/bulk/', items, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([bool(error) for error in response.data['errors']], [False, True, True, True])
+
+    def test_bulk_lessons_require_admin(self):
+        self.client.force_authenticate(User.objects.create_user(username='student'))
+        response = self.client.post('/lessons/bulk/', [], format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class StreamingExportTests(APITestCase):
+    """
+    Потоковая выгрузка ?format=ndjson / ?format=csv
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user(username='student', password='pass')
+        cls.course = Course.objects.create(name='Python', author='Автор')
+        cls.other_course = Course.objects.create(name='Django', author='Автор')
+        Review.objects.bulk_create(Review(course=cls.course, user=cls.student, rate=i % 11, text=f'Отзыв, №{i}')
+                                   for i in range(25))
+        Review.objects.create(course=cls.other_course, user=cls.student, rate=1)
+        enrollment = Enrollment.objects.create(user=cls.student)
+        enrollment.course.set([cls.course, cls.other_course])
+
+    def test_ndjson_applies_filters_and_ordering(self):
+        response = self.client.get('/reviews/', {'format': 'ndjson', 'course': self.course.id, 'ordering': '-id'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 25)
+        self.assertEqual([row['id'] for row in rows], sorted((row['id'] for row in rows), reverse=True))
+
+    def test_csv_with_m2m(self):
+        response = self.client.get('/enrollments/', {'format': 'csv'})
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        header, row = rows
+        self.assertEqual(json.loads(row[header.index('course')]), [self.course.id, self.other_course.id])
+
+    @override_settings(API_COUNT_ESTIMATE_THRESHOLD=None)
+    def test_rows_are_read_in_chunks(self):
+        with mock.patch.object(ReviewViewSet, 'export_chunk_size', 10):
+            with self.assertNumQueries(1):  # только агрегат для ETag, строки читаются при отдаче ответа
+                response = self.client.get('/reviews/', {'format': 'csv'})
+            with self.assertNumQueries(1):  # один запрос, строки читаются порциями через fetchmany
+                lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 27)
+
+
+class AsyncCatalogTests(APITestCase):
+    """
+    Асинхронный путь чтения каталога /async/... совпадает с синхронным
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user(username='student', password='pass')
+        cls.courses = Course.objects.bulk_create(Course(name=f'Курс {i}', author='Автор') for i in range(5))
+        Review.objects.create(course=cls.courses[1], user=cls.student, rate=9)
+        CourseRatingSummary.rebuild()
+        cls.category = Category.objects.create(name='Программирование')
+        cls.category.course.set(cls.courses[:2])
+        Lesson.objects.create(name='Python', text='Основы', lesson_recording_url='http://example.com/')
+
+    def assertSameAsSync(self, path, params):
+        sync = self.client.get(path, params)
+        response = self.client.get(f'/async{path}', params)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        if 'results' in data:
+            self.assertEqual(data['count'], sync.data['count'])
+            self.assertEqual((data['next'] is None, data['previous'] is None),
+                             (sync.data['next'] is None, sync.data['previous'] is None))
+            data, expected = data['results'], sync.data['results']
+        else:
+            expected = sync.data
+        self.assertEqual(data, json.loads(json.dumps(expected)))
+
+    def test_list_and_retrieve(self):
+        self.assertSameAsSync('/courses/', {'ordering': '-rating_avg', 'page_size': 2, 'page': 2})
+        self.assertSameAsSync(f'/courses/{self.courses[1].id}/', {})
+        self.assertSameAsSync('/lessons/', {'search': 'осн'})
+        self.assertSameAsSync('/categories/', {'name': 'Программирование'})
+
+    def test_constant_queries(self):
+        with self.assertNumQueries(3):  # count, страница, курсы категорий
+            self.client.get('/async/categories/')
+
+    def test_rendered_like_drf(self):
+        course = Course.objects.create(name='Строка\u2028разделитель', author='Автор')
+        response = self.client.get(f'/async/courses/{course.id}/')
+        self.assertEqual(response.content, self.client.get(f'/courses/{course.id}/', format='json').content)
+        self.assertIn(b'\\u2028', response.content)  # безопасно для встраивания в <script>
+
+    @override_settings(API_THROTTLE_RATES={'default': None, 'courses': (1, 2)})
+    def test_throttled(self):
+        statuses = [self.client.get('/async/courses/').status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        response = self.client.get('/async/courses/')
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(self.client.get('/async/lessons/').status_code, 200)  # своя область
+        self.assertEqual(self.client.get('/courses/').status_code, 429)  # общая с синхронным путем
+
+    def test_errors(self):
+        self.assertEqual(self.client.get('/async/courses/999999/').status_code, 404)
+        self.assertEqual(self.client.get('/async/courses/', {'page': 10}).status_code, 404)
+        self.assertEqual(self.client.get('/async/categories/', {'course': 'abc'}).status_code, 400)
+
+
+class IndexAuditTests(APITestCase):
+    """
+    Поля фильтрации и сортировки API поддержаны индексами в схеме после миграций
+    """
+
+    def test_all_fields_indexed(self):
+        out = io.StringIO()
+        call_command('audit_indexes', stdout=out)  # CommandError, если для поля нет индекса
+        self.assertIn('Все поля фильтрации и сортировки поддержаны индексами', out.getvalue())
+
+    def test_missing_index_is_reported(self):
+        class UnindexedViewSet(ReviewViewSet):
+            filterset_fields = ['text']
+            index_audit_exempt = {}
+
+        results = audit([('reviews', UnindexedViewSet, 'reviews')])
+        self.assertEqual([(row['field'], row['status']) for row in results], [('text', 'missing'), ('id', 'ok')])
+
+
+class ClaimsJWTAuthenticationTests(APITestCase):
+    """
+    JWT без запроса пользователя к БД: права из утверждений токена и кэша состояния
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='pass')
+        cls.student = User.objects.create_user(username='student', password='pass')
+        cls.course = Course.objects.create(name='Python', author='Автор')
+        cls.review = Review.objects.create(course=cls.course, user=cls.student, rate=5)
+
+    def login(self, username):
+        response = self.client.post('/token/', {'username': username, 'password': 'pass'})
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["access"]}')
+        return response.data
+
+    def test_claims_in_token(self):
+        access = AccessToken(self.login('admin')['access'])
+        self.assertEqual((access['username'], access['is_staff'], access['is_superuser']), ('admin', True, True))
+
+    def test_no_user_query_when_state_cached(self):
+        self.client.get('/reviews/')  # количество строк списка - в кэш (CachedCountMixin)
+        with CaptureQueriesContext(connection) as context:
+            self.client.get('/reviews/')
+        anonymous_queries = len(context)
+        self.login('student')
+        self.client.get('/reviews/')  # загрузка состояния пользователя в кэш
+        with self.assertNumQueries(anonymous_queries):
+            response = self.client.get('/reviews/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_deactivation_revokes_access(self):
+        self.login('student')
+        self.assertEqual(self.client.get('/reviews/').status_code, 200)
+        self.student.is_active = False
+        self.student.save()
+        self.assertEqual(self.client.get('/reviews/').status_code, 401)
+
+    def test_privileges_follow_current_state(self):
+        self.login('admin')
+        User.objects.filter(pk=self.admin.pk).update(is_superuser=False, is_staff=False)  # без сигнала
+        self.assertEqual(self.client.get('/reviews/').status_code, 200)  # права из кэша до истечения записи
+        user_state_cache.evict(self.admin.pk)
+        self.assertEqual(self.client.delete(f'/reviews/{self.review.id}/').status_code, 403)
+
+
+class WriteRetryTests(TransactionTestCase):
+    """
+    Повтор записи при блокировке SQLite (db.py)
+    """
+
+    def test_retries_locked_database(self):
+        calls = []
+
+        def write():
+            calls.append(connection.in_atomic_block)
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+            return 'ok'
+
+        self.assertEqual(retry_on_locked(write, attempts=3, backoff=0)(), 'ok')
+        self.assertEqual(calls, [True, True, True])  # каждая попытка - в своей транзакции
+
+    def test_other_errors_and_last_attempt_are_raised(self):
+        other = mock.Mock(side_effect=OperationalError('no such table: x'))
+        with self.assertRaises(OperationalError):
+            retry_on_locked(other, attempts=3, backoff=0)()
+        self.assertEqual(other.call_count, 1)
+
+        locked = mock.Mock(side_effect=OperationalError('database is locked'))
+        with self.assertRaises(OperationalError):
+            retry_on_locked(locked, attempts=2, backoff=0)()
+        self.assertEqual(locked.call_count, 2)
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1', 'replica_2'])
+class ReplicaRoutingTests(SimpleTestCase):
+    """
+    Чтение с реплик для безопасных методов и прилипание к основной БД после записи
+    """
+
+    def route(self, request, status=200):
+        """
+        :return: (БД для чтения внутри запроса, ответ)
+        """
+
+        used = []
+
+        def get_response(request):
+            used.append(ReplicaRouter().db_for_read(Course))
+            return HttpResponse(status=status)
+
+        response = ReplicaRoutingMiddleware(get_response)(request)
+        return used[0], response
+
+    def test_reads_go_to_replicas(self):
+        db, response = self.route(RequestFactory().get('/courses/'))
+        self.assertIn(db, ['replica_1', 'replica_2'])
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+        self.assertEqual(ReplicaRouter().db_for_read(Course), 'default')  # вне запроса
+        self.assertEqual(ReplicaRouter().db_for_write(Course), 'default')
+
+    def test_read_your_writes(self):
+        db, response = self.route(RequestFactory().post('/reviews/'), status=201)
+        self.assertEqual(db, 'default')
+        self.assertEqual(response.cookies[STICKY_COOKIE]['max-age'], 5)
+
+        request = RequestFactory().get('/reviews/')
+        request.COOKIES[STICKY_COOKIE] = '1'
+        self.assertEqual(self.route(request)[0], 'default')
+
+    def test_failed_write_is_not_sticky(self):
+        _, response = self.route(RequestFactory().post('/reviews/'), status=400)
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_migrations_only_on_primary(self):
+        self.assertFalse(ReplicaRouter().allow_migrate('replica_1', 'api_educational_courses'))
+        self.assertTrue(ReplicaRouter().allow_migrate('default', 'api_educational_courses'))
+
+
+class MetricsTests(APITestCase):
+    """
+    Метрики запросов по маршрутам и журнал N+1
+    """
+
+    def setUp(self):
+        super().setUp()
+        for histogram in HISTOGRAMS:
+            histogram.clear()
+
+    def test_prometheus_exposition(self):
+        Course.objects.create(name='Python', author='Автор')
+        self.client.get('/courses/')
+        body = self.client.get('/metrics/').content.decode()
+        self.assertIn('# TYPE api_db_queries histogram', body)
+        self.assertIn('api_db_queries_count{route="courses-list",method="GET"} 1', body)
+        self.assertIn('api_db_queries_bucket{route="courses-list",method="GET",le="2"} 1', body)  # COUNT/MAX и страница
+        self.assertIn('api_serialization_duration_seconds_sum{route="courses-list",method="GET"}', body)
+        self.assertNotIn('route="metrics"', body)
+
+    def test_metrics_allowed_ips(self):
+        self.assertEqual(self.client.get('/metrics/', REMOTE_ADDR='10.0.0.1').status_code, 403)
+
+    def test_n_plus_one_is_logged(self):
+        def get_response(request):
+            for pk in range(12):
+                User.objects.filter(pk=pk).exists()
+            return HttpResponse()
+
+        with self.assertLogs('api_educational_courses.queries', 'WARNING') as logs:
+            MetricsMiddleware(get_response)(RequestFactory().get('/'))
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('выполнен 12 раз', logs.output[0])
+
+    def test_async_requests_are_measured(self):
+        async def get_response(request):
+            for pk in range(12):
+                await User.objects.filter(pk=pk).aexists()  # запросы асинхронного ORM - в другом потоке
+            return HttpResponse()
+
+        middleware = MetricsMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))  # без переключения потоков в обработчике ASGI
+        with self.assertLogs('api_educational_courses.queries', 'WARNING') as logs:
+            async_to_sync(middleware)(RequestFactory().get('/'))
+        self.assertIn('выполнен 12 раз', logs.output[0])
+        self.assertIn('api_db_queries_count{route="unmatched",method="GET"} 1', '\n'.join(DB_QUERIES.expose()))
+
+    def test_sql_template(self):
+        self.assertEqual(sql_template('SELECT 1 FROM t WHERE id IN (%s, %s, %s) LIMIT 21'),
+                         'SELECT N FROM t WHERE id IN (%s, ...) LIMIT N')
+
+
+@override_settings(ALLOWED_HOSTS=['localhost'])
+class BenchmarkTests(TransactionTestCase):
+    """
+    Синтетические данные (seed_data) и замер эндпоинтов (benchmark_api).
+    TransactionTestCase: запросы замера выполняются в потоках со своими соединениями
+    """
+
+    def setUp(self):
+        cache.clear()
+        user_state_cache.clear()
+        throttling.get_store().clear()
+        call_command('seed_data', scale=0.0001, stdout=io.StringIO())
+        self.directory = tempfile.mkdtemp()
+        self.output = os.path.join(self.directory, 'results.json')
+
+    def test_seed_data(self):
+        self.assertEqual(User.objects.filter(username__startswith='seed_user_').count(), 10)
+        self.assertEqual(Review.objects.count(), 100)
+        self.assertEqual(Enrollment.objects.count(), 10)
+        self.assertEqual(sum(CourseRatingSummary.objects.values_list('count', flat=True)), 100)
+
+        call_command('seed_data', clear=True, stdout=io.StringIO())
+        self.assertFalse(User.objects.filter(username__startswith='seed_user_').exists())
+        self.assertFalse(Review.objects.exists())
+
+    def test_benchmark_results_and_baseline(self):
+        call_command('benchmark_api', requests=2, concurrency=1, output=self.output, stdout=io.StringIO())
+        with open(self.output) as file:
+            report = json.load(file)
+        self.assertEqual(len(report['results']), 6 * 6 + 5)  # у профилей нет сценария создания
+        self.assertEqual({key: r['errors'] for key, r in report['results'].items() if r['errors']}, {})
+        self.assertEqual(report['results']['reviews:list']['queries_min'], 1)  # count из кэша
+        self.assertEqual(Review.objects.count(), 100)  # созданные замером объекты удалены
+
+        report['results']['reviews:list']['queries_min'] = 0
+        with open(self.output, 'w') as file:
+            json.dump(report, file)
+        with self.assertRaisesMessage(CommandError, 'reviews:list: SQL-запросов 0 -> 1'):
+            call_command('benchmark_api', requests=2, concurrency=1, only=['reviews'], scenarios=['list'],
+                         baseline=self.output, tolerance=100, stdout=io.StringIO())
+
+
+class SparseFieldsTests(APITestCase):
+    """
+    Сокращенное представление: ?fields=, список без тяжелых полей, ?view=full
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user(username='student', password='pass')
+        cls.lesson = Lesson.objects.create(name='Python', text='Длинный текст урока',
+                                           lesson_recording_url='http://example.com/')
+        Enrollment.objects.create(user=cls.student).course.set([Course.objects.create(name='Python', author='Автор')])
+
+    def get_with_sql(self, path, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path, params)
+        return response, ' '.join(query['sql'] for query in queries if 'lesson' in query['sql'])
+
+    def test_list_summary_defers_heavy_fields(self):
+        response, sql = self.get_with_sql('/lessons/')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'name', 'lesson_recording_url', 'updated_at'})
+        self.assertNotIn('"text"', sql)
+
+        response, sql = self.get_with_sql('/lessons/', {'view': 'full'})
+        self.assertEqual(response.data['results'][0]['text'], 'Длинный текст урока')
+        self.assertIn('"text"', sql)
+
+    def test_fields(self):
+        response, sql = self.get_with_sql('/lessons/', {'fields': 'name,id'})
+        self.assertEqual(response.data['results'], [{'id': self.lesson.id, 'name': 'Python'}])
+        self.assertNotIn('lesson_recording_url', sql)
+
+        response = self.client.get(f'/lessons/{self.lesson.id}/')
+        self.assertEqual(response.data['text'], 'Длинный текст урока')  # детальный просмотр полный
+        self.assertEqual(self.client.get(f'/lessons/{self.lesson.id}/', {'fields': 'text'}).data,
+                         {'text': 'Длинный текст урока'})
+        self.assertEqual(self.client.get('/async/lessons/', {'fields': 'name,id'}).json()['results'],
+                         [{'id': self.lesson.id, 'name': 'Python'}])
+
+    def test_fields_with_select_related_and_expand(self):
+        response = self.client.get('/enrollments/', {'fields': 'id,user', 'expand': 'user'})
+        self.assertEqual(response.data['results'][0]['user'], {'id': self.student.id, 'username': 'student'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'user'})
+
+    def test_unknown_field(self):
+        response = self.client.get('/lessons/', {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'fields': ['Неизвестные поля: password.']})
+        self.assertEqual(self.client.get('/async/lessons/', {'fields': 'password'}).status_code, 400)
+
+    def test_export_is_full_by_default(self):
+        response = self.client.get('/lessons/', {'format': 'ndjson'})
+        self.assertEqual(json.loads(b''.join(response.streaming_content))['text'], 'Длинный текст урока')
+        response = self.client.get('/lessons/', {'format': 'ndjson', 'fields': 'id'})
+        self.assertEqual(json.loads(b''.join(response.streaming_content)), {'id': self.lesson.id})
+
+
+class FastListTests(APITestCase):
+    """
+    Быстрый путь списков (fastlist.py) отдает те же байты, что и сериализатор
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user(username='student', password='pass')
+        cls.course = Course.objects.create(name='Python', author='Автор')
+        Review.objects.bulk_create([
+            Review(course=cls.course, user=cls.student, rate=9, text='Строка абзац  "кавычки" \\ \x01\t'),
+            Review(course=cls.course, user=cls.student, rate=0, text=None),
+            Review(course=cls.course, user=cls.student, rate=10, text='😀 <b>&</b>'),
+        ])
+        Lesson.objects.create(name='Урок', text='Текст', lesson_recording_url='http://example.com/')
+        category = Category.objects.create(name='Программирование')
+        category.course.set([cls.course])
+        Enrollment.objects.create(user=cls.student).course.set([cls.course])
+        UserProfile.objects.create(user=cls.student, name='Студент', teacher='Преподаватель')
+
+    def assertSameAsSerializer(self, path, params):
+        response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        with override_settings(API_FAST_LIST_ENABLED=False):
+            expected = self.client.get(path, {**params, '_': 'slow'}).content  # другой ключ кэша ответов
+        self.assertEqual(response.content, expected.replace(b'&_=slow', b''))
+        return response
+
+    def test_byte_for_byte(self):
+        for path, params in [
+            ('/reviews/', {'page_size': 1000, 'view': 'full'}),
+            ('/reviews/', {'fields': 'rate,id', 'ordering': '-id'}),
+            ('/lessons/', {'view': 'full'}),
+            ('/user_profiles/', {}),
+            ('/enrollments/', {'fields': 'id,user'}),
+            ('/categories/', {'fields': 'id,name'}),
+        ]:
+            with self.subTest(path=path, params=params):
+                response = self.assertSameAsSerializer(path, params)
+                self.assertTrue(response.renderer_context['view'].json_native)
+
+        with mock.patch('api_educational_courses.fastlist.orjson', None):
+            self.assertSameAsSerializer('/reviews/', {'view': 'full', 'page': 'last'})
+
+    def test_fallback_to_serializer(self):
+        for path, params in [('/courses/', {}), ('/enrollments/', {}), ('/reviews/', {'pagination': 'cursor'})]:
+            with self.subTest(path=path, params=params):
+                response = self.client.get(path, params)
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(response.renderer_context['view'].json_native)
+
+    @override_settings(ALLOWED_HOSTS=['localhost'])
+    def test_benchmark_command(self):
+        output = io.StringIO()
+        call_command('benchmark_fast_list', '/reviews/?view=full', requests=1, json=True, stdout=output)
+        self.assertEqual(set(json.loads(output.getvalue())[0]),
+                         {'path', 'serializer', 'fast_json', 'fast_orjson', 'speedup'})
+
+
+class CachedCountTests(APITestCase):
+    """
+    Количество строк списков из кэша и оценка по статистике БД (CachedCountMixin)
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user(username='student', password='pass')
+        cls.course = Course.objects.create(name='Python', author='Автор')
+        cls.other_course = Course.objects.create(name='Django', author='Автор')
+        Review.objects.bulk_create(Review(course=cls.course, user=cls.student, rate=i) for i in range(5))
+        cls.enrollment = Enrollment.objects.create(user=cls.student)
+
+    def test_count_is_cached_until_write(self):
+        params = {'course': self.course.id}
+        self.assertEqual(self.client.get('/reviews/', params).data['count'], 5)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/reviews/', params)
+        self.assertFalse([query for query in queries if 'COUNT(' in query['sql']])
+        self.assertEqual(response.data['count'], 5)
+        self.assertNotIn('count_approximate', response.data)
+
+        Review.objects.create(course=self.course, user=self.student, rate=1)
+        self.assertEqual(self.client.get('/reviews/', params).data['count'], 6)
+        Review.objects.filter(rate=1).first().delete()
+        self.assertEqual(self.client.get('/reviews/', params).data['count'], 5)
+
+    def test_related_writes_invalidate(self):
+        self.assertEqual(self.client.get('/reviews/', {'search': 'Flask'}).data['count'], 0)
+        self.course.name = 'Flask'
+        self.course.save()
+        self.assertEqual(self.client.get('/reviews/', {'search': 'Flask'}).data['count'], 5)
+
+        self.assertEqual(self.client.get('/enrollments/', {'course': self.other_course.id}).data['count'], 0)
+        self.enrollment.course.add(self.other_course)
+        self.assertEqual(self.client.get('/enrollments/', {'course': self.other_course.id}).data['count'], 1)
+
+    @override_settings(API_COUNT_ESTIMATE_THRESHOLD=3)
+    def test_estimated_count(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.addCleanup(lambda: connection.cursor().execute('DELETE FROM sqlite_stat1'))
+        Review.objects.bulk_create(Review(course=self.other_course, user=self.student, rate=1) for _ in range(2))
+
+        response = self.client.get('/reviews/')
+        self.assertEqual((response.data['count'], response.data['count_approximate']), (5, True))  # по ANALYZE
+        self.assertNotIn('Last-Modified', response)
+        with self.assertNumQueries(1):  # без COUNT(*): только страница
+            self.client.get('/reviews/')
+        self.assertEqual(self.client.get('/reviews/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        Review.objects.create(course=self.course, user=self.student, rate=1)
+        self.assertEqual(self.client.get('/reviews/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+        response = self.client.get('/reviews/', {'course': self.other_course.id})  # с фильтром - точно
+        self.assertEqual(response.data['count'], 2)
+        self.assertNotIn('count_approximate', response.data)
+
+
+class DashboardTests(APITestCase):
+    """
+    Панель пользователя /me/dashboard/: постоянное количество запросов
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user(username='student', password='pass')
+        cls.other = User.objects.create_user(username='other', password='pass')
+        cls.courses = Course.objects.bulk_create(Course(name=f'Курс {i}', author='Автор') for i in range(6))
+        cls.category = Category.objects.create(name='Программирование')
+        cls.category.course.set(cls.courses[:2])
+        enrollment = Enrollment.objects.create(user=cls.student)
+        enrollment.course.set(cls.courses[:2])
+        Enrollment.objects.create(user=cls.other).course.set(cls.courses[2:3])
+        Review.objects.create(course=cls.courses[0], user=cls.student, rate=8, text='Хорошо')
+        Review.objects.create(course=cls.courses[0], user=cls.other, rate=2)
+        CourseRatingSummary.rebuild()
+
+    def get_dashboard(self, queries):
+        self.client.force_authenticate(self.student)
+        with self.assertNumQueries(queries):
+            response = self.client.get('/me/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_dashboard(self):
+        data = self.get_dashboard(3)  # курсы со статистикой, категории, отзывы пользователя
+        self.assertEqual(data['user'], {'id': self.student.id, 'username': 'student'})
+        self.assertEqual([course['name'] for course in data['courses']], ['Курс 0', 'Курс 1'])
+        first, second = data['courses']
+        self.assertEqual(first['categories'], [{'id': self.category.id, 'name': 'Программирование'}])
+        self.assertEqual((first['rating']['count'], first['rating']['avg']), (2, 5.0))
+        self.assertEqual((first['review']['rate'], first['review']['text']), (8, 'Хорошо'))
+        self.assertIsNone(second['review'])
+
+    def test_constant_queries(self):
+        Enrollment.objects.create(user=self.student).course.set(self.courses[2:])
+        Category.objects.create(name='Веб').course.set(self.courses)
+        Review.objects.bulk_create(Review(course=course, user=self.student, rate=5) for course in self.courses)
+        self.assertEqual(len(self.get_dashboard(3)['courses']), 6)
+
+    def test_requires_authentication(self):
+        self.assertEqual(self.client.get('/me/dashboard/').status_code, 401)
+
+
+@override_settings(API_TASKS_EAGER=True)
+class SimilarCoursesTests(APITestCase):
+    """
+    Похожие курсы: индекс совместных записей и /courses/<id>/similar/
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(username=f'student{i}') for i in range(4)]
+        cls.a, cls.b, cls.c, cls.d = Course.objects.bulk_create(Course(name=name, author='Автор') for name in 'ABCD')
+        Category.objects.create(name='Программирование').course.set([cls.a, cls.b])
+
+    def enroll(self, user, courses):
+        with self.captureOnCommitCallbacks(execute=True):
+            enrollment = Enrollment.objects.create(user=user)
+            enrollment.course.set(courses)
+        return enrollment
+
+    def assertFullRebuildNotCalled(self, build_matrix):
+        self.assertTrue(all(call.kwargs.get('course_ids') for call in build_matrix.call_args_list))
+
+    def index(self):
+        return (set(CourseCooccurrence.objects.filter(count__gt=0).values_list('course', 'other', 'count')),
+                list(CourseNeighbor.objects.order_by('course', 'rank').values_list('course', 'neighbor', 'rank')))
+
+    def test_similar(self):
+        self.enroll(self.users[0], [self.a, self.b])
+        self.enroll(self.users[1], [self.a, self.b, self.c])
+        self.enroll(self.users[2], [self.a, self.c])
+        recommendations.rebuild()
+
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/courses/{self.a.id}/similar/')
+        self.assertEqual([(row['id'], row['name']) for row in response.data], [(self.b.id, 'B'), (self.c.id, 'C')])
+        # 2 общих студента из 3 и 2 - 2 / sqrt(6), у B еще и общая категория
+        self.assertEqual([row['score'] for row in response.data], [round(2 / 6 ** 0.5 + 0.2, 4), round(2 / 6 ** 0.5, 4)])
+        self.assertEqual(self.client.get(f'/courses/{self.d.id}/similar/').data, [])
+        self.assertEqual(self.client.get('/courses/0/similar/').status_code, 404)
+        self.assertEqual(self.client.get('/courses/abc/similar/').status_code, 404)
+
+    def test_incremental_updates_match_rebuild(self):
+        first = self.enroll(self.users[0], [self.a, self.b])
+        self.enroll(self.users[1], [self.a, self.b, self.c])
+        self.enroll(self.users[0], [self.b, self.c])  # повторная запись на B не считается вторым студентом
+        second = self.enroll(self.users[2], [self.c, self.d])
+        with self.captureOnCommitCallbacks(execute=True):
+            first.course.remove(self.a)
+            second.course.set([self.a, self.c])
+            self.d.enrollments.add(first)
+        incremental = self.index()
+        self.assertIn((self.b.id, self.c.id, 2), incremental[0])
+        recommendations.rebuild()
+        self.assertEqual(self.index(), incremental)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+            first.course.clear()
+        incremental = self.index()
+        recommendations.rebuild()
+        self.assertEqual(self.index(), incremental)
+
+    def test_bulk_writes_update_index_incrementally(self):
+        self.client.force_authenticate(User.objects.create_superuser(username='admin'))
+        self.enroll(self.users[0], [self.a, self.b])
+        with mock.patch.object(recommendations, 'build_matrix', wraps=recommendations.build_matrix) as build_matrix:
+            with self.captureOnCommitCallbacks(execute=True):
+                ids = self.client.post('/enrollments/bulk/', [
+                    {'user': self.users[1].id, 'course': [self.a.id, self.c.id]},
+                    {'user': self.users[0].id, 'course': [self.c.id]},
+                ], format='json').data['ids']
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.patch('/enrollments/bulk/', [{'id': ids[0], 'course': [self.b.id, self.d.id]},
+                                                         {'id': ids[1], 'course': [self.b.id]}], format='json')
+        self.assertFullRebuildNotCalled(build_matrix)
+        incremental = self.index()
+        self.assertIn((self.b.id, self.d.id, 1), incremental[0])
+        recommendations.rebuild()
+        self.assertEqual(self.index(), incremental)
+
+    def test_category_change_refreshes_neighbors_incrementally(self):
+        self.enroll(self.users[0], [self.a, self.b, self.c])
+        self.enroll(self.users[1], [self.c, self.d])
+        with mock.patch.object(recommendations, 'build_matrix', wraps=recommendations.build_matrix) as build_matrix:
+            with self.captureOnCommitCallbacks(execute=True):
+                category = Category.objects.create(name='Веб')
+                category.course.set([self.a, self.c])
+                self.d.categories.add(category)
+        self.assertFullRebuildNotCalled(build_matrix)
+        incremental = self.index()
+        recommendations.rebuild()
+        self.assertEqual(self.index(), incremental)
+
+        with mock.patch.object(recommendations, 'build_matrix', wraps=recommendations.build_matrix) as build_matrix:
+            with self.captureOnCommitCallbacks(execute=True):
+                category.delete()
+        self.assertFullRebuildNotCalled(build_matrix)
+        incremental = self.index()
+        recommendations.rebuild()
+        self.assertEqual(self.index(), incremental)
+
+    def test_rebuild_reads_enrollments_under_matrix_lock(self):
+        self.enroll(self.users[0], [self.a, self.b])
+        table = CourseCooccurrence._meta.db_table
+        with CaptureQueriesContext(connection) as queries:
+            recommendations.rebuild()
+        sql = [query['sql'] for query in queries.captured_queries]
+        delete = next(i for i, query in enumerate(sql) if query.startswith('DELETE') and table in query)
+        read = next(i for i, query in enumerate(sql) if EnrollmentCourse._meta.db_table in query)
+        self.assertLess(delete, read)  # запись в матрицу заблокирована до чтения записей на курсы
+
+
+calls = []
+
+
+@tasks.task(name='tests.record')
+def record(value):
+    calls.append(value)
+
+
+@tasks.task(name='tests.flaky', max_attempts=2)
+def flaky(value):
+    calls.append(value)
+    raise RuntimeError('ошибка')
+
+
+class TaskQueueTests(APITestCase):
+    """
+    Фоновые задачи: постановка после фиксации, дедупликация, повторы, обработчики
+    """
+
+    def setUp(self):
+        super().setUp()
+        calls.clear()
+
+    def test_enqueue_on_commit_with_dedupe(self):
+        tasks.enqueue(record, 'откат')  # транзакция теста не фиксируется - задачи нет
+        self.assertFalse(Job.objects.exists())
+        with self.captureOnCommitCallbacks(execute=True):
+            tasks.enqueue(record, 1, dedupe_key='key')
+            tasks.enqueue(record, 2, dedupe_key='key')
+            tasks.enqueue(record, 3)
+        self.assertEqual(Job.objects.count(), 2)
+        self.assertEqual(calls, [])
+
+        self.assertEqual(tasks.run_pending(), 2)
+        self.assertEqual(calls, [1, 3])
+        self.assertFalse(Job.objects.exists())
+
+    @override_settings(API_TASKS_RETRY_DELAY=60)
+    def test_retries_then_failed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            tasks.enqueue(flaky, 'x')
+        with self.assertLogs('api_educational_courses.tasks', 'ERROR'):
+            self.assertEqual(tasks.run_pending(), 1)
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), (Job.PENDING, 1))
+        self.assertIn('RuntimeError', job.last_error)
+        self.assertEqual(tasks.run_pending(), 0)  # повтор - через минуту
+
+        Job.objects.update(run_after=job.created_at)
+        with self.assertLogs('api_educational_courses.tasks', 'ERROR'):
+            self.assertEqual(tasks.run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertEqual(calls, ['x', 'x'])
+        self.assertEqual(tasks.run_pending(), 0)
+
+    def test_stale_running_job_is_reclaimed(self):
+        job = Job.objects.create(name='tests.record', args=[1], status=Job.RUNNING, attempts=1, claimed_by='dead')
+        self.assertEqual(tasks.run_pending(), 0)
+        with override_settings(API_TASKS_LEASE_TIMEOUT=0):
+            Job.objects.filter(pk=job.pk).update(updated_at=job.updated_at.replace(year=2000))
+            self.assertEqual(tasks.run_pending(), 1)
+        self.assertEqual(calls, [1])
+
+    def test_worker_pool_starts_lazily_in_each_process(self):
+        with mock.patch.object(tasks, 'WorkerPool') as pool, \
+                mock.patch.multiple(tasks, _pool=None, _pool_pid=None, _pool_enabled=False):
+            self.client.get('/courses/')
+            pool.assert_not_called()  # manage.py и тесты: wsgi.py/asgi.py не импортированы
+            tasks.enable_worker_pool()
+            pool.assert_not_called()
+            self.client.get('/courses/')
+            self.client.get('/courses/')
+            self.assertEqual(pool.call_count, 1)
+            with mock.patch.object(tasks.os, 'getpid', return_value=-1):  # рабочий процесс после fork
+                self.client.get('/courses/')
+            self.assertEqual(pool.call_count, 2)
+
+    def test_enrollment_refreshes_neighbors_in_background(self):
+        user = User.objects.create_user(username='student')
+        courses = Course.objects.bulk_create(Course(name=name, author='Автор') for name in 'AB')
+        self.client.force_authenticate(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/enrollments/', {'user': user.id, 'course': [course.id for course in courses]},
+                                        format='json')
+        self.assertEqual(response.status_code, 201)
+        # матрица и списки соседей - не в обработчике запроса
+        self.assertFalse(CourseCooccurrence.objects.exists())
+        self.assertEqual(sorted(Job.objects.values_list('dedupe_key', flat=True)),
+                         [f'course-cooccurrence:{course.id}' for course in courses])
+
+        out = io.StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('run_task_workers', '--once', stdout=out)
+        self.assertIn('Выполнено задач: 2', out.getvalue())
+        self.assertEqual(sorted(Job.objects.values_list('dedupe_key', flat=True)),
+                         [f'course-neighbors:{course.id}' for course in courses])
+        call_command('run_task_workers', '--once', stdout=io.StringIO())
+        self.assertEqual(CourseNeighbor.objects.filter(course=courses[0]).get().neighbor, courses[1])
+
+
+@override_settings(API_THROTTLE_RATES={'default': (1, 2), 'courses': None})
+class ThrottleTests(APITestCase):
+    """
+    Token bucket на клиента и представление
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='student', password='pass')
+
+    def test_burst_then_429(self):
+        for _ in range(2):
+            self.assertEqual(self.client.get('/lessons/').status_code, 200)
+        response = self.client.get('/lessons/')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+
+        self.assertEqual(self.client.get('/categories/').status_code, 200)  # своя корзина у представления
+        self.assertEqual(self.client.get('/courses/').status_code, 200)  # без ограничения
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/lessons/').status_code, 200)  # своя корзина у пользователя
+
+    @override_settings(API_THROTTLE_RATES={'default': (1, 2), 'auth': (1, 1)})
+    def test_token_endpoints_have_own_scope(self):
+        response = self.client.post('/token/', {'username': 'student', 'password': 'pass'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.post('/token/', {'username': 'student', 'password': 'wrong'},
+                                          format='json').status_code, 429)
+        self.assertEqual(self.client.post('/token/refresh/', {'refresh': response.data['refresh']},
+                                          format='json').status_code, 429)  # общая корзина 'auth'
+        self.assertEqual(self.client.get('/lessons/').status_code, 200)
+
+    @override_settings(API_THROTTLE_ENABLED=False)
+    def test_disabled(self):
+        for _ in range(3):
+            self.assertEqual(self.client.get('/lessons/').status_code, 200)
+
+    @override_settings(API_THROTTLE_STORE='api_educational_courses.throttling.CacheBucketStore')
+    def test_cache_store(self):
+        for _ in range(2):
+            self.assertEqual(self.client.get('/lessons/').status_code, 200)
+        self.assertEqual(self.client.get('/lessons/').status_code, 429)
+
+    def test_refill(self):
+        bucket, wait = throttling.take_token(None, 100.0, rate=2, capacity=1)
+        self.assertEqual(wait, 0)
+        bucket, wait = throttling.take_token(bucket, 100.25, rate=2, capacity=1)
+        self.assertEqual(wait, 0.25)  # полтокена: до целого еще 0.25 с
+        bucket, wait = throttling.take_token(bucket, 101.0, rate=2, capacity=1)
+        self.assertEqual((wait, bucket[0]), (0, 0))  # не больше емкости
+
+
+class CoalescingTests(SimpleTestCase):
+    """
+    Объединение одновременных одинаковых GET (single-flight)
+    """
+
+    def test_concurrent_calls_share_result(self):
+        group, started, release, calls = SingleFlight(), threading.Event(), threading.Event(), []
+
+        def func():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return object()
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(group.do('key', func)))
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=lambda: results.append(group.do('key', func))) for _ in range(3)]
+        for thread in followers:
+            thread.start()
+        time.sleep(0.05)
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len({id(result) for result, _ in results}), 1)
+        self.assertEqual(sorted(shared for _, shared in results), [False, True, True, True])
+        self.assertEqual(group.do('key', lambda: 'снова')[0], 'снова')  # после завершения - новый вызов
+
+    def test_error_is_shared(self):
+        group, started, release = SingleFlight(), threading.Event(), threading.Event()
+
+        def fail():
+            started.set()
+            release.wait(5)
+            raise ValueError('ошибка')
+
+        errors = []
+
+        def call():
+            try:
+                group.do('key', fail)
+            except ValueError as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=call)]
+        threads[0].start()
+        started.wait(5)
+        threads.append(threading.Thread(target=call))
+        threads[1].start()
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(len(errors), 2)
+
+    @override_settings(ALLOWED_HOSTS=['a.example.com', 'b.example.com'])
+    def test_key_depends_on_host(self):
+        view, keys = CourseViewSet(action='list'), []
+        for host in ('a.example.com', 'b.example.com'):
+            request = Request(RequestFactory().get('/courses/', {'page': 2}, HTTP_HOST=host))
+            request.accepted_renderer = JSONRenderer()
+            keys.append(view.get_coalesce_key(request))
+        self.assertNotEqual(keys[0], keys[1])  # next/previous ответа - абсолютные ссылки на свой хост
+
+    @override_settings(DATABASE_REPLICAS=['replica_1'])
+    def test_key_depends_on_replica_routing(self):
+        request = Request(RequestFactory().get('/courses/'))
+        request.accepted_renderer = JSONRenderer()
+        view, keys = CourseViewSet(action='list'), []
+
+        def get_response(http_request):
+            keys.append(view.get_coalesce_key(request))
+            return HttpResponse()
+
+        sticky = RequestFactory().get('/courses/')
+        sticky.COOKIES[STICKY_COOKIE] = '1'  # клиент после записи читает из основной БД
+        for http_request in (RequestFactory().get('/courses/'), sticky, RequestFactory().get('/courses/')):
+            ReplicaRoutingMiddleware(get_response)(http_request)
+        self.assertNotEqual(keys[0], keys[1])
+        self.assertEqual(keys[0], keys[2])
+
+    def test_view_response_is_copied(self):
+        request = RequestFactory().get('/courses/1/', {'fields': 'id'})
+        started, release, calls = threading.Event(), threading.Event(), []
+
+        def handler(request, *args, **kwargs):
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return Response({'id': 1}, headers={'ETag': '"abc"'})
+
+        responses = []
+
+        def get():
+            view = CourseViewSet(action='retrieve')
+            drf_request = Request(request)
+            drf_request.accepted_renderer = JSONRenderer()
+            responses.append(view.coalesced(handler, drf_request, pk='1'))
+
+        threads = [threading.Thread(target=get)]
+        threads[0].start()
+        started.wait(5)
+        threads.append(threading.Thread(target=get))
+        threads[1].start()
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertIsNot(responses[0], responses[1])
+        self.assertEqual([(response.data, response['ETag']) for response in responses], [({'id': 1}, '"abc"')] * 2)
+
+
+@override_settings(API_CATALOG_BACKGROUND_REBUILD=False)
+class CatalogTests(APITestCase):
+    """
+    Каталог /catalog/ из снимка в памяти и его версия /catalog/version/
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.python, cls.django, cls.go = Course.objects.bulk_create(
+            Course(name=name, author='Автор') for name in ('Python', 'Django', 'Go'))
+        cls.backend = Category.objects.create(name='Бэкенд')
+        cls.backend.course.set([cls.python, cls.django, cls.go])
+        Category.objects.create(name='Веб').course.set([cls.django])
+        student = User.objects.create_user(username='student')
+        Review.objects.create(course=cls.python, user=student, rate=8)
+        CourseRatingSummary.rebuild()
+
+    def setUp(self):
+        super().setUp()
+        catalog._snapshot = None
+        self.addCleanup(setattr, catalog, '_snapshot', None)
+
+    def get_catalog(self, queries=None, **headers):
+        if queries is None:
+            return self.client.get('/catalog/', **headers)
+        with self.assertNumQueries(queries):
+            return self.client.get('/catalog/', **headers)
+
+    def test_tree(self):
+        response = self.get_catalog(3)  # курсы со статистикой, связи категория - курс, категории
+        data = json.loads(response.content)
+        self.assertEqual([category['name'] for category in data['categories']], ['Бэкенд', 'Веб'])
+        backend, web = data['categories']
+        self.assertEqual([course['name'] for course in backend['courses']], ['Django', 'Go', 'Python'])
+        self.assertEqual(backend['courses'][2], {'id': self.python.id, 'name': 'Python', 'author': 'Автор',
+                                                 'reviews_count': 1, 'rating_avg': 8.0})
+        self.assertEqual([course['id'] for course in web['courses']], [self.django.id])
+        self.assertEqual(response['ETag'], f'"{data["version"]}"')
+
+    def test_snapshot_is_reused(self):
+        first = self.get_catalog(3)
+        second = self.get_catalog(0)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(self.get_catalog(0, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+    def test_changes_create_new_version(self):
+        versions = [self.get_catalog()['ETag']]
+
+        def changed():
+            response = self.get_catalog()
+            self.assertNotIn(response['ETag'], versions)
+            versions.append(response['ETag'])
+            return json.loads(response.content)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Course.objects.filter(pk=self.go.pk).update(name='Golang')  # без сигналов: версия та же
+        self.assertEqual(self.get_catalog(0)['ETag'], versions[-1])
+
+        self.go.name = 'Golang'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.go.save()
+        self.assertIn('Golang', [course['name'] for course in changed()['categories'][0]['courses']])
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='Мобильная разработка')
+        self.assertEqual(len(changed()['categories']), 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.backend.course.remove(self.go)
+        self.assertEqual(len(changed()['categories'][0]['courses']), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            CourseRatingSummary.apply_review(self.django.id, 4)
+        self.assertEqual(changed()['categories'][0]['courses'][0]['reviews_count'], 1)
+
+    def test_version(self):
+        etag = self.get_catalog()['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/catalog/version/')
+        self.assertEqual(f'"{response.data["version"]}"', etag)
+
+    def test_snapshot_is_published_by_background_task(self):
+        self.get_catalog(3)
+        self.go.name = 'Golang'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.go.save()
+        self.assertEqual(list(Job.objects.values_list('name', flat=True)), ['catalog.publish'])
+        tasks.run_pending()
+        catalog._snapshot = None  # процесс без снимка берет опубликованный, без запросов к БД
+        self.assertIn('Golang', self.get_catalog(0).content.decode())
+
+    @override_settings(API_CATALOG_BACKGROUND_REBUILD=True)
+    def test_stale_snapshot_is_served_while_rebuilding(self):
+        old = self.get_catalog(3)  # первый снимок процесса строится в запросе
+        catalog.invalidate()
+        with mock.patch.object(catalog, 'schedule_rebuild') as schedule_rebuild:
+            response = self.get_catalog(0)
+        schedule_rebuild.assert_called_once_with()
+        self.assertEqual(response.content, old.content)
+        catalog.rebuild()
+        self.assertNotEqual(self.get_catalog(0)['ETag'], old['ETag'])
+
+
+@override_settings(API_COUNT_ESTIMATE_THRESHOLD=None)
+class AdminChangelistTests(APITestCase):
+    """
+    Списки админ-панели: постоянное количество запросов, приблизительное количество строк, поиск по индексам
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='pass')
+        cls.python, cls.django = Course.objects.bulk_create(
+            Course(name=name, author='Автор', description='Веб-разработка') for name in ('Python', 'Django'))
+        cls.students = [User.objects.create_user(username=f'student{i}') for i in range(5)]
+        Review.objects.bulk_create(Review(course=course, user=student, rate=5)
+                                   for course in (cls.python, cls.django) for student in cls.students)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.admin)
+
+    def changelist(self, model, queries=None, **params):
+        url = f'/admin/api_educational_courses/{model}/'
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        if queries is not None:
+            self.assertEqual(len(captured), queries, [query['sql'] for query in captured])
+        return response, [query['sql'] for query in captured]
+
+    def test_review_changelist(self):
+        response, _ = self.changelist('review', 4)  # сессия, пользователь, COUNT(*), страница с курсами и студентами
+        self.assertEqual(response.context['cl'].result_count, 10)
+        self.assertIsNone(response.context['cl'].full_result_count)
+
+    def test_search_related_by_subquery(self):
+        response, queries = self.changelist('review', q='student1')
+        self.assertEqual({str(review.user) for review in response.context['cl'].result_list}, {'student1'})
+        self.assertEqual(response.context['cl'].result_count, 2)
+        response, _ = self.changelist('review', q='student1 Django')  # термины - через И, как в ModelAdmin
+        self.assertEqual([review.course for review in response.context['cl'].result_list], [self.django])
+        for sql in queries[2:]:  # COUNT(*) и страница - без JOIN в условии поиска
+            self.assertIn('"api_educational_courses_review"."user_id" IN (SELECT', sql)
+        self.assertEqual(self.changelist('review', q='student')[0].context['cl'].result_count, 0)
+
+    def test_full_text_search(self):
+        response, _ = self.changelist('course', q='python')
+        self.assertEqual(list(response.context['cl'].result_list), [self.python])
+
+    @override_settings(API_COUNT_ESTIMATE_THRESHOLD=3)
+    def test_estimated_count(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.addCleanup(lambda: connection.cursor().execute('DELETE FROM sqlite_stat1'))
+        Review.objects.create(course=self.python, user=self.admin, rate=1)
+
+        self.changelist('review')  # оценка кэшируется
+        response, queries = self.changelist('review', 3)
+        self.assertEqual(response.context['cl'].result_count, 10)  # по ANALYZE
+        self.assertFalse([sql for sql in queries if 'COUNT(' in sql])
+        response, _ = self.changelist('review', rate__exact=1)  # с фильтром - точное количество
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+    def test_search_uses_indexes(self):
+        request = RequestFactory().get('/')
+        request.user = self.admin
+        for model, model_admin in admin.site._registry.items():
+            if model._meta.app_label != 'api_educational_courses':
+                continue
+            with self.subTest(model=model.__name__):
+                queryset, _ = model_admin.get_search_results(request, model_admin.get_queryset(request), 'x')
+                plan = explain(queryset.order_by())
+                self.assertIsNone(PLAN_PATTERNS['sqlite']['filter'].search(plan), plan)
+
+    @override_settings(API_TASKS_EAGER=True)
+    def test_enrollment_inline_uses_m2m_manager(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enrollment = Enrollment.objects.create(user=self.students[0])
+            enrollment.course.set([self.python])
+            Enrollment.objects.create(user=self.students[1]).course.set([self.python, self.django])
+        Enrollment.objects.filter(pk=enrollment.pk).update(updated_at=timezone.now() - timedelta(days=1))
+        url = f'/admin/api_educational_courses/enrollment/{enrollment.id}/change/'
+        formset = self.client.get(url).context['inline_admin_formsets'][0].formset
+        link = EnrollmentCourse.objects.get(enrollment=enrollment)
+        data = {'user': self.students[0].id, f'{formset.prefix}-TOTAL_FORMS': 2,
+                f'{formset.prefix}-INITIAL_FORMS': 1, f'{formset.prefix}-0-id': link.id,
+                f'{formset.prefix}-0-enrollment': enrollment.id, f'{formset.prefix}-0-course': self.python.id,
+                f'{formset.prefix}-1-enrollment': enrollment.id, f'{formset.prefix}-1-course': self.django.id}
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(url, data).status_code, 302)
+        enrollment.refresh_from_db()
+        self.assertEqual(set(enrollment.course.all()), {self.python, self.django})
+        self.assertGreater(enrollment.updated_at, timezone.now() - timedelta(hours=1))  # m2m_changed
+        self.assertEqual(CourseCooccurrence.objects.get(course=self.python, other=self.django).count, 2)
+
+        data[f'{formset.prefix}-0-DELETE'] = 'on'
+        data[f'{formset.prefix}-INITIAL_FORMS'] = 2
+        data[f'{formset.prefix}-1-id'] = EnrollmentCourse.objects.get(enrollment=enrollment, course=self.django).id
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(url, data).status_code, 302)
+        self.assertEqual(list(enrollment.course.all()), [self.django])
+        self.assertEqual(CourseCooccurrence.objects.get(course=self.python, other=self.django).count, 1)
+
+    def test_change_forms(self):
+        review = Review.objects.first()
+        for url in (f'/admin/api_educational_courses/review/{review.id}/change/',
+                    '/admin/api_educational_courses/enrollment/add/',
+                    '/admin/api_educational_courses/category/add/'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, 'vForeignKeyRawIdAdminField' if 'category' not in url
+                                else 'vManyToManyRawIdAdminField')
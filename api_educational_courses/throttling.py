@@ -0,0 +1,134 @@
+"""
+Ограничение частоты запросов: token bucket на клиента (пользователь или IP) и представление.
+
+У каждого клиента в области (basename представления или throttle_scope) есть корзина
+емкостью capacity токенов, которая пополняется со скоростью rate токенов в секунду;
+запрос забирает токен, пустая корзина - ответ 429 с Retry-After. В отличие от
+фиксированного окна SimpleRateThrottle, допускает короткие всплески до capacity и не
+пропускает двойной лимит на границе окон.
+
+Параметры - API_THROTTLE_RATES {область: (rate, capacity)}, 'default' - для остальных
+областей, None - без ограничения. Хранилище корзин - API_THROTTLE_STORE: по умолчанию
+память процесса (каждый процесс считает свой лимит), CacheBucketStore - общий кэш
+(например, Redis) для всех процессов. Отключается настройкой API_THROTTLE_ENABLED = False
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+
+def take_token(bucket, now, rate, capacity):
+    """
+    :param bucket: (токенов, время обновления) или None - новая полная корзина
+    :return: (новое состояние корзины, секунд до следующего токена или 0 - токен получен)
+    """
+
+    tokens, updated = bucket if bucket is not None else (capacity, now)
+    tokens = min(capacity, tokens + max(now - updated, 0) * rate)
+    if tokens >= 1:
+        return (tokens - 1, now), 0
+    return (tokens, now), (1 - tokens) / rate
+
+
+class MemoryBucketStore:
+    """
+    Корзины в памяти процесса: LRU на maxsize клиентов, потокобезопасно
+    """
+
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize or getattr(settings, 'API_THROTTLE_STORE_SIZE', 100_000)
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, rate, capacity):
+        with self._lock:
+            bucket, wait = take_token(self._buckets.pop(key, None), time.monotonic(), rate, capacity)
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheBucketStore:
+    """
+    Корзины в кэше Django (алиас API_THROTTLE_CACHE_ALIAS), общие для процессов.
+    Чтение и запись корзины не атомарны: при одновременных запросах одного клиента
+    лимит может быть превышен на число таких запросов
+    """
+
+    key_prefix = 'api-throttle'
+
+    def __init__(self):
+        self.cache = caches[getattr(settings, 'API_THROTTLE_CACHE_ALIAS', 'default')]
+
+    def consume(self, key, rate, capacity):
+        key = f'{self.key_prefix}:{key}'
+        bucket, wait = take_token(self.cache.get(key), time.time(), rate, capacity)
+        # полная корзина равна отсутствующей: запись живет, пока корзина не наполнится
+        self.cache.set(key, bucket, int(capacity / rate) + 1)
+        return wait
+
+    def clear(self):
+        self.cache.clear()
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store():
+    """
+    Хранилище корзин из настройки API_THROTTLE_STORE (один объект на класс в процессе)
+    """
+
+    path = getattr(settings, 'API_THROTTLE_STORE', 'api_educational_courses.throttling.MemoryBucketStore')
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = import_string(path)()
+        return _stores[path]
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Token bucket на клиента и область представления (см. описание модуля)
+    """
+
+    wait_time = 0
+
+    @staticmethod
+    def get_scope(view):
+        return getattr(view, 'throttle_scope', None) or getattr(view, 'basename', None) or type(view).__name__
+
+    @staticmethod
+    def get_rate(scope):
+        rates = getattr(settings, 'API_THROTTLE_RATES', {})
+        return rates.get(scope, rates.get('default'))
+
+    def get_client(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return f'user:{user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+    def allow_request(self, request, view):
+        if not getattr(settings, 'API_THROTTLE_ENABLED', True):
+            return True
+        scope = self.get_scope(view)
+        rate = self.get_rate(scope)
+        if rate is None:
+            return True
+        tokens_per_second, capacity = rate
+        self.wait_time = get_store().consume(f'{scope}:{self.get_client(request)}', tokens_per_second, capacity)
+        return self.wait_time == 0
+
+    def wait(self):
+        return self.wait_time
@@ -1,6 +1,9 @@
 from django.urls import path, include
+from .metrics import metrics_view
+from .catalog import CatalogView, CatalogVersionView
+from .async_views import AsyncCourseView, AsyncLessonView, AsyncCategoryView
 from .views import CourseViewSet, UserProfileViewSet, LessonViewSet, EnrollmentViewSet, ReviewViewSet, CategoryViewSet
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView, TokenVerifyView
+from .views import DashboardView, TokenObtainPairView, TokenRefreshView, TokenVerifyView
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 from rest_framework.routers import DefaultRouter
 
@@ -19,7 +22,18 @@ urlpatterns = [
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),  # Получение токена
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),  # Обновление токена
     path('token/verify/', TokenVerifyView.as_view(), name='token_verify'),  # Проверка токена
+    path('me/dashboard/', DashboardView.as_view(), name='me-dashboard'),  # курсы пользователя одним запросом
+    path('catalog/', CatalogView.as_view(), name='catalog'),  # дерево категорий из снимка в памяти
+    path('catalog/version/', CatalogVersionView.as_view(), name='catalog-version'),
+    path('metrics/', metrics_view, name='metrics'),  # метрики Prometheus (см. metrics.py)
     path('schema/', SpectacularAPIView.as_view(), name='schema'),
     path('docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
+    # Асинхронный путь чтения каталога для ASGI-сервера (см. async_views.py)
+    path('async/courses/', AsyncCourseView.as_view(), name='async-courses-list'),
+    path('async/courses/<int:pk>/', AsyncCourseView.as_view(), name='async-courses-detail'),
+    path('async/lessons/', AsyncLessonView.as_view(), name='async-lessons-list'),
+    path('async/lessons/<int:pk>/', AsyncLessonView.as_view(), name='async-lessons-detail'),
+    path('async/categories/', AsyncCategoryView.as_view(), name='async-categories-list'),
+    path('async/categories/<int:pk>/', AsyncCategoryView.as_view(), name='async-categories-detail'),
     path('', include(router.urls)),
 ]
@@ -1,10 +1,30 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.core.paginator import Paginator
+from django.db.models import Prefetch
+from django.http import Http404
 from rest_framework import permissions, filters
-from .models import Course, UserProfile, Lesson, Enrollment, Review, Category
+from rest_framework.decorators import action
+from rest_framework.generics import GenericAPIView
+from rest_framework.response import Response
+from .models import Course, User, UserProfile, Lesson, Enrollment, EnrollmentCourse, Review, Category, CourseRatingSummary
+from .models import CourseNeighbor
 from .serializers import CourseModelSerializer, UserProfileModelSerializer, LessonModelSerializer, EnrollmentModelSerializer
-from .serializers import ReviewModelSerializer, CategoryModelSerializer
+from .serializers import ReviewModelSerializer, CategoryModelSerializer, DashboardSerializer, SimilarCourseSerializer
+from .bulk import BulkWriteMixin
+from .cache import CachedCountMixin, CachedResponseMixin
+from .coalescing import CoalescingMixin
+from .conditional import ConditionalGetMixin
+from .db import WriteRetryMixin
+from .export import StreamingExportMixin
+from .fastlist import FastListMixin
+from .metrics import MetricsMixin
+from .search import FullTextSearchFilter
+from .sparse import SparseFieldsMixin
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import PageNumberPagination, CursorPagination
 from rest_framework.viewsets import ModelViewSet
+from rest_framework_simplejwt import views as jwt_views
 
 class CustomPermission(permissions.BasePermission):
     """
@@ -35,30 +55,112 @@ class CustomPermission(permissions.BasePermission):
         return False
 
 
-class CustomPagination(PageNumberPagination):
+class CustomCursorPagination(CursorPagination):
     """
-    Класс для кастомной пагинации
+    Класс для курсорной (keyset) пагинации по id.
+    Не выполняет COUNT(*) и не использует OFFSET, поэтому время ответа
+    не зависит от глубины страницы
     """
 
     page_size = 3  # количество объектов на странице
     page_size_query_param = 'page_size'  # параметр запроса для настройки количества объектов на странице
     max_page_size = 1000  # максимальное количество объектов на странице
+    ordering = 'id'  # ключ курсора
 
 
-class CourseViewSet(ModelViewSet):
+class CustomPagination(PageNumberPagination):
+    """
+    Класс для кастомной пагинации.
+    Курсорный режим включается параметром запроса ?pagination=cursor
+    (или наличием параметра ?cursor=), для всего представления -
+    указанием pagination_class = CustomCursorPagination
+    """
+
+    page_size = 3  # количество объектов на странице
+    page_size_query_param = 'page_size'  # параметр запроса для настройки количества объектов на странице
+    max_page_size = 1000  # максимальное количество объектов на странице
+    mode_query_param = 'pagination'  # параметр запроса для выбора режима пагинации
+    cursor_paginator = None
+    known_count = None
+    count_approximate = False  # count - оценка (CachedCountMixin), в ответе добавляется count_approximate
+
+    def django_paginator_class(self, queryset, page_size):
+        paginator = Paginator(queryset, page_size)
+        if self.known_count is not None:
+            paginator.count = self.known_count  # не повторяем COUNT(*), уже выполненный для ETag
+        return paginator
+
+    def is_cursor_mode(self, request):
+        return request.query_params.get(self.mode_query_param) == 'cursor' \
+            or CustomCursorPagination.cursor_query_param in request.query_params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.is_cursor_mode(request):
+            self.cursor_paginator = CustomCursorPagination()
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+        self.known_count = getattr(view, 'resource_count', None)
+        self.count_approximate = getattr(view, 'count_approximate', False)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        response = super().get_paginated_response(data)
+        if self.count_approximate:
+            response.data = {'count': response.data.pop('count'), 'count_approximate': True, **response.data}
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema['properties']['count_approximate'] = {
+            'type': 'boolean',
+            'description': 'count - оценка по статистике БД (передается только со значением true)',
+        }
+        return schema
+
+    def get_html_context(self):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_html_context()
+        return super().get_html_context()
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters += [
+            {
+                'name': self.mode_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Режим пагинации: cursor - курсорная пагинация по id без подсчета количества',
+                'schema': {'type': 'string', 'enum': ['cursor']},
+            },
+            {
+                'name': CustomCursorPagination.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': CustomCursorPagination.cursor_query_description,
+                'schema': {'type': 'string'},
+            },
+        ]
+        return parameters
+
+
+class CourseViewSet(MetricsMixin, WriteRetryMixin, SparseFieldsMixin, CoalescingMixin, CachedResponseMixin, ConditionalGetMixin, StreamingExportMixin, FastListMixin, ModelViewSet):
     """
     Класс для обработки данных, переданных пользователем,
     и взаимодействия с объектом модели базы данных Course
     """
 
-    queryset = Course.objects.all()
+    queryset = Course.objects.with_rating_stats()  # статистика оценок считается одним запросом на страницу
     serializer_class = CourseModelSerializer
+    cache_namespace = 'courses'  # анонимные GET кэшируются, см. cache.py
+    last_modified_fields = ['updated_at', 'rating_summary__updated_at']  # ETag учитывает и статистику оценок
+    heavy_fields = ['description']  # не выводится в списке без ?view=full, см. sparse.py
 
     pagination_class = CustomPagination
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, filters.OrderingFilter]
     filterset_fields = ['id', 'name', 'description', 'author']
-    search_fields = ['id', 'name', 'description', 'author']  # Поля, по которым будет выполняться поиск
-    ordering_fields = ['id']  # Поля, по которым можно сортироват
+    search_fields = ['name', 'description', 'author']  # Поля полнотекстового индекса (см. search.py)
+    ordering_fields = ['id', 'rating_avg', 'reviews_count']  # Поля, по которым можно сортировать
 
     def get_permissions(self):
         """
@@ -69,8 +171,25 @@ class CourseViewSet(ModelViewSet):
             return [permissions.IsAdminUser()]  # Только админ может создавать, изменять, удалять
         return [permissions.AllowAny()]  # Пользователь может только смотреть
 
+    @action(detail=True, serializer_class=SimilarCourseSerializer, pagination_class=None, filter_backends=[])
+    def similar(self, request, pk=None):
+        """
+        Похожие курсы ("студенты этого курса также проходили"): top-K из заранее
+        рассчитанного индекса CourseNeighbor (см. recommendations.py), один запрос по индексу
+        """
+
+        try:
+            pk = Course._meta.pk.to_python(pk)
+        except DjangoValidationError:
+            raise Http404
+        neighbors = list(CourseNeighbor.objects.filter(course_id=pk).select_related('neighbor')
+                         .only('neighbor_id', 'score', 'neighbor__name', 'neighbor__author').order_by('rank'))
+        if not neighbors and not Course.objects.filter(pk=pk).exists():
+            raise Http404
+        return Response(self.get_serializer(neighbors, many=True).data)
 
-class UserProfileViewSet(ModelViewSet):
+
+class UserProfileViewSet(MetricsMixin, WriteRetryMixin, SparseFieldsMixin, ConditionalGetMixin, StreamingExportMixin, FastListMixin, ModelViewSet):
     """
     Класс для обработки данных, переданных пользователем,
     и взаимодействия с объектом модели базы данных UserProfile
@@ -82,11 +201,11 @@ class UserProfileViewSet(ModelViewSet):
     pagination_class = CustomPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['id', 'name', 'teacher', 'user']
-    search_fields = ['id', 'name', 'teacher', 'user']  # Поля, по которым будет выполняться поиск
+    search_fields = ['id', 'name', 'teacher', 'user__username']  # Поля, по которым будет выполняться поиск
     ordering_fields = ['id']  # Поля, по которым можно сортировать
 
 
-class LessonViewSet(ModelViewSet):
+class LessonViewSet(MetricsMixin, WriteRetryMixin, SparseFieldsMixin, BulkWriteMixin, CachedResponseMixin, ConditionalGetMixin, StreamingExportMixin, FastListMixin, ModelViewSet):
     """
     Класс для обработки данных, переданных пользователем,
     и взаимодействия с объектом модели базы данных Lesson
@@ -94,40 +213,49 @@ class LessonViewSet(ModelViewSet):
 
     queryset = Lesson.objects.all()
     serializer_class = LessonModelSerializer
+    cache_namespace = 'lessons'  # анонимные GET кэшируются, см. cache.py
+    heavy_fields = ['text']  # не выводится в списке без ?view=full, см. sparse.py
     http_method_names = ['get', 'post', 'put', 'patch', 'delete', 'options']
     pagination_class = CustomPagination
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, filters.OrderingFilter]
     filterset_fields = ['id', 'name', 'text', 'lesson_recording_url']
-    search_fields = ['id', 'name', 'text', 'lesson_recording_url']  # Поля, по которым будет выполняться поиск
+    search_fields = ['name', 'text', 'lesson_recording_url']  # Поля полнотекстового индекса (см. search.py)
     ordering_fields = ['id']  # Поля, по которым можно сортировать
+    # Поля без B-tree индекса (см. команду audit_indexes)
+    index_audit_exempt = {'text': 'текст урока: поиск по содержанию - через полнотекстовый индекс (?search=)'}
 
     def get_permissions(self):
         """
         Метод для определения авторизации пользователя
         """
 
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'bulk']:
             return [permissions.IsAdminUser()]  # Только админ может создавать, изменять, удалять
         return [permissions.AllowAny()]  # Пользователь может только смотреть
 
-class EnrollmentViewSet(ModelViewSet):
+class EnrollmentViewSet(MetricsMixin, WriteRetryMixin, SparseFieldsMixin, BulkWriteMixin, CachedCountMixin, ConditionalGetMixin, StreamingExportMixin, FastListMixin, ModelViewSet):
     """
     Класс для обработки данных, переданных пользователем,
     и взаимодействия с объектом модели базы данных Enrollment
     """
 
-    queryset = Enrollment.objects.all()
+    # Курсы и пользователи подгружаются заранее, чтобы сериализация (в том числе ?expand=course,user)
+    # не выполняла запросы на каждую строку
+    queryset = Enrollment.objects.select_related('user').prefetch_related(
+        Prefetch('course', queryset=Course.objects.only('id', 'name'))
+    )
     serializer_class = EnrollmentModelSerializer
+    count_cache_models = [Course, User]  # поиск по названию курса и username, см. CachedCountMixin
     http_method_names = ['get', 'post', 'put', 'patch', 'delete', 'options']
     permission_classes = [CustomPermission]
     pagination_class = CustomPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['id', 'course', 'user']
-    search_fields = ['id', 'course', 'user']  # Поля, по которым будет выполняться поиск
+    search_fields = ['id', 'course__name', 'user__username']  # Поля, по которым будет выполняться поиск
     ordering_fields = ['id']  # Поля, по которым можно сортировать
 
 
-class ReviewViewSet(ModelViewSet):
+class ReviewViewSet(MetricsMixin, WriteRetryMixin, SparseFieldsMixin, BulkWriteMixin, CoalescingMixin, CachedCountMixin, ConditionalGetMixin, StreamingExportMixin, FastListMixin, ModelViewSet):
     """
     Класс для обработки данных, переданных пользователем,
     и взаимодействия с объектом модели базы данных Review
@@ -135,28 +263,85 @@ class ReviewViewSet(ModelViewSet):
 
     queryset = Review.objects.all()
     serializer_class = ReviewModelSerializer
+    heavy_fields = ['text']  # не выводится в списке без ?view=full, см. sparse.py
+    count_cache_models = [Course, User]  # поиск по названию курса и username, см. CachedCountMixin
     http_method_names = ['get', 'post', 'put', 'patch', 'delete', 'options']
     permission_classes = [CustomPermission]
     pagination_class = CustomPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['id', 'course', 'user', 'text', 'rate']
-    search_fields = ['id', 'course', 'user', 'text', 'rate']  # Поля, по которым будет выполняться поиск
+    search_fields = ['id', 'course__name', 'user__username', 'text', 'rate']  # Поля, по которым будет выполняться поиск
     ordering_fields = ['id']  # Поля, по которым можно сортировать
+    # Поля без B-tree индекса (см. команду audit_indexes)
+    index_audit_exempt = {'text': 'текст отзыва произвольной длины: индекс по нему слишком велик, '
+                                  'точное совпадение всего текста не используется'}
+
+    # Сводку оценок курса (CourseRatingSummary) обновляют сигналы записи отзыва (signals.py):
+    # отзыв и сводка записываются в одной транзакции
+
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            serializer.save()
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            serializer.save()
 
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
 
-class CategoryViewSet(ModelViewSet):
+    # Пакетные операции (BulkWriteMixin) обновляют сводку сами - одним UPDATE на курс
+
+    @staticmethod
+    def apply_rating_changes(removed, added):
+        """
+        :param removed: пары (course_id, rate) исключаемых оценок
+        :param added: пары (course_id, rate) добавляемых оценок
+        """
+
+        for pairs, sign in ((removed, -1), (added, 1)):
+            rates_by_course = {}
+            for course_id, rate in pairs:
+                rates_by_course.setdefault(course_id, []).append(rate)
+            for course_id, rates in rates_by_course.items():
+                CourseRatingSummary.apply_reviews(course_id, rates, sign)
+
+    def perform_bulk_create(self, serializer):
+        reviews = serializer.save()
+        self.apply_rating_changes([], [(review.course_id, review.rate) for review in reviews])
+        return reviews
+
+    def perform_bulk_update(self, serializer):
+        old = {pk: (review.course_id, review.rate) for pk, review in serializer.instance.items()}
+        reviews = serializer.save()
+        new = {review.pk: (review.course_id, review.rate) for review in reviews}
+        changed = [pk for pk in new if new[pk] != old[pk]]
+        self.apply_rating_changes([old[pk] for pk in changed], [new[pk] for pk in changed])
+        return reviews
+
+    def perform_bulk_destroy(self, queryset):
+        removed = list(queryset.values_list('course_id', 'rate'))
+        with CourseRatingSummary.manual_updates():  # удаление QuerySet отправляет post_delete для каждого отзыва
+            deleted = super().perform_bulk_destroy(queryset)
+        self.apply_rating_changes(removed, [])
+        return deleted
+
+
+class CategoryViewSet(MetricsMixin, WriteRetryMixin, SparseFieldsMixin, CachedResponseMixin, ConditionalGetMixin, StreamingExportMixin, FastListMixin, ModelViewSet):
     """
     Класс для обработки данных, переданных пользователем,
     и взаимодействия с объектом модели базы данных Category
     """
 
-    queryset = Category.objects.all()
+    queryset = Category.objects.prefetch_related('course')  # курсы категорий одним запросом на страницу
     serializer_class = CategoryModelSerializer
+    cache_namespace = 'categories'  # анонимные GET кэшируются, см. cache.py
     http_method_names = ['get', 'post', 'put', 'patch', 'delete', 'options']
     pagination_class = CustomPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['id', 'course', 'name']
-    search_fields = ['id', 'course', 'name']  # Поля, по которым будет выполняться поиск
+    search_fields = ['id', 'course__name', 'name']  # Поля, по которым будет выполняться поиск
     ordering_fields = ['id']  # Поля, по которым можно сортировать
 
     def get_permissions(self):
@@ -167,3 +352,45 @@ class CategoryViewSet(ModelViewSet):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
             return [permissions.IsAdminUser()]  # Только админ может создавать, изменять, удалять
         return [permissions.AllowAny()]  # Пользователь может только смотреть
+
+
+class DashboardView(MetricsMixin, GenericAPIView):
+    """
+    Панель пользователя /me/dashboard/: курсы, на которые он записан, с категориями,
+    статистикой оценок и его отзывом - вместо запросов клиента /enrollments/?user=,
+    /courses/<id>/, /categories/ и /reviews/?course= по каждому курсу.
+    Три запроса к БД независимо от количества записей и курсов: курсы со статистикой
+    (JOIN сводки оценок), категории курсов и отзывы пользователя
+    """
+
+    serializer_class = DashboardSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = None
+
+    def get_queryset(self):
+        user_id = self.request.user.pk
+        enrolled = EnrollmentCourse.objects.filter(enrollment__user_id=user_id).values('course_id')
+        return Course.objects.with_rating_stats().filter(pk__in=enrolled).prefetch_related(
+            Prefetch('categories', queryset=Category.objects.only('id', 'name').order_by('name')),
+            Prefetch('reviews', queryset=Review.objects.filter(user_id=user_id).order_by('-updated_at', '-id'),
+                     to_attr='own_reviews'),
+        ).order_by('name')
+
+    def get(self, request, *args, **kwargs):
+        # пользователь - из запроса (при JWT это ClaimsUser из утверждений токена, без запроса к БД)
+        return Response(self.get_serializer({'user': request.user, 'courses': self.get_queryset()}).data)
+
+
+# Эндпоинты токенов: своя область ограничения частоты 'auth' (API_THROTTLE_RATES) вместо
+# общей 'default' - подбор пароля и токенов ограничивается строже, чем чтение каталога
+
+class TokenObtainPairView(jwt_views.TokenObtainPairView):
+    throttle_scope = 'auth'
+
+
+class TokenRefreshView(jwt_views.TokenRefreshView):
+    throttle_scope = 'auth'
+
+
+class TokenVerifyView(jwt_views.TokenVerifyView):
+    throttle_scope = 'auth'
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -48,7 +49,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api_educational_courses.metrics.MetricsMiddleware',  # метрики запросов, должен быть первым
     'django.middleware.security.SecurityMiddleware',
+    'api_educational_courses.db_routers.ReplicaRoutingMiddleware',  # чтение с реплик для GET
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -87,6 +90,133 @@ DATABASES = {
     }
 }
 
+# Профиль БД для продакшена: DJANGO_DB_PROFILE=production
+# - WAL: читатели не блокируют писателя и наоборот, synchronous=NORMAL в режиме WAL
+#   не теряет целостность, а только последние транзакции при отключении питания;
+# - mmap и кэш страниц 64 МБ на соединение, временные таблицы в памяти;
+# - запись начинается с BEGIN IMMEDIATE: блокировка берется в начале транзакции,
+#   и ожидание занятой БД (timeout) не заканчивается взаимной блокировкой при
+#   повышении уровня блокировки с чтения до записи;
+# - постоянные соединения с проверкой перед использованием.
+# Оставшиеся ошибки "database is locked" повторяются (api_educational_courses/db.py)
+
+if os.environ.get('DJANGO_DB_PROFILE') == 'production':
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': int(os.environ.get('DJANGO_DB_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,  # ожидание блокировки (busy timeout), секунды
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA mmap_size=268435456;'
+                'PRAGMA cache_size=-65536;'
+                'PRAGMA temp_store=MEMORY;'
+            ),
+        },
+    })
+
+# Реплики для чтения: DJANGO_DB_REPLICAS - пути к файлам SQLite через запятую
+# (локально - копии основной БД, см. команду sync_sqlite_replicas).
+# GET/HEAD/OPTIONS читают из реплик, запись - из default (api_educational_courses/db_routers.py).
+# В тестах реплики указывают на тестовую основную БД (MIRROR)
+
+DATABASE_REPLICAS = []
+for number, path in enumerate(filter(None, os.environ.get('DJANGO_DB_REPLICAS', '').split(',')), start=1):
+    alias = f'replica_{number}'
+    DATABASES[alias] = {**DATABASES['default'], 'NAME': path.strip(), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['api_educational_courses.db_routers.ReplicaRouter']
+DATABASE_REPLICA_STICKY_SECONDS = 5  # чтение из основной БД после записи клиента, секунды
+
+# Метрики запросов (api_educational_courses/metrics.py), эндпоинт /metrics/
+API_METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+API_N_PLUS_ONE_THRESHOLD = 10  # повторов одного шаблона SQL за запрос, после которых пишется предупреждение
+API_SLOW_QUERY_MS = 200  # запросы дольше этого времени записываются в лог
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api_educational_courses.queries': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+        'api_educational_courses.tasks': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+    },
+}
+
+API_WRITE_RETRY_ATTEMPTS = 5  # попыток записи при "database is locked" (db.py)
+API_WRITE_RETRY_BACKOFF = 0.05  # начальная пауза между попытками, секунды (удваивается)
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# По умолчанию - локальная память процесса. Для общего кэша нескольких процессов
+# задайте бэкенд и адрес, например:
+# DJANGO_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache DJANGO_CACHE_LOCATION=redis://127.0.0.1:6379
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', 'api-educational-courses'),
+    }
+}
+
+API_RESPONSE_CACHE_ALIAS = 'default'  # алиас кэша ответов для анонимных GET (api_educational_courses/cache.py)
+API_RESPONSE_CACHE_TIMEOUT = 300  # время жизни закэшированного ответа, секунды
+# Количество строк списков /reviews/ и /enrollments/ (CachedCountMixin в cache.py):
+# время жизни в кэше (сбрасывается и при записи), секунды; 0 - не кэшировать
+API_COUNT_CACHE_TIMEOUT = 300
+# Без фильтров count берется из статистики БД (ANALYZE), если в таблице не меньше строк; None - всегда точно
+API_COUNT_ESTIMATE_THRESHOLD = 100_000
+
+# Похожие курсы (recommendations.py, /courses/<id>/similar/):
+# количество соседей курса в индексе, вес сходства по общим категориям
+# и максимум курсов студента, учитываемых в парах (N курсов дают N * (N - 1) пар)
+API_SIMILAR_COURSES_COUNT = 10
+API_SIMILAR_COURSES_CATEGORY_WEIGHT = 0.2
+API_SIMILAR_COURSES_MAX_USER_COURSES = 100
+
+# Фоновые задачи (api_educational_courses/tasks.py, таблица Job):
+# потоков-обработчиков в каждом процессе веб-сервера (запускаются при первом запросе процесса,
+# поэтому совместимы с gunicorn --preload; 0 - только команда run_task_workers),
+# пауза опроса очереди, попыток на задачу, начальная пауза повтора (удваивается), секунды,
+# через сколько секунд задача упавшего обработчика снова берется в работу
+API_TASKS_WORKERS = 2
+API_TASKS_POLL_INTERVAL = 1.0
+API_TASKS_MAX_ATTEMPTS = 5
+API_TASKS_RETRY_DELAY = 5
+API_TASKS_LEASE_TIMEOUT = 300
+API_TASKS_EAGER = False  # True - выполнять задачи сразу после фиксации транзакции, без очереди
+
+# Ограничение частоты запросов (api_educational_courses/throttling.py):
+# {basename представления: (токенов в секунду, емкость корзины)}, 'default' - для остальных, None - без ограничения
+API_THROTTLE_ENABLED = True
+API_THROTTLE_RATES = {
+    'default': (20, 100),
+    'courses': (50, 200),  # страницы курсов при запуске популярного курса
+    'reviews': (50, 200),
+    'auth': (1, 10),  # /token/, /token/refresh/, /token/verify/ - одна корзина на клиента (подбор пароля)
+}
+# Хранилище корзин: память процесса или общий кэш для всех процессов
+# ('api_educational_courses.throttling.CacheBucketStore', алиас API_THROTTLE_CACHE_ALIAS)
+API_THROTTLE_STORE = 'api_educational_courses.throttling.MemoryBucketStore'
+API_THROTTLE_STORE_SIZE = 100_000  # клиентов в памяти процесса (LRU)
+API_THROTTLE_CACHE_ALIAS = 'default'
+# Объединение одновременных одинаковых GET /courses/ и /reviews/ (coalescing.py)
+API_COALESCE_ENABLED = True
+API_COALESCE_TIMEOUT = 10  # секунд ожидания первого запроса
+
+# Каталог /catalog/ из снимка в памяти процесса (catalog.py): снимок новой версии публикует фоновая
+# задача, устаревший снимок процесса заменяется фоновым потоком не чаще раза
+# в API_CATALOG_REBUILD_INTERVAL секунд (False - в запросе).
+# Версия и опубликованный снимок хранятся в кэше API_RESPONSE_CACHE_ALIAS: для нескольких процессов нужен общий кэш
+API_CATALOG_BACKGROUND_REBUILD = True
+API_CATALOG_REBUILD_INTERVAL = 1.0
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -134,7 +264,8 @@ AUTH_USER_MODEL = 'api_educational_courses.User'
 
 REST_FRAMEWORK = {
    'DEFAULT_AUTHENTICATION_CLASSES': (
-       'rest_framework_simplejwt.authentication.JWTAuthentication',
+       # JWT без запроса пользователя к БД: права из утверждений токена и кэша состояния
+       'api_educational_courses.authentication.ClaimsJWTAuthentication',
        'rest_framework.authentication.TokenAuthentication',
        'rest_framework.authentication.BasicAuthentication',
        'rest_framework.authentication.SessionAuthentication',
@@ -142,6 +273,15 @@ REST_FRAMEWORK = {
    'DEFAULT_PERMISSION_CLASSES': (
        'rest_framework.permissions.IsAuthenticated',
    ),
+   'DEFAULT_RENDERER_CLASSES': (
+       # Ответы быстрого пути списков - через orjson, если установлен (fastlist.py)
+       'api_educational_courses.fastlist.FastJSONRenderer',
+       'rest_framework.renderers.BrowsableAPIRenderer',
+   ),
+   'DEFAULT_THROTTLE_CLASSES': (
+       # token bucket на клиента и представление (throttling.py, API_THROTTLE_RATES)
+       'api_educational_courses.throttling.TokenBucketThrottle',
+   ),
    'DEFAULT_FILTER_BACKENDS': (
        'django_filters.rest_framework.DjangoFilterBackend',
    ),
@@ -152,7 +292,15 @@ REST_FRAMEWORK = {
 SIMPLE_JWT = {
    "ACCESS_TOKEN_LIFETIME": timedelta(minutes=30),  # Время жизни токена доступа, установлено 30 минут, по умолчанию 5 минут
    "REFRESH_TOKEN_LIFETIME": timedelta(days=7),  # Время жизни токена обновления, установлено 7 дней, по умолчанию 1 день
+   # Токены с утверждениями username/is_staff/is_superuser для ClaimsJWTAuthentication
+   "TOKEN_OBTAIN_SERIALIZER": "api_educational_courses.authentication.ClaimsTokenObtainPairSerializer",
 }
+# Кэш состояния пользователей (is_active и права) для ClaimsJWTAuthentication:
+# время жизни записи в секундах - максимальная задержка отзыва доступа в других процессах
+API_USER_STATE_CACHE_TIMEOUT = 30
+API_USER_STATE_CACHE_SIZE = 10000
+# Списки в JSON строятся из values() без сериализатора, если все поля простые (fastlist.py)
+API_FAST_LIST_ENABLED = True
 
 
 # Чтобы была возможность обрабатывать формы при https протоколе
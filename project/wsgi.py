@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
 
 application = get_wsgi_application()
+
+# Обработчики фоновых задач в процессах сервера (API_TASKS_WORKERS, см. api_educational_courses/tasks.py).
+# Пул запускается при первом запросе в каждом процессе, поэтому совместим с gunicorn --preload
+from api_educational_courses.tasks import enable_worker_pool  # noqa: E402 - после загрузки приложений
+
+enable_worker_pool()